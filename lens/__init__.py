@@ -0,0 +1 @@
+"""LENS - Loss Exposure & Natural-hazard Scanner."""
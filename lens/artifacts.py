@@ -0,0 +1,159 @@
+"""Content-hashed artifact store for pipeline stages.
+
+numpy/pandas/shapely are imported only when hashing, so reading cached
+artifacts (e.g. a replay run) stays cheap to start.
+"""
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+from lens import instrument
+
+ARTIFACT_DIR = os.environ.get("LENS_ARTIFACT_DIR", ".lens_cache/artifacts")
+
+# Artifacts kept per stage; older keys are pruned on write
+KEEP_PER_STAGE = 3
+
+LENS_DIR = Path(__file__).resolve().parent
+
+
+def code_version():
+    """Hash of the lens sources, so a code change invalidates every cached stage."""
+    h = hashlib.blake2b(digest_size=16)
+    for path in sorted(LENS_DIR.glob("*.py")):
+        h.update(path.name.encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+CODE_VERSION = code_version()
+
+
+# -----------------------
+# CONTENT HASHING
+# -----------------------
+
+def _hashable(value):
+    value = getattr(value, "wkb", value)
+    return value.hex() if isinstance(value, bytes) else str(value)
+
+
+def _series_bytes(col):
+    import pandas as pd
+    import shapely
+
+    if isinstance(col.dtype, pd.api.types.CategoricalDtype) or col.dtype != object:
+        return pd.util.hash_pandas_object(col, index=False).values.tobytes()
+    if len(col) and isinstance(col.iloc[0], shapely.Geometry):
+        return b"".join(shapely.to_wkb(col.values).tolist())
+    try:
+        return pd.util.hash_pandas_object(col, index=False).values.tobytes()
+    except TypeError:
+        return pd.util.hash_pandas_object(col.map(_hashable), index=False).values.tobytes()
+
+
+def _update(h, part):
+    import numpy as np
+    import pandas as pd
+
+    from lens.serialize import dumps
+
+    if part is None:
+        h.update(b"\0")
+    elif isinstance(part, bytes):
+        h.update(part)
+    elif isinstance(part, str):
+        h.update(part.encode())
+    elif isinstance(part, pd.DataFrame):
+        h.update(pd.util.hash_pandas_object(part.index).values.tobytes())
+        for name, col in part.items():
+            h.update(str(name).encode())
+            h.update(_series_bytes(col))
+    elif isinstance(part, pd.Series):
+        h.update(pd.util.hash_pandas_object(part.index).values.tobytes())
+        h.update(_series_bytes(part))
+    elif isinstance(part, np.ndarray) and part.dtype != object:
+        h.update(f"{part.dtype}{part.shape}".encode())
+        # Hashed through the buffer, so memory-mapped arrays are not copied into RAM
+        h.update(np.ascontiguousarray(part).data)
+    else:
+        try:
+            h.update(dumps(part, sort_keys=True).encode())
+        except TypeError:
+            h.update(pickle.dumps(part))
+
+
+def content_hash(*parts):
+    """Stable hex digest of a stage's inputs (feed payloads, frames, arrays or earlier hashes)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(CODE_VERSION.encode())
+    for part in parts:
+        _update(h, part)
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+# -----------------------
+# ARTIFACT STORE
+# -----------------------
+
+_MISS = object()
+
+
+class ArtifactStore:
+    """Pickled stage results on disk under <root>/<stage>/<key>.pkl, plus an in-memory copy."""
+
+    def __init__(self, root=ARTIFACT_DIR, keep=KEEP_PER_STAGE):
+        self.root = Path(root)
+        self.keep = keep
+        self._memory = {}
+        self.reused = []
+        self.built = []
+
+    def path(self, stage, key):
+        return self.root / stage / f"{key}.pkl"
+
+    def get(self, stage, key, default=None):
+        if self._memory.get(stage, (None,))[0] == key:
+            return self._memory[stage][1]
+        path = self.path(stage, key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return default
+        except Exception as e:
+            print(f"⚠️ Discarding unreadable artifact {path}: {e}")
+            return default
+        os.utime(path)
+        self._memory[stage] = (key, value)
+        return value
+
+    def put(self, stage, key, value):
+        path = self.path(stage, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._memory[stage] = (key, value)
+        self._prune(stage)
+
+    def _prune(self, stage):
+        paths = sorted((self.root / stage).glob("*.pkl"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old in paths[self.keep:]:
+            old.unlink(missing_ok=True)
+
+    def cached(self, stage, key, build):
+        """Return the artifact for (stage, key), building and storing it only when missing."""
+        value = self.get(stage, key, _MISS)
+        if value is not _MISS:
+            self.reused.append(stage)
+            return value
+        with instrument.stage(stage):
+            value = build()
+        self.put(stage, key, value)
+        self.built.append(stage)
+        return value
@@ -0,0 +1,213 @@
+"""Synthetic-portfolio benchmarks with machine-readable baselines.
+
+Each size runs in a fresh interpreter, so peak memory belongs to that size
+alone. A run pushes a synthetic portfolio (lens.synthetic) through the real
+pipeline with an empty artifact store: ingestion, every hazard and exposure
+stage (joins, rollups, heatmap, panel), page rendering and publishing are
+timed separately by lens.instrument.
+
+    python -m lens bench                         compare against benchmarks/baselines.json
+    python -m lens bench --sizes 1e4 1e7         pick portfolio sizes
+    python -m lens bench --update-baseline       record the current numbers as the baseline
+    python -m lens bench --fetch --latency 0.05  fetch-path latency against the mock ArcGIS server
+    LENS_STREAM_JOINS=1 python -m lens bench     the out-of-core path (lens.streaming)
+"""
+
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from lens import instrument
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = REPO_DIR / "benchmarks" / "baselines.json"
+
+DEFAULT_SIZES = [10**4, 10**5, 10**6]
+
+# A stage regresses when it is this much slower than baseline and by more than NOISE_SECONDS
+TOLERANCE = 0.25
+NOISE_SECONDS = 0.05
+
+
+def bench_size(n, seed=0):
+    """Run the pipeline once over an n-location synthetic portfolio; returns the result record."""
+    from lens import output, pipeline, render, streaming, synthetic
+    from lens.artifacts import ArtifactStore
+
+    report = instrument.start_run()
+    with instrument.stage("generate"):
+        tiv_df = synthetic.synthetic_tiv(n, seed)
+        exposure_df = synthetic.synthetic_exposure_table(seed)
+        feeds = synthetic.synthetic_feeds(seed)
+    generate_seconds = report.stages.pop("generate")["seconds"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ArtifactStore(Path(tmp) / "artifacts")
+        started = time.perf_counter()
+        spill_to = streaming.spill_dir(store) if streaming.STREAMING else None
+        snapshot = pipeline.exposure_snapshot(exposure_df, tiv_df, spill_to)
+        state = pipeline.build(store, feeds=feeds, snapshot=snapshot)
+        with instrument.stage("render_page"):
+            html = render.assemble(state["page"]).get_root().render()
+        output.publish(Path(tmp) / "bench.html", html)
+        total = time.perf_counter() - started
+
+    stages = {name: round(entry["seconds"], 4) for name, entry in report.stages.items()}
+    return {
+        "locations": n,
+        "seconds": round(total, 4),
+        "generate_seconds": round(generate_seconds, 4),
+        "stages": stages,
+        # Locations processed per second by each stage
+        "throughput": {name: round(n / seconds) for name, seconds in stages.items() if seconds > 0},
+        "peak_rss_bytes": instrument.peak_rss_bytes(),
+        "counters": report.as_dict()["counters"],
+    }
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))] if values else 0.0
+
+
+def bench_fetch(rounds=5, seed=0, scale=1, latency=0.0, jitter=0.0, error_rate=0.0, page_size=None):
+    """Fetch every feed ``rounds`` times from the local mock ArcGIS server; latency percentiles per request."""
+    from lens import feeds, mockserver
+
+    mock = mockserver.MockFeatureServer(
+        mockserver.synthetic_layers(seed, scale), latency, jitter, error_rate,
+        page_size or mockserver.PAGE_SIZE, seed,
+    )
+    previous = feeds.ARCGIS_SERVICES
+    feeds.use_services(mock.start_in_thread())
+    report = instrument.start_run()
+    latencies, failures = [], 0
+    started = time.perf_counter()
+    try:
+        for _ in range(rounds):
+            for name in feeds.FEEDS:
+                t = time.perf_counter()
+                try:
+                    feeds.fetch_geojson(feeds.FEEDS[name]["url"], feeds.feed_params(name), raise_errors=True, feed=name)
+                except Exception:
+                    failures += 1
+                latencies.append(time.perf_counter() - t)
+    finally:
+        feeds.use_services(previous)
+    total = time.perf_counter() - started
+    counters = report.as_dict()["counters"]
+    features = sum(counters.get("features_fetched", {}).values())
+    return {
+        "requests": mock.requests,
+        "feed_fetches": len(latencies),
+        "failures": failures,
+        "seconds": round(total, 4),
+        "stages": {
+            "fetch_p50": round(percentile(latencies, 50), 4),
+            "fetch_p95": round(percentile(latencies, 95), 4),
+            "fetch_p99": round(percentile(latencies, 99), 4),
+            "fetch_max": round(max(latencies), 4),
+            "fetch_total": round(total, 4),
+        },
+        "throughput": {
+            "features_per_second": round(features / total) if total else 0,
+            "bytes_per_second": round(sum(counters.get("bytes_fetched", {}).values()) / total) if total else 0,
+        },
+        "peak_rss_bytes": instrument.peak_rss_bytes(),
+        "knobs": {"rounds": rounds, "scale": scale, "latency": latency, "jitter": jitter,
+                  "error_rate": error_rate, "page_size": page_size, "seed": seed},
+    }
+
+
+def run_fetch_benchmark(baseline_path=None, update=False, tolerance=TOLERANCE, **knobs):
+    """bench_fetch() against the baseline recorded under "fetch"; returns the number of regressions."""
+    baseline_path = baseline_path or BASELINE_PATH
+    baselines = load_baselines(baseline_path)
+    result = bench_fetch(**knobs)
+    stages = result["stages"]
+    print(f"🔹 {result['feed_fetches']} feed fetches ({result['requests']} requests, {result['failures']} failed): "
+          f"p50 {stages['fetch_p50'] * 1000:.0f}ms, p95 {stages['fetch_p95'] * 1000:.0f}ms, "
+          f"p99 {stages['fetch_p99'] * 1000:.0f}ms, {result['throughput']['features_per_second']:,} features/s")
+    if update:
+        baselines["fetch"] = {**result, "machine": machine(), "recorded": time.strftime("%Y-%m-%d")}
+        _write_baselines(baselines, baseline_path)
+        return 0
+    if "fetch" not in baselines:
+        print("⚠️ No fetch baseline; record one with --fetch --update-baseline")
+        return 0
+    if baselines["fetch"].get("knobs") != result["knobs"]:
+        print("⚠️ Fetch baseline was recorded with different knobs; comparing anyway")
+    regressions = compare(result, baselines["fetch"], tolerance)
+    for name, base, seconds in regressions:
+        print(f"❌ {name} regressed: {base * 1000:.0f}ms -> {seconds * 1000:.0f}ms")
+    return len(regressions)
+
+
+def _write_baselines(baselines, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+    print(f"✅ Baselines written to {path}")
+
+
+def run_isolated(n, seed=0):
+    """bench_size(n) in a fresh interpreter, so peak RSS is not carried over from a larger size."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        result_path = Path(f.name)
+    try:
+        subprocess.run([sys.executable, "-m", "lens", "bench", "--one", str(n), "--seed", str(seed),
+                        "--result", str(result_path)], check=True, stdout=subprocess.DEVNULL, cwd=REPO_DIR)
+        return json.loads(result_path.read_text())
+    finally:
+        result_path.unlink(missing_ok=True)
+
+
+def machine():
+    return {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.machine()}
+
+
+def load_baselines(path=BASELINE_PATH):
+    path = Path(path)
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def compare(result, baseline, tolerance=TOLERANCE):
+    """Stages of ``result`` slower than ``baseline`` beyond the tolerance: [(stage, base s, now s)]."""
+    regressions = []
+    for name, seconds in result["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if base is not None and seconds > base * (1 + tolerance) and seconds - base > NOISE_SECONDS:
+            regressions.append((name, base, seconds))
+    return regressions
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, seed=0, baseline_path=None, update=False, tolerance=TOLERANCE):
+    """Benchmark every size; returns the number of regressed stages (0 when updating the baseline)."""
+    baseline_path = baseline_path or BASELINE_PATH
+    baselines = load_baselines(baseline_path)
+    regressed = 0
+    for n in sizes:
+        result = run_isolated(n, seed)
+        print(f"🔹 {n:,} locations: {result['seconds']:.2f}s, peak RSS {result['peak_rss_bytes'] / 2**20:,.0f} MiB")
+        for name, seconds in sorted(result["stages"].items(), key=lambda item: item[1], reverse=True)[:5]:
+            print(f"    {name:<20} {seconds:8.3f}s  {result['throughput'].get(name, 0):>14,} loc/s")
+        if update:
+            baselines[str(n)] = {**result, "machine": machine(), "recorded": time.strftime("%Y-%m-%d")}
+            continue
+        baseline = baselines.get(str(n))
+        if baseline is None:
+            print(f"⚠️ No baseline for {n:,} locations; record one with --update-baseline")
+            continue
+        for name, base, seconds in compare(result, baseline, tolerance):
+            print(f"❌ {name} regressed at {n:,} locations: {base:.3f}s -> {seconds:.3f}s")
+            regressed += 1
+
+    if update:
+        _write_baselines(baselines, baseline_path)
+    elif not regressed:
+        print("✅ No stage regressed beyond the baseline tolerance")
+    return regressed
@@ -0,0 +1,160 @@
+"""Command line entry point: ``python -m lens [run|replay|stage|bench|serve|daemon|mock]``.
+
+Only argparse is imported up front; each command imports the modules it
+needs, so ``--help`` and replay runs never pay for geopandas, folium or the
+database driver.
+"""
+
+import argparse
+import sys
+
+# Same default as pipeline.OUTPUT_HTML, kept here so --help does not import the pipeline
+OUTPUT_HTML = "full_disaster_map_one_row_per_hazard.html"
+
+# Same default as instrument.REPORT_NAME
+REPORT_NAME = "lens_run_report.json"
+
+STAGES = ["feeds", "exposure", "storms", "hurricanes", "earthquakes", "shake", "wildfires", "floods"]
+
+
+def add_report_arguments(parser):
+    """--report/--prometheus options shared by the run and daemon commands."""
+    parser.add_argument("--report", default=REPORT_NAME, help="JSON run report path ('' to skip)")
+    parser.add_argument("--prometheus", metavar="PATH", help="also write a Prometheus textfile here")
+
+
+def cmd_run(args):
+    from lens import delta
+    from lens.artifacts import ArtifactStore
+    from lens.pipeline import run
+
+    if args.delta:
+        delta.ENABLED = True
+
+    run(ArtifactStore(args.cache_dir), args.output, args.report, args.prometheus)
+
+
+def cmd_replay(args):
+    """Republish the last built page from the artifact store, without feeds or database."""
+    from lens import output
+    from lens.artifacts import ArtifactStore
+    from lens.render import LAST_PAGE, assemble
+
+    store = ArtifactStore(args.cache_dir)
+    page = store.get(*LAST_PAGE)
+    if page is None:
+        print(f"❌ No cached page in {store.root}; run `python -m lens run` first")
+        return 1
+    output.publish(args.output, assemble(page).get_root().render())
+    print(f"✅ Replayed cached page as {args.output}")
+
+
+def cmd_stage(args):
+    from lens.artifacts import ArtifactStore
+    from lens.pipeline import run_stage
+
+    run_stage(args.name, ArtifactStore(args.cache_dir))
+
+
+def cmd_bench(args):
+    import json
+
+    from lens import bench
+
+    if args.one:
+        result = bench.bench_size(args.one, args.seed)
+        with open(args.result, "w") as f:
+            json.dump(result, f)
+        return
+    if args.fetch:
+        regressed = bench.run_fetch_benchmark(
+            args.baseline, args.update_baseline, args.tolerance, rounds=args.rounds, seed=args.seed,
+            latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, page_size=args.page_size,
+        )
+        return 1 if regressed else 0
+    regressed = bench.run_benchmarks(args.sizes, args.seed, args.baseline, args.update_baseline, args.tolerance)
+    return 1 if regressed else 0
+
+
+def cmd_serve(args):
+    from lens.artifacts import ArtifactStore
+    from lens.server import main as serve_main
+
+    return serve_main(args.rest, store=ArtifactStore(args.cache_dir))
+
+
+def cmd_daemon(args):
+    from lens.artifacts import ArtifactStore
+    from lens.daemon import main as daemon_main
+
+    return daemon_main(args.rest, store=ArtifactStore(args.cache_dir))
+
+
+def cmd_mock(args):
+    from lens.mockserver import main as mock_main
+
+    return mock_main(args.rest)
+
+
+def count_arg(value):
+    """Location counts, also accepted as 1e6."""
+    return int(float(value))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    from lens.artifacts import ARTIFACT_DIR
+
+    parser = argparse.ArgumentParser(prog="lens", description="LENS - Loss Exposure & Natural-hazard Scanner.")
+    parser.add_argument("--cache-dir", default=ARTIFACT_DIR, help="artifact store directory")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    run_parser = commands.add_parser("run", help="fetch feeds, join exposure and publish the map (default)")
+    run_parser.add_argument("--output", default=OUTPUT_HTML)
+    run_parser.add_argument("--delta", action="store_true",
+                            help="patch the last exposure snapshot with changed accounts only (LENS_EXPOSURE_DELTA=1)")
+    add_report_arguments(run_parser)
+    run_parser.set_defaults(func=cmd_run)
+
+    replay_parser = commands.add_parser("replay", help="republish the last built page from the artifact store")
+    replay_parser.add_argument("--output", default=OUTPUT_HTML)
+    replay_parser.set_defaults(func=cmd_replay)
+
+    stage_parser = commands.add_parser("stage", help="run a single stage against the artifact store")
+    stage_parser.add_argument("name", choices=STAGES)
+    stage_parser.set_defaults(func=cmd_stage)
+
+    bench_parser = commands.add_parser("bench", help="benchmark the pipeline on synthetic portfolios")
+    bench_parser.add_argument("--sizes", nargs="+", type=count_arg, default=[10**4, 10**5, 10**6],
+                              help="portfolio sizes in locations (e.g. 1e4 1e7)")
+    bench_parser.add_argument("--seed", type=int, default=0)
+    bench_parser.add_argument("--baseline", default=None, help="baselines file (default benchmarks/baselines.json)")
+    bench_parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown per stage")
+    bench_parser.add_argument("--update-baseline", action="store_true", help="record this run as the baseline")
+    bench_parser.add_argument("--fetch", action="store_true", help="benchmark the fetch path against the mock ArcGIS server")
+    bench_parser.add_argument("--rounds", type=int, default=5, help="fetch rounds over every feed (--fetch)")
+    bench_parser.add_argument("--latency", type=float, default=0.0, help="injected mock latency in seconds (--fetch)")
+    bench_parser.add_argument("--jitter", type=float, default=0.0, help="injected mock jitter in seconds (--fetch)")
+    bench_parser.add_argument("--error-rate", type=float, default=0.0, help="injected mock error rate (--fetch)")
+    bench_parser.add_argument("--page-size", type=int, help="mock maxRecordCount (--fetch)")
+    # Used by the isolated per-size child processes
+    bench_parser.add_argument("--one", type=count_arg, help=argparse.SUPPRESS)
+    bench_parser.add_argument("--result", help=argparse.SUPPRESS)
+    bench_parser.set_defaults(func=cmd_bench)
+
+    # serve/daemon/mock keep their own option parsers and are handed the rest of the command line
+    for name, func, help in (
+        ("serve", cmd_serve, "serve the map and JSON endpoints (see `lens serve --help`)"),
+        ("mock", cmd_mock, "serve a local mock of the ArcGIS layers (see `lens mock --help`)"),
+        ("daemon", cmd_daemon, "refresh feeds on per-feed schedules (see `lens daemon --help`)"),
+    ):
+        commands.add_parser(name, help=help, add_help=False).set_defaults(func=func, passthrough=True)
+
+    args, rest = parser.parse_known_args(argv)
+    if args.command is None:
+        args, rest = parser.parse_known_args([*argv, "run"])
+    if getattr(args, "passthrough", False):
+        args.rest = rest
+    elif rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    return args.func(args)
@@ -0,0 +1,188 @@
+"""Daemon mode: warm engine, exposure snapshot and feed snapshots with per-feed refresh schedules.
+
+Each feed is refetched on its own cadence and the exposure tables nightly.
+With delta loads enabled (lens.delta), the accounts changed in between are
+patched into the snapshot on a shorter cadence.
+A rebuild only happens when a fetch actually changed something, and then only
+the stages keyed on the changed inputs are recomputed (see lens/artifacts.py).
+Outputs are republished atomically, so readers never see a half-written map.
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lens import delta, exposure, instrument, output, pipeline, render
+from lens.artifacts import ArtifactStore
+from lens.feeds import FEEDS, fetch_feed, map_feeds, time_filter
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+
+# Seconds between refreshes of each feed
+FEED_INTERVALS = {
+    "eq_points": MINUTE,
+    "eq_intensity": MINUTE,
+    "hurricane_forecast": 3 * HOUR,
+    "hurricane_locations": 3 * HOUR,
+    "hurricane_cone": 3 * HOUR,
+    "hurricane_observed": 3 * HOUR,
+    "hurricane_ts_prob": 3 * HOUR,
+    "hurricane_hf_prob": 3 * HOUR,
+    "wildfires": 15 * MINUTE,
+    "floods": 15 * MINUTE,
+}
+
+EXPOSURE_INTERVAL = 24 * HOUR
+DELTA_INTERVAL = 15 * MINUTE
+
+
+class Daemon:
+    def __init__(self, store=None, engine=None, path=pipeline.OUTPUT_HTML,
+                 intervals=None, exposure_interval=EXPOSURE_INTERVAL, delta_interval=None,
+                 report_path=instrument.REPORT_NAME, prometheus_path=None):
+        self.store = store or ArtifactStore()
+        self.report_path = report_path
+        self.prometheus_path = prometheus_path
+        self.engine = engine
+        self.path = path
+        self.intervals = {**FEED_INTERVALS, **(intervals or {})}
+        self.exposure_interval = exposure_interval
+        # Seconds between delta loads; None reloads the full tables only
+        self.delta_interval = delta_interval or (DELTA_INTERVAL if delta.ENABLED else None)
+        self.feeds = {}
+        self.feed_keys = {}
+        self.snapshot = None
+        self.due = {name: 0.0 for name in FEEDS}
+        self.exposure_due = 0.0
+        self.delta_due = 0.0
+        # Set while a rebuild has failed, so the next tick retries it even if nothing else changed
+        self.stale = False
+
+    def refresh_feeds(self, names):
+        """Refetch the named feeds; returns the ones whose content changed.
+
+        A failed fetch keeps the previous snapshot rather than blanking the layer.
+        """
+        since = time_filter()
+
+        def fetch(name):
+            try:
+                return fetch_feed(name, since, raise_errors=True)
+            except Exception:
+                return None
+
+        fetched = map_feeds(fetch, names)
+        changed = []
+        for name in names:
+            data = fetched[name]
+            if data is None:
+                if name not in self.feeds:
+                    self.feeds[name] = {"type": "FeatureCollection", "features": []}
+                    changed.append(name)
+                continue
+            key = pipeline.feed_key(name, data)
+            if key != self.feed_keys.get(name):
+                changed.append(name)
+            self.feeds[name] = data
+            self.feed_keys[name] = key
+        return changed
+
+    def refresh_exposure(self, full=True):
+        """Reload the exposure snapshot (or patch it with a delta load); returns True when it changed."""
+        try:
+            snapshot = pipeline.load_exposure(self.engine, self.store, previous=self.snapshot, full=full)
+        except Exception as e:
+            print(f"❌ Exposure reload failed, keeping the previous snapshot: {e}")
+            return False
+        previous, self.snapshot = self.snapshot, snapshot
+        return previous is None or (previous["tiv_key"], previous["polygons_key"]) != (
+            snapshot["tiv_key"], snapshot["polygons_key"])
+
+    def publish(self):
+        started = time.perf_counter()
+        built_before = len(self.store.built)
+        state = pipeline.build(self.store, feeds=self.feeds, snapshot=self.snapshot, feed_keys=self.feed_keys)
+        with instrument.stage("render_page"):
+            html = render.assemble(state["page"]).get_root().render()
+        output.publish(self.path, html)
+        rebuilt = self.store.built[built_before:]
+        print(f"✅ Republished in {time.perf_counter() - started:.1f}s (rebuilt: {', '.join(rebuilt) or 'nothing'})")
+        instrument.finish_run(self.report_path, self.prometheus_path)
+        return state
+
+    def tick(self, now=None):
+        """Run whatever is due; returns the monotonic time of the next due refresh.
+
+        A failed rebuild is logged and leaves the last published page in place.
+        """
+        now = time.monotonic() if now is None else now
+        # Fetches and the rebuild they trigger are reported together
+        instrument.start_run()
+        changed = False
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="lens-exposure") as pool:
+            # The exposure reload overlaps the feed fetches
+            exposure_changed = None
+            if self.snapshot is None or now >= self.exposure_due:
+                exposure_changed = pool.submit(self.refresh_exposure)
+                self.exposure_due = now + self.exposure_interval
+                if self.delta_interval:
+                    self.delta_due = now + self.delta_interval
+            elif self.delta_interval and now >= self.delta_due:
+                exposure_changed = pool.submit(self.refresh_exposure, False)
+                self.delta_due = now + self.delta_interval
+
+            due = [name for name, at in self.due.items() if now >= at]
+            if due:
+                changed_feeds = self.refresh_feeds(due)
+                if changed_feeds:
+                    print(f"🔹 Changed feeds: {', '.join(changed_feeds)}")
+                changed |= bool(changed_feeds)
+                for name in due:
+                    self.due[name] = now + self.intervals[name]
+            if exposure_changed is not None:
+                changed |= exposure_changed.result()
+
+        if (changed or self.stale) and self.snapshot is not None:
+            try:
+                self.publish()
+                self.stale = False
+            except Exception as e:
+                print(f"❌ Rebuild failed, keeping the last published page: {e}")
+                self.stale = True
+        return min([self.exposure_due, *([self.delta_due] if self.delta_interval else []), *self.due.values()])
+
+    def run_forever(self):
+        # One engine for the daemon's lifetime, so credentials are asked for once
+        if self.engine is None:
+            self.engine = exposure.get_engine()
+        output.publish(pipeline.NATIVE_ZOOM_HTML, render.new_map().get_root().render())
+        print(f"✅ LENS daemon started (exposure every {self.exposure_interval / HOUR:g}h)")
+        while True:
+            next_due = self.tick()
+            time.sleep(max(1.0, next_due - time.monotonic()))
+
+
+def main(argv=None, store=None, engine=None):
+    parser = argparse.ArgumentParser(description="Keep the LENS map fresh with per-feed refresh schedules.")
+    parser.add_argument("--output", default=pipeline.OUTPUT_HTML)
+    parser.add_argument("--exposure-hours", type=float, default=EXPOSURE_INTERVAL / HOUR,
+                        help="hours between exposure table reloads")
+    parser.add_argument("--delta-minutes", type=float, default=None,
+                        help="minutes between delta loads of changed accounts (default: off, or 15 with LENS_EXPOSURE_DELTA=1)")
+    parser.add_argument("--report", default=instrument.REPORT_NAME, help="JSON run report path ('' to skip)")
+    parser.add_argument("--prometheus", metavar="PATH", help="also write a Prometheus textfile here")
+    args = parser.parse_args(argv)
+    if args.delta_minutes:
+        delta.ENABLED = True
+    daemon = Daemon(store=store, engine=engine, path=args.output, exposure_interval=args.exposure_hours * HOUR,
+                    delta_interval=args.delta_minutes and args.delta_minutes * MINUTE,
+                    report_path=args.report, prometheus_path=args.prometheus)
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,544 @@
+"""Exposure data from Postgres: geography polygons and trapped exposure per location."""
+
+import getpass
+import json
+import os
+
+import geopandas as gpd
+import pandas as pd
+from shapely import wkb
+from shapely.geometry import shape
+
+
+def get_engine():
+    """SQLAlchemy engine from DB_URL, or PG* environment variables / prompts."""
+    from sqlalchemy import create_engine
+
+    db_url = os.environ.get("DB_URL")
+
+    if not db_url:
+        pg_user = os.environ.get("PGUSER") or input("Postgres user: ")
+        pg_host = os.environ.get("PGHOST") or input("Postgres host: ")
+        pg_port = os.environ.get("PGPORT") or input("Postgres port (default 5432): ") or "5432"
+        pg_db = os.environ.get("PGDATABASE") or input("Postgres database: ")
+        pg_password = getpass.getpass("Postgres password (hidden): ")
+
+        db_url = f"postgresql+psycopg2://{pg_user}:{pg_password}@{pg_host}:{pg_port}/{pg_db}"
+        del pg_password
+
+    # Pooled, so the exposure-table and TIV queries can run on separate connections at once
+    return create_engine(db_url, pool_pre_ping=True)
+
+
+country_codes = {
+    "Afghanistan": "AF",
+    "Åland Islands": "AX",
+    "Albania": "AL",
+    "Algeria": "DZ",
+    "American Samoa": "AS",
+    "Andorra": "AD",
+    "Angola": "AO",
+    "Anguilla": "AI",
+    "Antarctica": "AQ",
+    "Antigua and Barbuda": "AG",
+    "Argentina": "AR",
+    "Armenia": "AM",
+    "Aruba": "AW",
+    "Australia": "AU",
+    "Austria": "AT",
+    "Azerbaijan": "AZ",
+    "Bahamas": "BS",
+    "Bahrain": "BH",
+    "Bangladesh": "BD",
+    "Barbados": "BB",
+    "Belarus": "BY",
+    "Belgium": "BE",
+    "Belize": "BZ",
+    "Benin": "BJ",
+    "Bermuda": "BM",
+    "Bhutan": "BT",
+    "Bolivia": "BO",
+    "Bosnia and Herzegovina": "BA",
+    "Botswana": "BW",
+    "Bouvet Island": "BV",
+    "Brazil": "BR",
+    "British Indian Ocean Territory": "IO",
+    "Brunei": "BN",
+    "Bulgaria": "BG",
+    "Burkina Faso": "BF",
+    "Burundi": "BI",
+    "Cambodia": "KH",
+    "Cameroon": "CM",
+    "Canada": "CA",
+    "Cape Verde": "CV",
+    "Cayman Islands": "KY",
+    "Central African Republic": "CF",
+    "Chad": "TD",
+    "Chile": "CL",
+    "China": "CN",
+    "Christmas Island": "CX",
+    "Cocos (Keeling) Islands": "CC",
+    "Colombia": "CO",
+    "Comoros": "KM",
+    "Congo (Congo-Brazzaville)": "CG",
+    "Cook Islands": "CK",
+    "Costa Rica": "CR",
+    "Côte d'Ivoire": "CI",
+    "Croatia": "HR",
+    "Cuba": "CU",
+    "Cyprus": "CY",
+    "Czech Republic": "CZ",
+    "Denmark": "DK",
+    "Djibouti": "DJ",
+    "Dominica": "DM",
+    "Dominican Republic": "DO",
+    "East Timor": "TL",
+    "Ecuador": "EC",
+    "Egypt": "EG",
+    "El Salvador": "SV",
+    "Equatorial Guinea": "GQ",
+    "Eritrea": "ER",
+    "Estonia": "EE",
+    "Ethiopia": "ET",
+    "Falkland Islands (Malvinas)": "FK",
+    "Faroe Islands": "FO",
+    "Fiji": "FJ",
+    "Finland": "FI",
+    "France": "FR",
+    "French Guiana": "GF",
+    "French Polynesia": "PF",
+    "French Southern Territories": "TF",
+    "Gabon": "GA",
+    "Gambia": "GM",
+    "Georgia": "GE",
+    "Germany": "DE",
+    "Ghana": "GH",
+    "Gibraltar": "GI",
+    "Greece": "GR",
+    "Greenland": "GL",
+    "Grenada": "GD",
+    "Guadeloupe": "GP",
+    "Guam": "GU",
+    "Guatemala": "GT",
+    "Guinea": "GN",
+    "Guinea-Bissau": "GW",
+    "Guyana": "GY",
+    "Haiti": "HT",
+    "Heard and McDonald Islands": "HM",
+    "Honduras": "HN",
+    "Hong Kong": "HK",
+    "Hungary": "HU",
+    "Iceland": "IS",
+    "India": "IN",
+    "Indonesia": "ID",
+    "Iran": "IR",
+    "Iraq": "IQ",
+    "Ireland": "IE",
+    "Israel": "IL",
+    "Italy": "IT",
+    "Jamaica": "JM",
+    "Japan": "JP",
+    "Jordan": "JO",
+    "Kazakhstan": "KZ",
+    "Kenya": "KE",
+    "Kiribati": "KI",
+    "North Korea": "KP",
+    "South Korea": "KR",
+    "Kuwait": "KW",
+    "Kyrgyzstan": "KG",
+    "Laos": "LA",
+    "Latvia": "LV",
+    "Lebanon": "LB",
+    "Lesotho": "LS",
+    "Liberia": "LR",
+    "Libya": "LY",
+    "Liechtenstein": "LI",
+    "Lithuania": "LT",
+    "Luxembourg": "LU",
+    "North Macedonia": "MK",
+    "Madagascar": "MG",
+    "Malawi": "MW",
+    "Malaysia": "MY",
+    "Maldives": "MV",
+    "Mali": "ML",
+    "Malta": "MT",
+    "Marshall Islands": "MH",
+    "Martinique": "MQ",
+    "Mauritania": "MR",
+    "Mauritius": "MU",
+    "Mayotte": "YT",
+    "Mexico": "MX",
+    "Micronesia, Federated States of": "FM",
+    "Moldova": "MD",
+    "Monaco": "MC",
+    "Mongolia": "MN",
+    "Montenegro": "ME",
+    "Montserrat": "MS",
+    "Morocco": "MA",
+    "Mozambique": "MZ",
+    "Myanmar": "MM",
+    "Namibia": "NA",
+    "Nauru": "NR",
+    "Nepal": "NP",
+    "Netherlands": "NL",
+    "New Caledonia": "NC",
+    "New Zealand": "NZ",
+    "Nicaragua": "NI",
+    "Niger": "NE",
+    "Nigeria": "NG",
+    "Niue": "NU",
+    "Norfolk Island": "NF",
+    "Northern Mariana Islands": "MP",
+    "Norway": "NO",
+    "Oman": "OM",
+    "Pakistan": "PK",
+    "Palau": "PW",
+    "Panama": "PA",
+    "Papua New Guinea": "PG",
+    "Paraguay": "PY",
+    "Peru": "PE",
+    "Philippines": "PH",
+    "Pitcairn": "PN",
+    "Poland": "PL",
+    "Portugal": "PT",
+    "Puerto Rico": "PR",
+    "Qatar": "QA",
+    "Réunion": "RE",
+    "Romania": "RO",
+    "Russia": "RU",
+    "Rwanda": "RW",
+    "Saint Kitts and Nevis": "KN",
+    "Saint Lucia": "LC",
+    "Saint Vincent and the Grenadines": "VC",
+    "Samoa": "WS",
+    "San Marino": "SM",
+    "Sao Tome and Principe": "ST",
+    "Saudi Arabia": "SA",
+    "Senegal": "SN",
+    "Serbia": "RS",
+    "Seychelles": "SC",
+    "Sierra Leone": "SL",
+    "Singapore": "SG",
+    "Slovakia": "SK",
+    "Slovenia": "SI",
+    "Solomon Islands": "SB",
+    "Somalia": "SO",
+    "South Africa": "ZA",
+    "South Georgia and the South Sandwich Islands": "GS",
+    "Spain": "ES",
+    "Sri Lanka": "LK",
+    "St. Helena": "SH",
+    "St. Pierre and Miquelon": "PM",
+    "Sudan": "SD",
+    "Suriname": "SR",
+    "Svalbard and Jan Mayen Islands": "SJ",
+    "Swaziland": "SZ",
+    "Sweden": "SE",
+    "Switzerland": "CH",
+    "Syria": "SY",
+    "Taiwan": "TW",
+    "Tajikistan": "TJ",
+    "Tanzania": "TZ",
+    "Thailand": "TH",
+    "Togo": "TG",
+    "Tokelau": "TK",
+    "Tonga": "TO",
+    "Trinidad and Tobago": "TT",
+    "Tunisia": "TN",
+    "Turkey": "TR",
+    "Turkmenistan": "TM",
+    "Turks and Caicos Islands": "TC",
+    "Tuvalu": "TV",
+    "Uganda": "UG",
+    "Ukraine": "UA",
+    "United Arab Emirates": "AE",
+    "United Kingdom": "GB",
+    "United States of America": "US",
+    "Uruguay": "UY",
+    "Uzbekistan": "UZ",
+    "Vanuatu": "VU",
+    "Vatican City": "VA",
+    "Venezuela": "VE",
+    "Vietnam": "VN",
+    "Virgin Islands (British)": "VG",
+    "Virgin Islands (U.S.)": "VI",
+    "Wallis and Futuna": "WF",
+    "Western Sahara": "EH",
+    "Yemen": "YE",
+    "Zambia": "ZM",
+    "Zimbabwe": "ZW"
+}
+
+code_to_country = {v: k for k, v in country_codes.items()}
+
+
+# -----------------------
+# EXPOSURE POLYGONS
+# -----------------------
+
+EXPOSURE_TABLE = "raw_smint.exposure_geography_zone"
+GEOM_COLUMN = "Geometry"
+
+# Geography levels drawn as trapped exposure rollups
+LAYER_NAMES = {'1': "Countries", '2': "US States"}
+
+
+def safe_geom(val):
+    from shapely.errors import ShapelyError
+
+    try:
+        if val is None:
+            return None
+        if isinstance(val, bytes):
+            return wkb.loads(val)
+        if isinstance(val, str):
+            try:
+                return wkb.loads(val, hex=True)
+            except ShapelyError:
+                return shape(json.loads(val))
+    except Exception as e:
+        print(f"Skipping invalid Geometry: {e}")
+        return None
+
+
+def read_exposure_table(engine):
+    """Raw exposure geography rows (geometry still encoded)."""
+    try:
+        exposure_df = pd.read_sql(f"SELECT * FROM {EXPOSURE_TABLE};", engine)
+        print(f"✅ Loaded exposure table: {len(exposure_df):,} rows")
+        return exposure_df
+    except Exception as e:
+        print("❌ Failed to load exposure polygons:", e)
+        return None
+
+
+def exposure_polygons(exposure_df):
+    """Decode exposure geography rows into a GeoDataFrame."""
+    if exposure_df is None:
+        exposure_gdf = gpd.GeoDataFrame(columns=['Geometry'], geometry='Geometry', crs="EPSG:4326")
+    else:
+        try:
+            exposure_df = exposure_df.copy()
+            exposure_df['Geometry'] = exposure_df[GEOM_COLUMN].apply(safe_geom)
+            exposure_df = exposure_df[exposure_df['Geometry'].notna()].copy()
+            exposure_gdf = gpd.GeoDataFrame(exposure_df, geometry='Geometry', crs="EPSG:4326")
+        except Exception as e:
+            print("❌ Failed to load exposure polygons:", e)
+            exposure_gdf = gpd.GeoDataFrame(columns=['Geometry'], geometry='Geometry', crs="EPSG:4326")
+
+    for col in ['ExposureGeographyId','Name']:
+        if col not in exposure_gdf.columns:
+            print(f"⚠️ exposure_gdf missing {col} column — adjust mapping if needed.")
+    return exposure_gdf
+
+
+# -----------------------
+# TIV DATA WITH PARTICIPANTS, EXCHANGE RATES, AND GEO COORDINATES
+# -----------------------
+
+ded_cols = {
+    'eq': ['eqcv1ded','eqcv2ded','eqcv3ded'],
+    'ws': ['wscv1ded','wscv2ded','wscv3ded'],
+    'to': ['tocv1ded','tocv2ded','tocv3ded'],
+    'fl': ['flcv1ded','flcv2ded','flcv3ded'],
+    'fr': ['frcv1ded','frcv2ded','frcv3ded']
+}
+
+# Coverage values per peril, in the same coverage order as ded_cols
+val_cols = {peril: [col.replace('ded', 'val') for col in cols] for peril, cols in ded_cols.items()}
+
+# Location columns the financial terms are applied to (lens/terms.py)
+TERM_COLUMNS = [col for peril in ded_cols for col in (*val_cols[peril], *ded_cols[peril])]
+
+LOC_TABLE = "g_exposure_reporting.g_loc_incremental_latest_no_endorsements"
+ACC_TABLE = "g_exposure_reporting.g_acc_incremental_latest_no_endorsements"
+
+# Change-tracking timestamp on both incremental tables, used by delta loads (lens/delta.py)
+DELTA_COLUMN = os.environ.get("LENS_DELTA_COLUMN", "last_updated")
+
+# {changed_accounts}, {loc_filter} and {acc_filter} are empty for a full load
+TIV_SQL_TEMPLATE = """
+
+WITH {changed_accounts}loc_dedup AS (
+    SELECT DISTINCT
+        accntnum AS account_number,
+        cntrycode AS country_code,
+        latitude,
+        longitude,
+        "100% tiv" AS total_insurable_value,
+        eqsitelcur AS value_currency,
+        rule AS participant_name,
+        locname,
+        occtype AS occupancy,
+        {loc_terms}
+    FROM {loc_table}
+    WHERE cntrycode IS NOT NULL
+      AND latitude IS NOT NULL
+      AND longitude IS NOT NULL{loc_filter}
+),
+acc_usd AS (
+    SELECT DISTINCT
+        a.accntnum AS account_number,
+        a.accntname,
+        a.rule AS participant_name,
+        a.blanlimamt,  -- raw policy limit
+        a.partof AS participant_share,
+        -- Convert attachment and (whole-layer) limit to USD; lens.terms applies the share after the layer
+        a.undcovamt / NULLIF(er_att.conversion_rate, 0) AS attachment_point_usd,
+        a.blanlimamt / NULLIF(er_lim.conversion_rate, 0) AS policy_limit_usd
+    FROM {acc_table} a
+    LEFT JOIN s_misc.exchange_rates_monthend er_att
+        ON a.undcovcur = er_att.converted_currency AND er_att.monthyear = 202510
+    LEFT JOIN s_misc.exchange_rates_monthend er_lim
+        ON a.blanlimcur = er_lim.converted_currency AND er_lim.monthyear = 202510{acc_filter}
+),
+trapped_per_location AS (
+    SELECT
+        l.account_number,
+        l.country_code,
+        l.latitude,
+        l.longitude,
+        COALESCE(l.participant_name, a.participant_name, 'Unassigned') AS participant_name,
+        l.total_insurable_value,
+        l.value_currency,
+        a.attachment_point_usd,
+        a.policy_limit_usd,
+        a.participant_share,
+        a.blanlimamt,
+        l.locname,
+        a.accntname,
+        l.occupancy,
+        {tpl_terms}
+    FROM loc_dedup l
+    LEFT JOIN acc_usd a
+        ON l.account_number = a.account_number
+       AND l.participant_name = a.participant_name  
+)
+-- Values and deductibles stay in the location currency; lens.terms applies the
+-- per-peril deductibles, attachment, limit and participant share to them
+SELECT
+    tpl.account_number,
+    tpl.country_code,
+    tpl.latitude,
+    tpl.longitude,
+    tpl.participant_name,
+    tpl.locname,
+    tpl.accntname,
+    tpl.occupancy,
+    tpl.total_insurable_value,
+    1.0 / NULLIF(er_val.conversion_rate, 0) AS value_to_usd,
+    {terms},
+    tpl.attachment_point_usd,
+    tpl.policy_limit_usd,
+    tpl.participant_share,
+    tpl.blanlimamt
+FROM trapped_per_location tpl
+LEFT JOIN s_misc.exchange_rates_monthend er_val
+    ON tpl.value_currency = er_val.converted_currency AND er_val.monthyear = 202510
+ORDER BY
+    tpl.country_code,
+    tpl.latitude,
+    tpl.longitude,
+    tpl.participant_name,
+    tpl.locname,
+    tpl.accntname,
+    tpl.account_number;
+
+"""
+
+_TERM_SQL = {
+    "loc_terms": ",\n        ".join(TERM_COLUMNS),
+    "tpl_terms": ",\n        ".join(f"l.{col}" for col in TERM_COLUMNS),
+    "terms": ",\n    ".join(f"tpl.{col}" for col in TERM_COLUMNS),
+}
+
+TIV_SQL = TIV_SQL_TEMPLATE.format(
+    changed_accounts="", loc_filter="", acc_filter="", loc_table=LOC_TABLE, acc_table=ACC_TABLE, **_TERM_SQL)
+
+CHANGED_ACCOUNTS_SQL = f"""
+SELECT accntnum AS account_number FROM {LOC_TABLE}
+WHERE {DELTA_COLUMN} > :since AND {DELTA_COLUMN} <= :until
+UNION
+SELECT accntnum AS account_number FROM {ACC_TABLE}
+WHERE {DELTA_COLUMN} > :since AND {DELTA_COLUMN} <= :until
+"""
+
+# TIV rows of the accounts changed in (:since, :until] only
+TIV_DELTA_SQL = TIV_SQL_TEMPLATE.format(
+    changed_accounts=f"changed_accounts AS ({CHANGED_ACCOUNTS_SQL}),\n",
+    loc_filter="\n      AND accntnum IN (SELECT account_number FROM changed_accounts)",
+    acc_filter="\n    WHERE a.accntnum IN (SELECT account_number FROM changed_accounts)",
+    loc_table=LOC_TABLE, acc_table=ACC_TABLE, **_TERM_SQL,
+)
+
+
+# Rows per read_sql chunk when streaming the TIV query into the location store
+TIV_CHUNK_ROWS = 250_000
+
+
+def read_tiv(engine, chunksize=None):
+    """Location rows with their financial terms (an iterator of frames when chunksize is set).
+
+    Trapped exposure is computed from the terms when the rows are ingested (lens.terms).
+    """
+    from sqlalchemy import text
+
+    if chunksize:
+        return pd.read_sql(text(TIV_SQL), con=engine, chunksize=chunksize)
+
+    tiv_df = pd.read_sql(text(TIV_SQL), con=engine)
+
+    if tiv_df.empty:
+        print("⚠️ No data returned from SQL query.")
+    else:
+        print(f"✅ Loaded {len(tiv_df)} rows of exposure data.")
+        print(tiv_df.head())
+    return tiv_df
+
+
+def db_now(engine):
+    """The database clock, so delta windows do not depend on this host's."""
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT CURRENT_TIMESTAMP")).scalar()
+
+
+def read_tiv_delta(engine, since, until, chunksize=None):
+    """(changed account numbers, their recomputed TIV rows) for changes in (since, until]."""
+    from sqlalchemy import text
+
+    params = {"since": since, "until": until}
+    accounts = pd.read_sql(text(CHANGED_ACCOUNTS_SQL), con=engine, params=params)["account_number"]
+    rows = pd.read_sql(text(TIV_DELTA_SQL), con=engine, params=params, chunksize=chunksize)
+    print(f"✅ {len(accounts):,} account(s) changed since {since}")
+    return accounts, rows
+
+
+def trapped_by_country(locations):
+    """Trapped exposure per country name (from a lens.store.LocationStore)."""
+    totals = locations.sum_by('country_name')
+    if totals.empty:
+        return pd.DataFrame(columns=['country_name','trapped_exposure_usd'])
+    return totals.rename_axis('country_name').reset_index()
+
+
+def attach_trapped(exposure_gdf, locations):
+    """Exposure polygons with their trapped exposure and participant names."""
+    trapped_agg = trapped_by_country(locations)
+    if not trapped_agg.empty and not exposure_gdf.empty:
+        exposure_gdf = exposure_gdf.merge(trapped_agg, left_on='Name', right_on='country_name', how='left')
+        exposure_gdf['trapped_exposure_usd'] = exposure_gdf['trapped_exposure_usd'].fillna(0)
+        exposure_gdf = gpd.GeoDataFrame(exposure_gdf, geometry='Geometry', crs="EPSG:4326")
+    else:
+        exposure_gdf = exposure_gdf.copy()
+
+    if 'country_name' in locations.codes and 'Name' in exposure_gdf.columns:
+        participant_map = locations.participants_by('country_name')
+
+        exposure_gdf = exposure_gdf.reset_index(drop=True)
+
+        exposure_gdf['participant_name'] = exposure_gdf['Name'].map(participant_map).fillna('')
+    else:
+        exposure_gdf['participant_name'] = ''
+    return exposure_gdf
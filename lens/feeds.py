@@ -0,0 +1,177 @@
+"""ArcGIS hazard feeds: where they live and how they are fetched."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from lens import instrument
+
+PUBLIC_SERVICES = "https://services9.arcgis.com/RHVPKKiFTONKtxq3/arcgis/rest/services"
+
+# LENS_ARCGIS_URL points every feed at another host, e.g. the local mock (lens/mockserver.py)
+ARCGIS_SERVICES = os.environ.get("LENS_ARCGIS_URL", PUBLIC_SERVICES).rstrip("/")
+HURRICANES_URL = f"{ARCGIS_SERVICES}/Active_Hurricanes_v1/FeatureServer"
+SEISMIC_URL = f"{ARCGIS_SERVICES}/USGS_Seismic_Data_v1/FeatureServer"
+WILDFIRES_URL = f"{ARCGIS_SERVICES}/USA_Wildfires_v1/FeatureServer"
+NWS_URL = f"{ARCGIS_SERVICES}/NWS_Watches_Warnings_v1/FeatureServer"
+
+# How far back the time-filtered feeds look
+LOOKBACK_DAYS = 7
+
+# Upper bound on follow-up pages when a query reports exceededTransferLimit
+MAX_PAGES = 50
+
+# Feeds fetched at once; each request mostly waits on the service
+FETCH_WORKERS = int(os.environ.get("LENS_FETCH_WORKERS", 6))
+
+# Every feed is fetched once per run; "{since}" is replaced by the lookback timestamp
+FEEDS = {
+    "hurricane_forecast": {
+        "label": "hurricane forecast track",
+        "url": f"{HURRICANES_URL}/0/query",
+        "where": "1=1",
+    },
+    "hurricane_locations": {
+        "label": "hurricane locations",
+        "url": f"{HURRICANES_URL}/1/query",
+        "where": "1=1",
+    },
+    "hurricane_cone": {
+        "label": "hurricane forecast cone",
+        "url": f"{HURRICANES_URL}/2/query",
+        "where": "1=1",
+    },
+    "hurricane_observed": {
+        "label": "hurricane observed track / danger area",
+        "url": f"{HURRICANES_URL}/3/query",
+        "where": "1=1",
+    },
+    "hurricane_ts_prob": {
+        "label": "tropical storm wind probability",
+        "url": f"{HURRICANES_URL}/4/query",
+        "where": "1=1",
+    },
+    "hurricane_hf_prob": {
+        "label": "hurricane force wind probability",
+        "url": f"{HURRICANES_URL}/9/query",
+        "where": "1=1",
+    },
+    "eq_points": {
+        "label": "earthquake points",
+        "url": f"{SEISMIC_URL}/0/query",
+        "where": "eventTime >= TIMESTAMP '{since}'",
+    },
+    "eq_intensity": {
+        "label": "shake intensity polygons",
+        "url": f"{SEISMIC_URL}/1/query",
+        "where": "eventTime >= TIMESTAMP '{since}'",
+    },
+    "wildfires": {
+        "label": "USA Wildfires (polygons only)",
+        "url": f"{WILDFIRES_URL}/1/query",
+        "where": "CreateDate >= TIMESTAMP '{since}'",
+        "params": {"resultRecordCount": 4000},
+    },
+    "floods": {
+        "label": "NWS flood events",
+        "url": f"{NWS_URL}/6/query",
+        "where": "1=1",
+    },
+}
+
+
+def time_filter(days=LOOKBACK_DAYS):
+    """ArcGIS TIMESTAMP literal for `days` ago (UTC)."""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    return since.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def feed_params(name, since=None):
+    feed = FEEDS[name]
+    since = since or time_filter()
+    return {"where": feed["where"].format(since=since), "outFields": "*", "f": "geojson", **feed.get("params", {})}
+
+
+def feed_path(name):
+    """A feed's /query path below the services root."""
+    return FEEDS[name]["url"][len(ARCGIS_SERVICES):]
+
+
+def use_services(base_url):
+    """Point every feed at another services root (same service/layer paths)."""
+    global ARCGIS_SERVICES
+    base_url = base_url.rstrip("/")
+    for name, feed in FEEDS.items():
+        feed["url"] = base_url + feed_path(name)
+    ARCGIS_SERVICES = base_url
+
+
+def exceeded_transfer_limit(data):
+    # f=geojson reports it under "properties", f=json at the top level
+    return bool(data.get("exceededTransferLimit") or (data.get("properties") or {}).get("exceededTransferLimit"))
+
+
+def _get_json(url, params, timeout, feed):
+    r = requests.get(url, params=params, timeout=timeout)
+    r.raise_for_status()
+    instrument.count("bytes_fetched", len(r.content), feed=feed or url)
+    return r.json()
+
+
+def fetch_geojson(url, params, timeout=60, raise_errors=False, feed=None):
+    """GeoJSON FeatureCollection from an ArcGIS /query; an empty collection on failure unless raise_errors.
+
+    Pages are followed with resultOffset while the service reports
+    exceededTransferLimit. ``feed`` labels the fetched byte and feature counts
+    in the run report.
+    """
+    try:
+        data = _get_json(url, params, timeout, feed)
+        if "features" in data:
+            offset = int(params.get("resultOffset", 0))
+            page = data
+            for _ in range(MAX_PAGES):
+                if not exceeded_transfer_limit(page) or not page["features"]:
+                    break
+                offset += len(page["features"])
+                page = _get_json(url, {**params, "resultOffset": offset}, timeout, feed)
+                data["features"].extend(page.get("features", []))
+            else:
+                print(f"⚠️ Stopped paging {url} after {MAX_PAGES} pages")
+            data.pop("exceededTransferLimit", None)
+            (data.get("properties") or {}).pop("exceededTransferLimit", None)
+            instrument.count("features_fetched", len(data["features"]), feed=feed or url)
+            return data
+        else:
+            print(f"⚠️ No 'features' in response from {url}. Keys: {list(data.keys())}")
+            if raise_errors:
+                raise ValueError(f"no 'features' in response from {url}")
+            return {"type": "FeatureCollection", "features": []}
+    except Exception as e:
+        print(f"❌ Error fetching {url}: {e}")
+        if raise_errors:
+            raise
+        return {"type": "FeatureCollection", "features": []}
+
+
+def fetch_feed(name, since=None, raise_errors=False):
+    print(f"Fetching {FEEDS[name]['label']}...")
+    with instrument.stage(f"fetch_{name}"):
+        return fetch_geojson(FEEDS[name]["url"], feed_params(name, since), raise_errors=raise_errors, feed=name)
+
+
+def map_feeds(fetch, names, workers=FETCH_WORKERS):
+    """{name: fetch(name)} with up to ``workers`` fetches in flight."""
+    names = list(names)
+    if workers <= 1 or len(names) <= 1:
+        return {name: fetch(name) for name in names}
+    with ThreadPoolExecutor(max_workers=min(workers, len(names)), thread_name_prefix="lens-fetch") as pool:
+        return dict(zip(names, pool.map(fetch, names)))
+
+
+def fetch_feeds(names=None):
+    """Fetch the named feeds (all by default) concurrently, with one shared lookback timestamp."""
+    since = time_filter()
+    return map_feeds(lambda name: fetch_feed(name, since), names or FEEDS)
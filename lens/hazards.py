@@ -0,0 +1,606 @@
+"""Hazard feed layers and the hazard GeoDataFrames used for the exposure joins."""
+
+from datetime import datetime, timezone
+from functools import cache
+
+import folium
+import geopandas as gpd
+from folium import FeatureGroup
+from shapely.geometry import LineString, MultiPolygon, Polygon, shape
+from shapely.ops import transform, unary_union
+
+from lens.artifacts import content_hash
+from lens.serialize import (
+    MAP_ENCODING, feature_collection, latlngs, quantize_geojson, quantize_topojson
+)
+
+# -----------------------
+# SETTINGS
+# -----------------------
+BUFFER_KM = 100  # Buffer around observed tracks in km
+SS_COLORS = {1: "#FFFF00", 2: "#FFA500", 3: "#FF4500", 4: "#FF0000", 5: "#800000"}
+
+# Hurricane sub-layers in drawing order, with the feed each one comes from
+HURRICANE_LAYERS = [
+    ("Observed Track", "hurricane_observed"),
+    ("Forecast Track", "hurricane_forecast"),
+    ("Forecast Cone", "hurricane_cone"),
+    ("Tropical Storm Prob", "hurricane_ts_prob"),
+    ("Hurricane Force Prob", "hurricane_hf_prob"),
+]
+
+
+@cache
+def mercator_transforms():
+    """(to EPSG:3857, back to EPSG:4326) transforms for buffering in meters."""
+    import pyproj
+
+    wgs84 = pyproj.CRS("EPSG:4326")
+    web_mercator = pyproj.CRS("EPSG:3857")
+    project = pyproj.Transformer.from_crs(wgs84, web_mercator, always_xy=True).transform
+    project_back = pyproj.Transformer.from_crs(web_mercator, wgs84, always_xy=True).transform
+    return project, project_back
+
+
+def safe_geodataframe(data_list, crs="EPSG:4326"):
+    if not data_list:
+        return gpd.GeoDataFrame(columns=['geometry'], geometry='geometry', crs=crs)
+    filtered_data = [item for item in data_list if item.get('geometry') is not None]
+    if not filtered_data:
+        return gpd.GeoDataFrame(columns=['geometry'], geometry='geometry', crs=crs)
+    return gpd.GeoDataFrame(filtered_data, geometry='geometry', crs=crs)
+
+
+def get_bounds_safe(geom):
+    """Return [[south, west], [north, east]] for Polygon/MultiPolygon."""
+    try:
+        shp = shape(geom)
+        minx, miny, maxx, maxy = shp.bounds
+        return [[miny, minx], [maxy, maxx]]
+    except Exception as e:
+        print(f"Error computing bounds: {e}")
+        return None
+
+
+def hazard_layer(data, popup=None, **kwargs):
+    """Quantized GeoJson layer for a feed (TopoJson when MAP_ENCODING is "topojson")."""
+    if MAP_ENCODING == "topojson":
+        layer = folium.TopoJson(quantize_topojson(data), "objects.data", **kwargs)
+    else:
+        layer = folium.GeoJson(quantize_geojson(data), **kwargs)
+    if popup is not None:
+        layer.add_child(popup)
+    return layer
+
+
+# -----------------------
+# HURRICANE LOCATIONS
+# -----------------------
+
+def storm_location_bounds(location_data):
+    """Zoom bounds per storm from the hurricane location polygons (FeatureServer/1)."""
+    hurricane_location_bounds = {}
+    for feature in location_data.get("features", []):
+        geom_data = feature.get("geometry")
+        if not geom_data:
+            print(f"Skipping {feature.get('properties', {}).get('STORMNAME','Unknown')} with no geometry in FeatureServer/1")
+            continue
+
+        bounds = get_bounds_safe(geom_data)
+        if bounds:
+            storm_name = feature.get("properties", {}).get("STORMNAME", "Unknown")
+            hurricane_location_bounds[storm_name] = bounds
+    return hurricane_location_bounds
+
+
+def build_storm_layer(location_data):
+    """Red storm location polygons, or None when there are no storms."""
+    storm_polys = []
+    for feature in location_data.get('features', []):
+        storm_name = feature.get('properties', {}).get('STORMNAME', 'Unknown')
+        geom_data = feature.get('geometry')
+        if geom_data is None:
+            continue
+        try:
+            geom = shape(geom_data)
+        except Exception as e:
+            print(f"Skipping storm {storm_name} due to invalid geometry: {e}")
+            continue
+        storm_polys.append({"storm": storm_name, "geometry": geom})
+
+    storms_gdf = safe_geodataframe(storm_polys)
+    if storms_gdf.empty:
+        print("No storm data available to display on the map.")
+        return None
+
+    return folium.GeoJson(
+        feature_collection(storms_gdf.geometry.values, [{"storm": s} for s in storms_gdf["storm"]]),
+        style_function=lambda feature: {
+            'fillColor': 'red',
+            'color': 'red',
+            'weight': 2,
+            'fillOpacity': 0.4
+        },
+        tooltip=folium.GeoJsonTooltip(fields=[], aliases=[], localize=True)
+    )
+
+
+# -----------------------
+# HURRICANE TRACKS, CONES AND PROBABILITIES
+# -----------------------
+
+def get_color(prob, layer_name):
+    if layer_name == "Hurricane Force Prob":
+        if prob <= 20: return "#7EFC0058"
+        elif prob <= 40: return "#FFFF003E"
+        elif prob <= 60: return "#FFA60052"
+        elif prob <= 80: return "#FF000050"
+        else: return "#80008045"
+    elif layer_name == "Tropical Storm Prob":
+        return "#f1e6e6b4"
+    elif layer_name == "Forecast Cone":
+        return "#87CEFA50"
+    elif layer_name == "Forecast Track":
+        return "#000000"
+
+
+def build_hurricane_layers(feeds):
+    """Current hurricane and observed track layers plus the GeoDataFrames joined to exposure.
+
+    Returns (hurricane_layer, observed_layer, observed_track_gdf, prob_gdf).
+    """
+    hurricane_layer = FeatureGroup(name="Current Hurricanes", show=True)
+    observed_layer = FeatureGroup(name="Observed Hurricane Tracks", show=False)
+    # GeoDataFrame container for observed hurricane track buffers (for exposure analysis)
+    observed_track_features = []
+
+    all_buffers = []
+    max_ss_value = 0
+    storm_names_in_buffer = []
+
+    for layer_name, feed in HURRICANE_LAYERS:
+        features = feeds[feed].get("features", [])
+
+        if layer_name == "Hurricane Force Prob":
+            features = sorted(features, key=lambda f: f['properties'].get('PWIND120', 0))
+
+        for feature in features:
+            geom_data = feature.get("geometry")
+            if not geom_data:
+                continue
+
+            geom = shape(geom_data)
+            props = feature.get("properties", {})
+            storm_name = props.get("STORMNAME", "Unknown")
+            storm_type = props.get("STORMTYPE", "")
+            prob = props.get("PWIND120", 0)
+            saffir_scale = props.get("SS", 0)
+
+            popup_text = f"<b>{storm_name}</b><br>{layer_name}"
+            if layer_name.endswith("Prob"):
+                popup_text += f"<br>Probability: {prob}%"
+            elif layer_name == "Observed Track":
+                popup_text += f"<br>Category: {saffir_scale}"
+
+            if isinstance(geom, (Polygon, MultiPolygon)):
+                polygons = [geom] if isinstance(geom, Polygon) else geom.geoms
+                for poly in polygons:
+                    folium.Polygon(
+                        locations=latlngs(poly.exterior),
+                        color=get_color(prob, layer_name),
+                        weight=2,
+                        fill=True,
+                        fill_color=get_color(prob, layer_name),
+                        fill_opacity=0.35,
+                        popup=popup_text
+                    ).add_to(hurricane_layer)
+
+            elif isinstance(geom, LineString):
+                if layer_name == "Observed Track":
+                    if saffir_scale > 0:
+                        folium.PolyLine(
+                            locations=latlngs(geom),
+                            color="red",
+                            weight=3,
+                            opacity=0.7,
+                            popup=popup_text
+                        ).add_to(observed_layer)
+
+                        # Buffer
+                        project, project_back = mercator_transforms()
+                        buf_m = transform(project, geom).buffer(BUFFER_KM * 1000)
+                        buf_wgs84 = transform(project_back, buf_m)
+                        all_buffers.append(buf_wgs84)
+                        max_ss_value = max(max_ss_value, saffir_scale)
+                        storm_names_in_buffer.append(storm_name)
+
+                        # Store buffered polygon for exposure calculation
+                        observed_track_features.append({
+                            "storm": storm_name,
+                            "storm_type": storm_type,
+                            "saffir_scale": saffir_scale,
+                            "geometry": buf_wgs84
+                        })
+
+                elif layer_name == "Forecast Track":
+                    if "Hurricane" in storm_type:
+                        folium.PolyLine(
+                            locations=latlngs(geom),
+                            color="#0000FF",
+                            weight=3,
+                            opacity=0.7,
+                            popup=popup_text
+                        ).add_to(hurricane_layer)
+
+    # Observed track GDF
+    if observed_track_features:
+        observed_track_gdf = gpd.GeoDataFrame(observed_track_features, crs="EPSG:4326")
+        print(f"✅ observed_track_gdf created with {len(observed_track_gdf)} features.")
+    else:
+        observed_track_gdf = gpd.GeoDataFrame(columns=["storm", "storm_type", "saffir_scale", "geometry"], crs="EPSG:4326")
+        print("⚠️ No observed track geometries collected.")
+
+    # Merge all observed buffers
+    if all_buffers:
+        merged_buffer = unary_union(all_buffers)
+        polys = [merged_buffer] if isinstance(merged_buffer, Polygon) else merged_buffer.geoms
+        fill_color = SS_COLORS.get(int(max_ss_value), "red")
+        popup_text = f"Merged Hurricane Extent - Max Category {int(max_ss_value)}<br>Storms: {', '.join(set(storm_names_in_buffer))}"
+        for poly in polys:
+            folium.Polygon(
+                locations=latlngs(poly.exterior),
+                color="red",
+                weight=1,
+                fill=True,
+                fill_color=fill_color,
+                fill_opacity=0.3,
+                popup=popup_text
+            ).add_to(observed_layer)
+
+    prob_gdf = probability_gdf(feeds)
+    if not prob_gdf.empty:
+        for idx, row in prob_gdf.iterrows():
+            geom = row['geometry']
+            storm_name = row['storm']
+            prob = row['prob']
+            layer_name = "Hurricane Force Prob" if prob > 0 else "Tropical Storm Prob"
+
+            polygons = [geom] if isinstance(geom, Polygon) else geom.geoms
+            for poly in polygons:
+                folium.Polygon(
+                    locations=[latlngs(poly.exterior)],
+                    color=get_color(prob, layer_name),
+                    weight=2,
+                    fill=True,
+                    fill_color=get_color(prob, layer_name),
+                    fill_opacity=0.35,
+                    popup=f"{storm_name} - {layer_name} Probability: {prob}%"
+                ).add_to(hurricane_layer)
+
+    return hurricane_layer, observed_layer, observed_track_gdf, prob_gdf
+
+
+# Wind probability feed -> the sustained wind (knots) its probabilities are for
+PROB_WIND_KT = {"hurricane_ts_prob": 34, "hurricane_hf_prob": 64}
+
+
+def probability_gdf(feeds):
+    """Tropical storm and hurricane force wind probability polygons."""
+    prob_polys = []
+    for feed, wind_kt in PROB_WIND_KT.items():
+        for feature in feeds[feed].get('features', []):
+            geom_data = feature.get('geometry')
+            if not geom_data:
+                continue
+            try:
+                geom = shape(geom_data)
+            except Exception as e:
+                print(f"Skipping {feature.get('properties', {}).get('STORMNAME','Unknown')} due to invalid geometry: {e}")
+                continue
+
+            storm_name = feature['properties'].get('STORMNAME', 'Unknown')
+            prob = feature['properties'].get('PWIND120', 0)
+            prob_polys.append({"storm": storm_name, "prob": prob, "wind_kt": wind_kt, "geometry": geom})
+
+    return safe_geodataframe(prob_polys)
+
+
+# -----------------------
+# EARTHQUAKES
+# -----------------------
+
+def mag_color(mag):
+    if mag < 5.0: return "#ffff66"
+    elif mag < 6.0: return "#ce4823"
+    elif mag < 7.0: return "#c01e1e"
+    else: return "#fa0303"
+
+
+def build_earthquake_layer(eq_points_data):
+    eq_layer = FeatureGroup(name="Earthquakes", show=False)
+    for feat in eq_points_data.get("features", []):
+        props = feat.get("properties", {})
+        geom = feat.get("geometry", {})
+        coords = geom.get("coordinates", [])
+        if len(coords) < 2: continue
+        lon, lat = coords[:2]
+        mag = props.get("mag")
+        depth = props.get("depth") or props.get("depth_km") or props.get("z") or "?"
+        if mag is None or mag < 5: continue
+        col = mag_color(mag)
+        radius = 1 + mag * 1.5
+        folium.CircleMarker(
+            (lat, lon),
+            radius=radius,
+            color=col,
+            fill=True,
+            fill_color=col,
+            fill_opacity=0.8,
+            tooltip=f"M{mag}, Depth: {depth} km"
+        ).add_to(eq_layer)
+    return eq_layer
+
+
+def earthquake_gdf(eq_points_data):
+    """Earthquakes ≥6 as points."""
+    eq_records = []
+    eq_features = [
+        f for f in eq_points_data.get("features", [])
+        if isinstance(f.get("properties", {}).get("mag"), (int, float)) and f["properties"]["mag"] >= 6
+    ]
+    for i, f in enumerate(eq_features):
+        try:
+            geom = shape(f["geometry"])
+            eq_records.append({
+                "eq_id": f["properties"].get("id", f"eq{i}"),
+                "geometry": geom,
+                "mag": f["properties"].get("mag"),
+                "place": f["properties"].get("place", "Unknown")
+            })
+        except Exception as e:
+            print(f"⚠️ Skipping invalid earthquake feature {i}: {e}")
+
+    return gpd.GeoDataFrame(
+        eq_records,
+        geometry="geometry",
+        crs="EPSG:4326"
+    ) if eq_records else gpd.GeoDataFrame(
+        columns=["eq_id","geometry","mag","place"], geometry="geometry", crs="EPSG:4326"
+    )
+
+
+# -----------------------
+# SHAKE INTENSITY
+# -----------------------
+
+intensity_colors = {
+    4: "#ADD7FF6E",
+    5: "#00FF006C",
+    6: "#FFFF006A",
+    7: "#FFA6006F",
+    8: "#FF8C0067",
+    9: "#FF666661",
+    10:"#8B000068",
+}
+
+
+def intensity_color(intensity):
+    if intensity < 4:
+        return "#00000000"
+    return intensity_colors.get(int(intensity), "#000000")
+
+
+def build_shake_layer(eq_intensity_data):
+    shake_layer = FeatureGroup(name="Shake Intensity", show=False)
+    hazard_layer(
+        eq_intensity_data,
+        style_function=lambda f: {
+            "fillColor": intensity_color(f["properties"].get("grid_value", 0)),
+            "color": "none",
+            "fillOpacity": 0.6 if f["properties"].get("grid_value",0) >= 4 else 0,
+            "weight": 0
+        },
+        tooltip=folium.GeoJsonTooltip(fields=["grid_value"], aliases=["Intensity"])
+    ).add_to(shake_layer)
+    return shake_layer
+
+
+def shake_gdf(eq_intensity_data):
+    """Shake intensity contour polygons."""
+    shake_polys = []
+    for i, f in enumerate(eq_intensity_data.get("features", [])):
+        try:
+            geom = shape(f.get("geometry", {}))
+            if geom.is_empty:
+                continue
+            intensity = f.get("properties", {}).get("grid_value", 0)
+            shake_polys.append({"shake_id": f"shake{i}", "geometry": geom, "intensity": intensity})
+        except Exception as e:
+            print(f"⚠️ Skipping invalid shake polygon {i}: {e}")
+
+    return gpd.GeoDataFrame(
+        shake_polys, geometry="geometry", crs="EPSG:4326"
+    ) if shake_polys else gpd.GeoDataFrame(
+        columns=["shake_id","geometry","intensity"], geometry="geometry", crs="EPSG:4326"
+    )
+
+
+# -----------------------
+# USA WILDFIRES (polygons only)
+# -----------------------
+
+def fix_coordinates(feature):
+    geom_type = feature['geometry']['type']
+    coords = feature['geometry']['coordinates']
+    if geom_type == 'Polygon':
+        if abs(coords[0][0][0]) > 180:
+            feature['geometry']['coordinates'] = [[[y, x] for x, y in ring] for ring in coords]
+    elif geom_type == 'MultiPolygon':
+        if abs(coords[0][0][0][0]) > 180:
+            feature['geometry']['coordinates'] = [[[[y, x] for x, y in ring] for ring in poly] for poly in coords]
+    return feature
+
+
+def wildfire_features(wildfire_data):
+    """Coordinate-fixed wildfire perimeters with popup/tooltip text."""
+    features = wildfire_data.get("features", [])
+    if not features:
+        print("⚠️ No wildfire polygons returned for the last 7 days.")
+    features = [fix_coordinates(f) for f in features]
+
+    for feature in features:
+        props = feature['properties']
+        incident = props.get('IncidentName','')
+        category = props.get('FeatureCategory','')
+        timestamp = props.get('DateCurrent','')
+        try:
+            if timestamp:
+                dt = datetime.fromtimestamp(int(timestamp)/1000, tz=timezone.utc)
+                formatted_date = dt.strftime("%d/%m/%Y, %H:%M")
+            else:
+                formatted_date = ''
+        except:
+            formatted_date = str(timestamp)
+        feature['properties']['popup_text'] = f"Incident: {incident}<br>Category: {category}<br>Date: {formatted_date}"
+        feature['properties']['tooltip_date'] = formatted_date
+    return {"type": "FeatureCollection", "features": features}
+
+
+def wildfire_gdf(wildfire_data):
+    """Wildfire perimeters dissolved per incident (IncidentName), for the exposure join."""
+    fires = []
+    for i, f in enumerate(wildfire_data.get("features", [])):
+        try:
+            geom = shape(fix_coordinates(f)["geometry"])
+            if geom.is_empty:
+                continue
+            fires.append({
+                "incident": f.get("properties", {}).get("IncidentName") or f"fire{i}",
+                "geometry": geom if geom.is_valid else geom.buffer(0),
+            })
+        except Exception as e:
+            print(f"⚠️ Skipping invalid wildfire perimeter {i}: {e}")
+
+    if not fires:
+        return gpd.GeoDataFrame(columns=["incident","geometry"], geometry="geometry", crs="EPSG:4326")
+    return gpd.GeoDataFrame(fires, geometry="geometry", crs="EPSG:4326").dissolve(by="incident", as_index=False)
+
+
+def wildfire_style(feature):
+    category = feature['properties'].get('FeatureCategory','')
+    color = 'red' if category == 'Wildfire Daily Fire Perimeter' else 'orange'
+    return {'fillColor': color, 'color': color, 'weight': 2, 'fillOpacity': 0.4}
+
+
+def build_wildfire_layer(wildfire_data):
+    wildfire_layer = folium.FeatureGroup(name="USA Wildfires", show=False)
+    hazard_layer(
+        wildfire_features(wildfire_data),
+        style_function=wildfire_style,
+        tooltip=folium.GeoJsonTooltip(
+            fields=['IncidentName','FeatureCategory','tooltip_date'],
+            aliases=['Incident:','Category:','Date:'],
+            labels=True,
+            sticky=True
+        ),
+        popup=folium.GeoJsonPopup(
+            fields=['popup_text',],
+            aliases=['Details:'],
+            localize=True
+        )
+    ).add_to(wildfire_layer)
+    return wildfire_layer
+
+
+# -----------------------
+# NWS FLOOD EVENTS
+# -----------------------
+
+def flood_event_field(flood_data):
+    if not flood_data['features']:
+        return None
+    sample_props = flood_data['features'][0]['properties']
+    if 'Event' in sample_props:
+        return 'Event'
+    elif 'EVENT' in sample_props:
+        return 'EVENT'
+    return list(sample_props.keys())[0]
+
+
+def flood_feature_collection(flood_data):
+    event_field = flood_event_field(flood_data)
+    flood_features = {
+        "type": "FeatureCollection",
+        "features": [f for f in flood_data['features'] if 'flood' in f['properties'].get(event_field,'').lower()]
+    }
+    print(f"Total flood-related features: {len(flood_features['features'])}")
+    return flood_features, event_field
+
+
+# Flood events joined to exposure, most severe first; matched by substring like the map shading
+FLOOD_SEVERITIES = ["Flash Flood Warning", "Flood Warning", "Flood Watch"]
+
+
+def flood_severity(event_name):
+    event_name = str(event_name).lower()
+    for severity in FLOOD_SEVERITIES:
+        if severity.lower() in event_name:
+            return severity
+    return None
+
+
+def flood_gdf(flood_data):
+    """Flood watch and warning polygons with their severity, one row per distinct polygon.
+
+    flood_id hashes the polygon and its severity, so a polygon that is still in
+    the feed keeps its id (and its cached join) across refreshes.
+    """
+    event_field = flood_event_field(flood_data) if flood_data.get("features") else None
+    floods = []
+    for i, f in enumerate(flood_data.get("features", [])):
+        severity = flood_severity(f.get("properties", {}).get(event_field, ""))
+        if severity is None:
+            continue
+        try:
+            geom = shape(f.get("geometry", {}))
+            if geom.is_empty:
+                continue
+            geom = geom if geom.is_valid else geom.buffer(0)
+            floods.append({"flood_id": content_hash(severity, geom.wkb), "severity": severity, "geometry": geom})
+        except Exception as e:
+            print(f"⚠️ Skipping invalid flood polygon {i}: {e}")
+
+    if not floods:
+        return gpd.GeoDataFrame(columns=["flood_id","severity","geometry"], geometry="geometry", crs="EPSG:4326")
+    return gpd.GeoDataFrame(floods, geometry="geometry", crs="EPSG:4326").drop_duplicates("flood_id", ignore_index=True)
+
+
+def get_blue_shade(event_name):
+    event_name = event_name.lower()
+    if "flash flood warning" in event_name:
+        return "#08306b"
+    elif "flood warning" in event_name:
+        return "#2171b5"
+    elif "flood watch" in event_name:
+        return "#6baed6"
+    else:
+        return "#c6dbef"
+
+
+def build_flood_layer(flood_data):
+    flood_features, event_field = flood_feature_collection(flood_data)
+    flood_layer = folium.FeatureGroup(name="Flood Events", show=False)
+    hazard_layer(
+        flood_features,
+        style_function=lambda feature: {
+            "fillColor": get_blue_shade(feature['properties'][event_field]),
+            "color": get_blue_shade(feature['properties'][event_field]),
+            "weight": 2,
+            "fillOpacity": 0.5,
+        },
+        tooltip=folium.GeoJsonTooltip(
+            fields=[event_field],
+            aliases=["Event:"]
+        )
+    ).add_to(flood_layer)
+    return flood_layer
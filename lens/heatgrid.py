@@ -0,0 +1,138 @@
+"""Binned heat grids shared by every participant view of the exposure heatmap."""
+
+import numpy as np
+
+from lens.serialize import dumps
+
+# (min zoom, max zoom, cell size in degrees) for each heat grid band
+HEAT_ZOOM_BANDS = [
+    (3, 4, 1.0),
+    (5, 6, 0.25),
+    (7, 9, 0.05),
+]
+
+
+def build_heat_grid(lat, lon, weight, participant_codes, bands=HEAT_ZOOM_BANDS):
+    """Aggregate weights into square cells per zoom band with a per-participant breakdown.
+
+    Only non-empty (cell, participant) pairs are kept, so each band is sized by
+    the number of occupied cells rather than locations x participants.
+    """
+    lat = np.clip(np.asarray(lat, dtype=float), -90.0, 90.0)
+    lon = np.clip(np.asarray(lon, dtype=float), -180.0, 180.0)
+    weight = np.asarray(weight, dtype=float)
+    codes = np.asarray(participant_codes, dtype=np.int64)
+    n_participants = int(codes.max()) + 1 if len(codes) else 1
+
+    grid = []
+    for min_zoom, max_zoom, cell in bands:
+        n_rows = int(np.ceil(180.0 / cell))
+        n_cols = int(np.ceil(360.0 / cell))
+        row = np.minimum(((lat + 90.0) // cell).astype(np.int64), n_rows - 1)
+        col = np.minimum(((lon + 180.0) // cell).astype(np.int64), n_cols - 1)
+
+        # One unique pass over (cell, participant) keys gives the breakdown;
+        # the keys are sorted, so the cell of each pair comes out sorted too.
+        pair_key = (row * n_cols + col) * n_participants + codes
+        pairs, inverse = np.unique(pair_key, return_inverse=True)
+        values = np.bincount(inverse.ravel(), weights=weight, minlength=len(pairs))
+        cells, cell_index = np.unique(pairs // n_participants, return_inverse=True)
+
+        grid.append({
+            "minZoom": min_zoom,
+            "maxZoom": max_zoom,
+            "cell": cell,
+            "lat": (cells // n_cols + 0.5) * cell - 90.0,
+            "lon": (cells % n_cols + 0.5) * cell - 180.0,
+            "cellIndex": cell_index.ravel(),
+            "participant": pairs % n_participants,
+            "value": values,
+        })
+    return grid
+
+
+def heat_grid_points(band, participant_code=None):
+    """Return normalised [lat, lon, weight] points for one band and participant (None = all)."""
+    mask = slice(None) if participant_code is None else band["participant"] == participant_code
+    sums = np.bincount(band["cellIndex"][mask], weights=band["value"][mask], minlength=len(band["lat"]))
+    keep = sums > 0
+    if not keep.any():
+        return []
+    return np.column_stack([band["lat"][keep], band["lon"][keep], sums[keep] / sums.max()]).tolist()
+
+
+def heat_grid_payload(grid, participants):
+    """JSON-ready form of a heat grid; coordinates are cell centres so 4 decimals is plenty."""
+    return {
+        "participants": list(participants),
+        "bands": [
+            {
+                "minZoom": band["minZoom"],
+                "maxZoom": band["maxZoom"],
+                "lat": np.round(band["lat"], 4),
+                "lon": np.round(band["lon"], 4),
+                "cellIndex": band["cellIndex"],
+                "participant": band["participant"],
+                "value": np.round(band["value"]),
+            }
+            for band in grid
+        ],
+    }
+
+
+HEAT_GRID_JS = """
+<script>
+window.heatGrid = __HEAT_GRID_JSON__;
+window.heatGrid.cache = {};
+
+function heatGridPoints(bandIdx, pIdx) {
+  var key = bandIdx + ':' + pIdx;
+  if (window.heatGrid.cache[key]) return window.heatGrid.cache[key];
+  var band = window.heatGrid.bands[bandIdx];
+  var sums = new Float64Array(band.lat.length);
+  for (var i = 0; i < band.value.length; i++) {
+    if (pIdx < 0 || band.participant[i] === pIdx) sums[band.cellIndex[i]] += band.value[i];
+  }
+  var max = 0;
+  for (var c = 0; c < sums.length; c++) if (sums[c] > max) max = sums[c];
+  var points = [];
+  for (var c = 0; c < sums.length; c++) {
+    if (sums[c] > 0) points.push([band.lat[c], band.lon[c], sums[c] / max]);
+  }
+  window.heatGrid.cache[key] = points;
+  return points;
+}
+
+function updateHeatGrid() {
+  var map = getMap();
+  var layer = window['__HEAT_LAYER__'];
+  if (!map || !layer) return;
+  var bands = window.heatGrid.bands;
+  var zoom = map.getZoom();
+  var bandIdx = bands.length - 1;
+  for (var b = 0; b < bands.length; b++) {
+    if (zoom >= bands[b].minZoom && zoom <= bands[b].maxZoom) { bandIdx = b; break; }
+  }
+  var select = document.getElementById('participantSelect');
+  var pIdx = (select && select.value) ? window.heatGrid.participants.indexOf(select.value) : -1;
+  if (select && select.value && pIdx < 0) { layer.setLatLngs([]); return; }
+  layer.setLatLngs(heatGridPoints(bandIdx, pIdx));
+}
+
+setTimeout(function() {
+  var map = getMap();
+  if (!map) return;
+  map.on('zoomend', updateHeatGrid);
+  updateHeatGrid();
+}, 1000);
+</script>
+"""
+
+
+def heat_grid_script(grid, participants, heat_layer_name):
+    """Inline script holding the grid once and re-binning the heat layer on zoom/participant change."""
+    return (
+        HEAT_GRID_JS
+        .replace("__HEAT_GRID_JSON__", dumps(heat_grid_payload(grid, participants)))
+        .replace("__HEAT_LAYER__", heat_layer_name)
+    )
@@ -0,0 +1,177 @@
+"""Run instrumentation: stage timers, counters and peak memory, written as a JSON report.
+
+Pipeline steps are wrapped in ``stage(name)`` (or decorated with ``timed(name)``)
+and sizes are recorded with ``count(metric, value, feed=...)`` (one optional label). Everything goes
+to the current RunReport, which ``start_run()`` replaces at the start of each
+build. The report can also be written as a Prometheus textfile for the
+node_exporter textfile collector.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows; peak memory is reported as 0
+    resource = None
+
+REPORT_NAME = "lens_run_report.json"
+
+PROMETHEUS_PREFIX = "lens"
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RunReport:
+    """Stage timings, labelled counters and memory samples for one pipeline run."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.labels = {}
+        # Feed fetches and the exposure load report from worker threads
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                entry = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+                entry["calls"] += 1
+                entry["seconds"] += time.perf_counter() - started
+                entry["peak_rss_bytes"] = peak_rss_bytes()
+
+    def count(self, metric, value=1, **label):
+        """Add to a counter, optionally split by one label (e.g. feed="wildfires")."""
+        label_name, label_value = next(iter(label.items()), ("", ""))
+        with self._lock:
+            self.labels.setdefault(metric, label_name)
+            values = self.counters.setdefault(metric, {})
+            values[label_value] = values.get(label_value, 0) + value
+
+    def as_dict(self):
+        return {
+            "started": self.started,
+            "seconds": time.perf_counter() - self._t0,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": self.stages,
+            "counters": {
+                metric: values if self.labels[metric] else values[""]
+                for metric, values in self.counters.items()
+            },
+        }
+
+    def slowest(self, n=3):
+        ranked = sorted(self.stages.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        return ", ".join(f"{name} {entry['seconds']:.2f}s" for name, entry in ranked[:n])
+
+    def write_json(self, path=REPORT_NAME):
+        path = Path(path)
+        _write_atomic(path, json.dumps(self.as_dict(), indent=2, sort_keys=True))
+        return path
+
+    def prometheus_text(self, prefix=PROMETHEUS_PREFIX):
+        lines = [
+            f"# TYPE {prefix}_run_timestamp_seconds gauge",
+            f"{prefix}_run_timestamp_seconds {self.started:.3f}",
+            f"# TYPE {prefix}_run_seconds gauge",
+            f"{prefix}_run_seconds {time.perf_counter() - self._t0:.6f}",
+            f"# TYPE {prefix}_peak_rss_bytes gauge",
+            f"{prefix}_peak_rss_bytes {peak_rss_bytes()}",
+            f"# TYPE {prefix}_stage_seconds gauge",
+        ]
+        lines += [f'{prefix}_stage_seconds{{stage="{name}"}} {entry["seconds"]:.6f}'
+                  for name, entry in sorted(self.stages.items())]
+        lines.append(f"# TYPE {prefix}_stage_calls gauge")
+        lines += [f'{prefix}_stage_calls{{stage="{name}"}} {entry["calls"]}'
+                  for name, entry in sorted(self.stages.items())]
+        for metric, values in sorted(self.counters.items()):
+            label_name = self.labels[metric]
+            lines.append(f"# TYPE {prefix}_{metric} gauge")
+            for label_value, value in sorted(values.items()):
+                label = f'{{{label_name}="{_escape(label_value)}"}}' if label_name else ""
+                lines.append(f"{prefix}_{metric}{label} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write a textfile-collector file (atomically, so the collector never reads a partial file)."""
+        path = Path(path)
+        _write_atomic(path, self.prometheus_text())
+        return path
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path, text):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+# -----------------------
+# CURRENT RUN
+# -----------------------
+
+_current = RunReport()
+
+
+def start_run():
+    """Start a fresh report for the next run and return it."""
+    global _current
+    _current = RunReport()
+    return _current
+
+
+def current():
+    return _current
+
+
+def stage(name):
+    """Context manager timing one pipeline step in the current report."""
+    return _current.stage(name)
+
+
+def timed(name):
+    """Decorator form of stage()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _current.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(metric, value=1, **label):
+    _current.count(metric, value, **label)
+
+
+def finish_run(report_path=REPORT_NAME, prometheus_path=None):
+    """Write the current report (and the Prometheus textfile when a path is given)."""
+    report = _current
+    if report_path:
+        report.write_json(report_path)
+    if prometheus_path:
+        report.write_prometheus(prometheus_path)
+    print(f"🔹 Run report: {report_path or 'not written'} (slowest: {report.slowest() or 'n/a'})")
+    return report
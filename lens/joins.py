@@ -0,0 +1,347 @@
+"""Spatial joins of exposure points against hazard footprints."""
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from lens.montecarlo import BAND_COLUMNS, point_cells
+from lens.shakegrid import sample_grids
+from lens.windfield import peak_winds, step_arrays
+from lens.vulnerability import LOSS_COLUMNS, category_kt, damage_ratio, epicentral_mmi, representative_kt
+
+# Summed per joined hazard and participant
+VALUE_COLUMNS = ["trapped_exposure_usd", *LOSS_COLUMNS]
+
+
+def add_losses(joined, peril, intensity, floor=None):
+    """Ground-up and gross loss of joined (point, hazard) rows at the hazard's ``intensity``."""
+    ratio = damage_ratio(peril, intensity, joined["occupancy"] if "occupancy" in joined.columns else None, floor)
+    ground_up = joined["ground_up_usd"] if "ground_up_usd" in joined.columns else joined["trapped_exposure_usd"]
+    joined["ground_up_loss_usd"] = ground_up.to_numpy(dtype=float) * ratio
+    joined["gross_loss_usd"] = joined["trapped_exposure_usd"].to_numpy(dtype=float) * ratio
+    return joined
+
+
+# -----------------------
+# PROBABILISTIC HURRICANE / STORM EXPOSURE
+# -----------------------
+
+def clean_prob_gdf(prob_gdf, crs):
+    # Ensure CRS alignment
+    prob_gdf = prob_gdf.to_crs(crs)
+    # Clean geometries
+    prob_gdf = prob_gdf[prob_gdf.geometry.notnull()].copy()
+    prob_gdf['geometry'] = prob_gdf['geometry'].apply(lambda g: g if g.is_valid else g.buffer(0))
+    return prob_gdf
+
+
+def hurricane_band_exposure(band_gdf, points_gdf, cell_degrees):
+    """Unweighted exposure and loss per (storm, wind band, probability, correlation cell, participant).
+
+    ``band_gdf`` comes from montecarlo.wind_bands; hurricane-force bands only
+    carry the damage above the tropical-storm band's.
+    """
+    if band_gdf.empty or points_gdf.empty:
+        return pd.DataFrame(columns=[*BAND_COLUMNS, *VALUE_COLUMNS])
+    joined = gpd.sjoin(points_gdf, clean_prob_gdf(band_gdf, points_gdf.crs), how="inner", predicate="within")
+    if joined.empty:
+        return pd.DataFrame(columns=[*BAND_COLUMNS, *VALUE_COLUMNS])
+    joined = add_losses(joined, "ws", representative_kt(joined["wind_kt"]), representative_kt(joined["floor_kt"]))
+    joined["cell"] = point_cells(joined.geometry.x.to_numpy(), joined.geometry.y.to_numpy(), cell_degrees)
+    bands = joined.groupby(BAND_COLUMNS, as_index=False)[VALUE_COLUMNS].sum()
+    bands["storm"] = bands["storm"].astype(str)
+    return bands
+
+
+# -----------------------
+# OBSERVED HURRICANE EXPOSURE
+# -----------------------
+
+def observed_track_exposure(observed_track_gdf, points_gdf):
+    observed_track_exposure = pd.DataFrame()
+
+    if not observed_track_gdf.empty and not points_gdf.empty:
+        print("🔹 Calculating trapped exposure within observed hurricane tracks...")
+        joined = gpd.sjoin(points_gdf, observed_track_gdf, how="inner", predicate="intersects")
+        if not joined.empty:
+            joined = add_losses(joined, "ws", category_kt(joined["saffir_scale"]))
+            observed_track_exposure = (
+                joined.groupby(["storm", "participant_name"])[VALUE_COLUMNS]
+                .sum()
+                .reset_index()
+            )
+            print(f"✅ Found {len(observed_track_exposure)} exposures within observed tracks.")
+        else:
+            print("⚠️ No trapped exposures found in observed hurricane tracks.")
+    else:
+        print("⚠️ observed_track_gdf or points_gdf is empty — skipping observed hurricane exposure.")
+    return observed_track_exposure
+
+
+# -----------------------
+# HURRICANE WIND FIELD
+# -----------------------
+
+def windfield_exposure(track_steps, points_gdf):
+    """Exposure and loss per (storm, participant) of the points the storm's wind field reaches with gale force.
+
+    ``track_steps`` come from windfield.track_steps; each point's loss is at its peak wind.
+    """
+    columns = ["storm", "participant_name", *VALUE_COLUMNS]
+    if track_steps.empty or points_gdf.empty:
+        return pd.DataFrame(columns=columns)
+    steps = step_arrays(track_steps)
+    storm, point, wind = peak_winds(points_gdf.geometry.x.to_numpy(), points_gdf.geometry.y.to_numpy(), steps)
+    if not len(point):
+        print("⚠️ No exposure within gale-force winds of the hurricane tracks.")
+        return pd.DataFrame(columns=columns)
+    joined = pd.DataFrame(points_gdf.iloc[point].drop(columns="geometry")).assign(storm=steps["storms"][storm].astype(str))
+    joined = add_losses(joined, "ws", wind)
+    return joined.groupby(["storm", "participant_name"], as_index=False)[VALUE_COLUMNS].sum()[columns]
+
+
+# -----------------------
+# WILDFIRES
+# -----------------------
+
+def wildfire_exposure(band_gdf, points_gdf):
+    """Trapped exposure per (wildfire incident, proximity band, participant); see lens.wildfire."""
+    columns = ["incident", "band", "participant_name", "trapped_exposure_usd"]
+    if band_gdf.empty or points_gdf.empty:
+        return pd.DataFrame(columns=columns)
+    joined = gpd.sjoin(drop_sjoin_columns(points_gdf), band_gdf.to_crs(points_gdf.crs), how="inner", predicate="within")
+    if joined.empty:
+        print("⚠️ No trapped exposures within wildfire proximity bands.")
+        return pd.DataFrame(columns=columns)
+    return joined.groupby(["incident", "band", "participant_name"], as_index=False)["trapped_exposure_usd"].sum()
+
+
+# -----------------------
+# FLOODS
+# -----------------------
+
+# Flood members: one row per (flood polygon, location inside it)
+FLOOD_MEMBER_COLUMNS = ["flood_id", "severity", "location", "participant_name", "trapped_exposure_usd"]
+
+# Flood totals count a location once per severity ("all"), and once at its most severe alert ("highest")
+FLOOD_ALL = "all"
+FLOOD_HIGHEST = "highest"
+
+
+def flood_members(flood_gdf, points_gdf):
+    """Locations (row positions of ``points_gdf``) inside each flood polygon; see hazards.flood_gdf."""
+    if flood_gdf.empty or points_gdf.empty:
+        return pd.DataFrame(columns=FLOOD_MEMBER_COLUMNS)
+    points_gdf = drop_sjoin_columns(points_gdf).reset_index(drop=True)
+    joined = gpd.sjoin(points_gdf, flood_gdf.to_crs(points_gdf.crs), how="inner", predicate="within")
+    joined = joined[joined["participant_name"].notna()]
+    return joined.rename_axis("location").reset_index()[FLOOD_MEMBER_COLUMNS]
+
+
+def flood_totals(members, severities):
+    """Trapped exposure per (severity, scope, participant) from flood members.
+
+    Overlapping polygons share locations, so each location counts once per
+    severity (scope FLOOD_ALL), and once more at the first of its severities
+    in ``severities`` order (scope FLOOD_HIGHEST), which the banner sums.
+    """
+    columns = ["severity", "scope", "participant_name", "trapped_exposure_usd"]
+    if members.empty:
+        return pd.DataFrame(columns=columns)
+    rank = members["severity"].map({severity: i for i, severity in enumerate(severities)}).fillna(len(severities))
+    per_severity = members.drop_duplicates(["severity", "location"])
+    highest = per_severity.assign(rank=rank).sort_values("rank", kind="stable").drop_duplicates("location")
+    frames = [
+        frame.groupby(["severity", "participant_name"], as_index=False)["trapped_exposure_usd"].sum().assign(scope=scope)
+        for scope, frame in ((FLOOD_ALL, per_severity), (FLOOD_HIGHEST, highest))
+    ]
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
+# -----------------------
+# EARTHQUAKES + SHAKE POLYGONS
+# -----------------------
+
+def drop_sjoin_columns(gdf):
+    """Remove leftover sjoin index columns."""
+    return gdf.drop(columns=[col for col in ['index_left', 'index_right'] if col in gdf.columns])
+
+
+def shake_envelopes(shake_gdf, eq_gdf):
+    """Shake polygons replaced by their envelopes (bounding boxes), each linked to its nearest earthquake.
+
+    Each quake's contours are nested, so each also gets its quake's next
+    lower contour level as ``floor_intensity``; a point's loss then adds up
+    contour increments (see vulnerability.damage_matrix).
+    """
+    shake_gdf_bbox = drop_sjoin_columns(shake_gdf).copy()
+    shake_gdf_bbox['geometry'] = shake_gdf_bbox['geometry'].apply(lambda g: g.envelope)
+    if eq_gdf.empty:
+        shake_gdf_bbox['eq_id'] = np.nan
+    else:
+        links = shake_event_ids(shake_gdf_bbox, eq_gdf).drop_duplicates('shake_id')
+        shake_gdf_bbox['eq_id'] = shake_gdf_bbox['shake_id'].map(links.set_index('shake_id')['eq_id'])
+    # The lowest contour of each quake has no floor
+    levels = (shake_gdf_bbox[['eq_id', 'intensity']].astype({'intensity': float})
+              .dropna(subset=['intensity']).drop_duplicates().sort_values(['eq_id', 'intensity']))
+    levels['floor_intensity'] = levels.groupby('eq_id', dropna=False)['intensity'].shift()
+    floors = shake_gdf_bbox[['eq_id', 'intensity']].astype({'intensity': float}).merge(
+        levels, on=['eq_id', 'intensity'], how='left')
+    shake_gdf_bbox['floor_intensity'] = floors['floor_intensity'].to_numpy()
+    return shake_gdf_bbox
+
+
+def shake_event_ids(shake_gdf_bbox, eq_gdf):
+    """shake_id -> eq_id of the nearest earthquake to each shake polygon."""
+    shake_with_eq_bbox = gpd.sjoin_nearest(
+        shake_gdf_bbox.to_crs(3857),
+        eq_gdf.to_crs(3857)[['eq_id','geometry']],
+        how='left',
+        distance_col='dist'
+    ).to_crs("EPSG:4326")
+    return shake_with_eq_bbox[['shake_id','eq_id']]
+
+
+def link_shakes_to_earthquakes(trapped_by_shake, shake_gdf_bbox):
+    """Attach each shake polygon's eq_id (from shake_envelopes) to per-shake-polygon exposure."""
+    return trapped_by_shake.merge(shake_gdf_bbox[['shake_id', 'eq_id']], on='shake_id', how='left')
+
+
+def without_gridded(shake_gdf_bbox, grids):
+    """Shake polygons of the earthquakes without a ShakeMap grid (see lens.shakegrid)."""
+    if not grids or shake_gdf_bbox.empty:
+        return shake_gdf_bbox
+    gridded = shake_gdf_bbox['eq_id'].astype(str).isin({g["eq_id"] for g in grids})
+    return shake_gdf_bbox[~gridded]
+
+
+def grid_shake_exposure(grids, points_gdf):
+    """Exposure and loss per (gridded earthquake, participant), at each point's interpolated MMI."""
+    if not grids or points_gdf.empty:
+        return pd.DataFrame(columns=EMPTY_SHAKE_EXPOSURE)
+    grid_idx, point_idx, mmi = sample_grids(grids, points_gdf.geometry.x.to_numpy(), points_gdf.geometry.y.to_numpy())
+    if not len(point_idx):
+        return pd.DataFrame(columns=EMPTY_SHAKE_EXPOSURE)
+    eq_ids = np.asarray([g["eq_id"] for g in grids], dtype=object)
+    joined = pd.DataFrame(points_gdf.iloc[point_idx].drop(columns="geometry")).assign(eq_id=eq_ids[grid_idx])
+    joined = add_losses(joined, "eq", mmi)
+    trapped = joined.groupby(["eq_id", "participant_name"], as_index=False)[VALUE_COLUMNS].sum()
+    return trapped.reindex(columns=EMPTY_SHAKE_EXPOSURE)
+
+
+def shake_exposure_frames(*frames):
+    """Contour and grid shake exposure as one frame."""
+    frames = [frame for frame in frames if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=EMPTY_SHAKE_EXPOSURE)
+
+
+def combine_earthquake_exposure(trapped_per_eq_direct, trapped_by_shake_eq):
+    """Direct plus shake-linked exposure per earthquake and participant."""
+    # Shake polygon exposure (already linked to nearest earthquake)
+    trapped_by_shake_eq_sum = trapped_by_shake_eq.groupby(
+        ['eq_id','participant_name'], as_index=False
+    )[VALUE_COLUMNS].sum()
+
+    # Fill missing participant names
+    trapped_per_eq_direct['participant_name'] = trapped_per_eq_direct['participant_name'].fillna('Unknown')
+    trapped_by_shake_eq_sum['participant_name'] = trapped_by_shake_eq_sum['participant_name'].fillna('Unknown')
+
+    # Merge direct + shake exposures
+    trapped_per_eq = pd.merge(
+        trapped_per_eq_direct,
+        trapped_by_shake_eq_sum,
+        on=['eq_id','participant_name'],
+        how='outer',
+        suffixes=('_direct','_shake')
+    )
+
+    # Sum exposures (and losses) safely
+    for col in VALUE_COLUMNS:
+        trapped_per_eq[col] = trapped_per_eq[[f'{col}_direct', f'{col}_shake']].fillna(0).sum(axis=1)
+
+    # Fill missing magnitudes/places for earthquakes
+    trapped_per_eq['mag'] = trapped_per_eq['mag'].fillna(0)
+    trapped_per_eq['place'] = trapped_per_eq['place'].fillna('Unknown')
+
+    # Keep necessary columns
+    return trapped_per_eq[['eq_id','mag','place','participant_name',*VALUE_COLUMNS]]
+
+
+EMPTY_SHAKE_EXPOSURE = ['shake_id','intensity','participant_name',*VALUE_COLUMNS,'eq_id']
+EMPTY_EQ_EXPOSURE = ["eq_id","mag","place","participant_name",*VALUE_COLUMNS]
+
+
+def earthquake_exposure(eq_gdf, shake_gdf, points_gdf, grids=()):
+    """Trapped exposure per earthquake ≥6, direct plus via the nearest shake polygons.
+
+    Earthquakes with a ShakeMap grid (``grids``, see lens.shakegrid) are
+    sampled from it instead of their shake polygons.
+    """
+    points_gdf = drop_sjoin_columns(points_gdf)
+    shake_gdf_bbox = without_gridded(shake_envelopes(shake_gdf, eq_gdf), grids) if not shake_gdf.empty else shake_gdf
+    # Join exposure points using shake polygon bounding boxes
+    if not shake_gdf_bbox.empty and not points_gdf.empty and not eq_gdf.empty:
+
+        # Spatial join points within bounding boxes
+        join_shake_bbox = gpd.sjoin(points_gdf, shake_gdf_bbox, how="inner", predicate="within")
+
+        # Deduplicate points per shake polygon using highest intensity
+        join_shake_bbox = join_shake_bbox.reset_index().rename(columns={'index':'unique_point_id'})
+        join_shake_bbox = join_shake_bbox.sort_values('intensity', ascending=False).drop_duplicates(subset=['unique_point_id','shake_id'])
+        join_shake_bbox = add_losses(join_shake_bbox, "eq", join_shake_bbox['intensity'], join_shake_bbox['floor_intensity'])
+
+        # Sum trapped exposure (and loss) per shake polygon and participant
+        trapped_by_shake = join_shake_bbox.groupby(
+            ['shake_id','intensity','participant_name'], as_index=False
+        )[VALUE_COLUMNS].sum()
+
+        # Link shake polygons to nearest earthquake
+        trapped_by_shake_eq = link_shakes_to_earthquakes(trapped_by_shake, shake_gdf_bbox)
+
+    else:
+        trapped_by_shake_eq = pd.DataFrame(columns=EMPTY_SHAKE_EXPOSURE)
+    if not eq_gdf.empty:
+        trapped_by_shake_eq = shake_exposure_frames(trapped_by_shake_eq, grid_shake_exposure(grids, points_gdf))
+
+    # Aggregate total trapped exposure per earthquake (≥6)
+    if not eq_gdf.empty and not points_gdf.empty:
+        # Direct exposure: points intersecting earthquakes
+        join_eq = gpd.sjoin(points_gdf, eq_gdf, how="inner", predicate="intersects")
+        join_eq = add_losses(join_eq, "eq", epicentral_mmi(join_eq["mag"]))
+        trapped_per_eq_direct = join_eq.groupby(
+            ["eq_id","mag","place","participant_name"], as_index=False
+        )[VALUE_COLUMNS].sum()
+        trapped_per_eq = combine_earthquake_exposure(trapped_per_eq_direct, trapped_by_shake_eq)
+
+    else:
+        trapped_per_eq = pd.DataFrame(columns=EMPTY_EQ_EXPOSURE)
+        print("⚠️ No trapped exposure data for earthquakes ≥6")
+
+    if not trapped_per_eq.empty:
+        trapped_per_eq['eq_id'] = trapped_per_eq['eq_id'].astype(str)
+    return trapped_per_eq
+
+
+# -----------------------
+# PANEL BREAKDOWNS
+# -----------------------
+
+def hazard_totals(exposure_df, key):
+    """Total trapped exposure per hazard key."""
+    if exposure_df.empty:
+        return {}
+    return exposure_df.groupby(key)["trapped_exposure_usd"].sum().to_dict()
+
+
+def participant_exposure(exposure_df, key, value="trapped_exposure_usd"):
+    """{participant: {hazard key: trapped exposure}} (or another ``value`` column) for filtering by participant."""
+    breakdown = {}
+    if not exposure_df.empty and value in exposure_df.columns:
+        for _, row in exposure_df.iterrows():
+            participants = row["participant_name"].split(", ")
+            for p in participants:
+                breakdown.setdefault(p, {})
+                breakdown[p][row[key]] = (
+                    breakdown[p].get(row[key], 0) + row[value]
+                )
+    return breakdown
@@ -0,0 +1,239 @@
+"""Persisted location index: Hilbert-ordered point arrays plus a packed R-tree.
+
+Locations are sorted along a Hilbert curve, so nearby points sit in nearby
+rows, and the rows are cut into fixed-size leaves. Each leaf's bounding box
+is stored, and the boxes are packed bottom-up into the levels of an R-tree.
+Everything is written as plain .npy files under
+<artifact root>/location_index/<exposure key>/, next to the stage artifacts.
+Opening an index memory-maps the files. A hazard query walks the tree's boxes
+and then reads only the leaves' pages that it touches, so a portfolio larger
+than RAM can still be joined. Worker processes map the same files, and the
+OS page cache is shared between them.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from lens import instrument
+from lens.parallel import array_dtype, occupancy_codes, value_arrays
+
+INDEX_STAGE = "location_index"
+
+# Bits per axis of the Hilbert grid (2^16 cells across 360 degrees is ~600 m)
+HILBERT_ORDER = 16
+
+# Rows per leaf, and children per node on the levels above
+LEAF_SIZE = 4096
+NODE_SIZE = 16
+
+
+# -----------------------
+# HILBERT ORDER
+# -----------------------
+
+def hilbert_keys(lon, lat, order=HILBERT_ORDER):
+    """Distance along a Hilbert curve over a 2^order x 2^order lon/lat grid."""
+    side = 1 << order
+    x = np.clip(((np.asarray(lon, dtype=np.float64) + 180.0) / 360.0 * side).astype(np.int64), 0, side - 1)
+    y = np.clip(((np.asarray(lat, dtype=np.float64) + 90.0) / 180.0 * side).astype(np.int64), 0, side - 1)
+    d = np.zeros(len(x), dtype=np.int64)
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+        # Rotate the quadrant so the curve stays continuous
+        flip = rx & ~ry
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        swap = ~ry
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+        s >>= 1
+    return d
+
+
+# -----------------------
+# PACKED R-TREE
+# -----------------------
+
+def leaf_boxes(lon, lat, starts):
+    """Bounding box (minx, miny, maxx, maxy) of every leaf, ignoring NaN coordinates."""
+    return np.column_stack([
+        np.fmin.reduceat(lon, starts), np.fmin.reduceat(lat, starts),
+        np.fmax.reduceat(lon, starts), np.fmax.reduceat(lat, starts),
+    ])
+
+
+def pack_levels(boxes, node_size=NODE_SIZE):
+    """R-tree levels from the leaf boxes up to a single root; node i covers children i*node_size onwards."""
+    levels = [boxes]
+    while len(levels[-1]) > 1:
+        child = levels[-1]
+        starts = np.arange(0, len(child), node_size)
+        levels.append(np.column_stack([
+            np.fmin.reduceat(child[:, 0], starts), np.fmin.reduceat(child[:, 1], starts),
+            np.fmax.reduceat(child[:, 2], starts), np.fmax.reduceat(child[:, 3], starts),
+        ]))
+    return levels
+
+
+def _touching(boxes, bounds):
+    b = bounds[None, :, :]
+    e = boxes[:, None, :]
+    return ((e[..., 0] <= b[..., 2]) & (e[..., 2] >= b[..., 0]) &
+            (e[..., 1] <= b[..., 3]) & (e[..., 3] >= b[..., 1])).any(axis=1)
+
+
+# -----------------------
+# INDEX
+# -----------------------
+
+class LocationIndex:
+    """A memory-mapped index directory; same cell interface as parallel.SharedPoints."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        meta = json.loads((self.directory / "meta.json").read_text())
+        self.n = meta["n"]
+        self.node_size = meta["node_size"]
+        self.participants = np.load(self.directory / "participants.npy")
+        self.occupancies = np.load(self.directory / "occupancies.npy")
+        self.arrays = load_arrays(self.directory)
+        self.columns = set(self.arrays)
+        self.levels = [np.load(self.directory / f"level_{i}.npy", mmap_mode="r") for i in range(meta["levels"])]
+        self.starts = np.load(self.directory / "starts.npy")
+        self.ends = np.append(self.starts[1:], self.n).astype(self.starts.dtype)
+        self.extents = self.levels[0] if self.levels else np.empty((0, 4))
+        # Store row of each index row
+        self.order = np.load(self.directory / "order.npy", mmap_mode="r")
+        # Workers map the same files by path
+        self.source = ("mmap", str(self.directory))
+
+    def touching(self, bounds):
+        """Leaves whose box touches any of ``bounds`` (k x 4), found top-down through the tree."""
+        if not len(bounds) or not self.n:
+            return np.empty(0, dtype=np.int64)
+        nodes = np.arange(len(self.levels[-1]))
+        for depth in range(len(self.levels) - 1, -1, -1):
+            level = self.levels[depth]
+            nodes = nodes[_touching(np.asarray(level[nodes]), bounds)]
+            if depth == 0 or not len(nodes):
+                break
+            # Children of the surviving nodes on the level below
+            children = (nodes[:, None] * self.node_size + np.arange(self.node_size)[None, :]).ravel()
+            nodes = children[children < len(self.levels[depth - 1])]
+        return nodes
+
+    def close(self):
+        self.arrays = self.levels = None
+
+
+def load_arrays(directory):
+    """Point arrays of an index: lon, lat, code, occupancy, value and any value_<peril> / value_ground_up."""
+    paths = [Path(directory) / f"{name}.npy" for name in ("lon", "lat", "code", "occupancy")]
+    paths += sorted(Path(directory).glob("value*.npy"))
+    return {path.stem: np.load(path, mmap_mode="r") for path in paths}
+
+
+def build_index(locations, directory, leaf_size=LEAF_SIZE, node_size=NODE_SIZE):
+    """Write the index for a lens.store.LocationStore; the directory appears only once complete."""
+    keys = hilbert_keys(locations.lon, locations.lat)
+    order = np.argsort(keys, kind="stable")
+    write_index(locations, order, keys[order], directory, leaf_size, node_size)
+
+
+def patch_index(base, locations, removed, directory, leaf_size=LEAF_SIZE, node_size=NODE_SIZE):
+    """Index for a store patched by LocationStore.patch, from the base store's index directory.
+
+    ``removed`` masks the base store's rows. Kept rows keep their Hilbert
+    order; only the delta rows (at the end of ``locations``) are keyed and
+    sorted, then merged in.
+    """
+    base = Path(base)
+    base_order = np.load(base / "order.npy")
+    kept = ~removed[base_order]
+    # Base store row -> patched store row for the kept rows
+    rank = np.cumsum(~removed) - 1
+    order = rank[base_order[kept]]
+    keys = np.load(base / "hilbert.npy")[kept]
+
+    delta_rows = np.arange(len(order), len(locations))
+    delta_keys = hilbert_keys(locations.lon[delta_rows], locations.lat[delta_rows])
+    by_key = np.argsort(delta_keys, kind="stable")
+    at = np.searchsorted(keys, delta_keys[by_key], side="right")
+    write_index(locations, np.insert(order, at, delta_rows[by_key]), np.insert(keys, at, delta_keys[by_key]),
+                directory, leaf_size, node_size)
+
+
+def write_index(locations, order, keys, directory, leaf_size=LEAF_SIZE, node_size=NODE_SIZE):
+    """Write the arrays of ``locations`` in ``order`` (sorted Hilbert ``keys``) plus the packed tree."""
+    directory = Path(directory)
+    lon, lat = locations.lon[order], locations.lat[order]
+    starts = np.arange(0, len(order), leaf_size, dtype=np.int64)
+    occupancy, occupancies = occupancy_codes(locations)
+
+    tmp = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    sorted_arrays = {
+        "lon": lon,
+        "lat": lat,
+        "code": locations.codes["participant_name"][order],
+        "occupancy": occupancy[order],
+        # Missing exposure counts as 0, as in a groupby sum
+        **{name: np.nan_to_num(values)[order] for name, values in value_arrays(locations).items()},
+    }
+    for name, values in sorted_arrays.items():
+        np.save(tmp / f"{name}.npy", values.astype(array_dtype(name), copy=False))
+    # Store row and curve position of every index row, for patch_index
+    np.save(tmp / "order.npy", order.astype(np.int64, copy=False))
+    np.save(tmp / "hilbert.npy", keys)
+    levels = pack_levels(leaf_boxes(lon, lat, starts), node_size) if len(order) else []
+    for i, boxes in enumerate(levels):
+        np.save(tmp / f"level_{i}.npy", boxes)
+    np.save(tmp / "starts.npy", starts)
+    # Participant (or account group key) labels of the codes
+    participants = np.asarray(locations.categories["participant_name"])
+    np.save(tmp / "participants.npy", participants.astype(str) if participants.dtype == object else participants)
+    np.save(tmp / "occupancies.npy", np.asarray(occupancies, dtype=str))
+    (tmp / "meta.json").write_text(json.dumps({
+        "n": int(len(order)),
+        "leaf_size": leaf_size,
+        "node_size": node_size,
+        "levels": len(levels),
+    }))
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+
+
+def location_index(store, key, locations, base=None):
+    """The index for exposure ``key`` under the artifact store, built on first use and mapped after.
+
+    ``base`` is (base exposure key, removed mask) for a delta-patched store
+    (see lens.delta); its index is patched rather than rebuilt when present.
+    """
+    directory = store.root / INDEX_STAGE / key
+    if (directory / "meta.json").exists():
+        store.reused.append(INDEX_STAGE)
+        os.utime(directory)
+        return LocationIndex(directory)
+    with instrument.stage(INDEX_STAGE):
+        base_dir = base and store.root / INDEX_STAGE / base[0]
+        if base_dir and (base_dir / "order.npy").exists():
+            patch_index(base_dir, locations, base[1], directory)
+        else:
+            build_index(locations, directory)
+    store.built.append(INDEX_STAGE)
+    _prune(directory.parent, store.keep)
+    return LocationIndex(directory)
+
+
+def _prune(root, keep):
+    indexes = sorted((p for p in root.iterdir() if p.is_dir() and not p.name.endswith(".tmp")),
+                     key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in indexes[keep:]:
+        shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,274 @@
+"""Local stand-in for the ArcGIS FeatureServer /query endpoints the feeds use.
+
+Serves synthetic layers (lens.synthetic) or layers recorded from the live
+services under the same service/layer paths, so pointing LENS_ARCGIS_URL (or
+feeds.use_services) at it exercises the real fetch path offline. Supported
+query parameters: where, outFields, f=geojson, resultOffset/resultRecordCount
+and envelope geometry filters. Knobs inject latency, jitter, errors and a
+page size, all driven by one seed so runs are repeatable.
+
+    python -m lens mock --latency 0.2 --jitter 0.1 --error-rate 0.05 --page-size 500
+    python -m lens mock --record recorded/     save the live layers for later replay
+    python -m lens mock --recorded recorded/   serve recorded layers
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import parse_qsl, unquote_plus
+
+import numpy as np
+import shapely
+from shapely.geometry import box, shape
+
+from lens import feeds as feed_module
+from lens.serialize import dumps
+
+# Same default as the hosted layers' maxRecordCount
+PAGE_SIZE = 2000
+
+SERVICES_PATH = "/arcgis/rest/services"
+
+_REASONS = {200: "OK", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+_CLAUSE = re.compile(
+    r"^\s*(\w+)\s*(>=|<=|<>|!=|=|>|<)\s*(TIMESTAMP\s*'[^']*'|'[^']*'|-?\d+(?:\.\d+)?)\s*$", re.I)
+
+
+class QueryError(ValueError):
+    """A query the service would reject (returned as an ArcGIS error body)."""
+
+
+# -----------------------
+# LAYERS
+# -----------------------
+
+class Layer:
+    """One layer's features plus their bounding boxes for envelope filters."""
+
+    def __init__(self, collection):
+        self.features = collection.get("features", [])
+        geoms = [shape(f["geometry"]) if f.get("geometry") else None for f in self.features]
+        self.geoms = np.array(geoms, dtype=object)
+
+    def query(self, params, page_size=PAGE_SIZE):
+        if params.get("f", "json").lower() != "geojson":
+            raise QueryError("only f=geojson is supported")
+        mask = np.ones(len(self.features), dtype=bool)
+        where = params.get("where", "1=1")
+        if where.strip() not in ("1=1", ""):
+            mask &= np.array([matches(where, f.get("properties", {})) for f in self.features], dtype=bool)
+        if params.get("geometry"):
+            envelope = parse_envelope(params["geometry"])
+            valid = np.array([g is not None for g in self.geoms], dtype=bool)
+            hits = np.zeros(len(self.features), dtype=bool)
+            if valid.any():
+                hits[valid] = shapely.intersects(self.geoms[valid], envelope)
+            mask &= hits
+
+        selected = [f for f, keep in zip(self.features, mask) if keep]
+        offset = int(params.get("resultOffset", 0) or 0)
+        count = min(int(params.get("resultRecordCount", page_size) or page_size), page_size)
+        page = selected[offset:offset + count]
+        out_fields = params.get("outFields", "*")
+        if out_fields.strip() != "*":
+            fields = [name.strip() for name in out_fields.split(",")]
+            page = [{**f, "properties": {k: f["properties"].get(k) for k in fields}} for f in page]
+
+        result = {"type": "FeatureCollection", "features": page}
+        if offset + count < len(selected):
+            result["properties"] = {"exceededTransferLimit": True}
+        return result
+
+
+def _literal(text):
+    text = text.strip()
+    if text.upper().startswith("TIMESTAMP"):
+        stamp = text.split("'")[1]
+        when = datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+        return when.timestamp() * 1000
+    if text.startswith("'"):
+        return text[1:-1]
+    return float(text)
+
+
+_OPS = {
+    "=": lambda a, b: a == b, "<>": lambda a, b: a != b, "!=": lambda a, b: a != b,
+    ">": lambda a, b: a > b, ">=": lambda a, b: a >= b, "<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+}
+
+
+def matches(where, properties):
+    """Evaluate an AND-only where clause (field op number/'string'/TIMESTAMP) on feature properties."""
+    for clause in re.split(r"\s+AND\s+", where, flags=re.I):
+        if clause.strip() == "1=1":
+            continue
+        m = _CLAUSE.match(clause)
+        if not m:
+            raise QueryError(f"unsupported where clause: {clause!r}")
+        field, op, literal = m.groups()
+        value, target = properties.get(field), _literal(literal)
+        if value is None:
+            return False
+        try:
+            if not _OPS[op](value, target):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+def parse_envelope(geometry):
+    """Envelope from "xmin,ymin,xmax,ymax" or an esri JSON envelope (WGS84 assumed)."""
+    geometry = geometry.strip()
+    try:
+        if geometry.startswith("{"):
+            env = json.loads(geometry)
+            return box(env["xmin"], env["ymin"], env["xmax"], env["ymax"])
+        return box(*map(float, geometry.split(",")))
+    except (ValueError, KeyError, TypeError) as e:
+        raise QueryError(f"unsupported geometry filter: {geometry!r}") from e
+
+
+def synthetic_layers(seed=0, scale=1):
+    """Synthetic collections for every feed; ``scale`` multiplies the feature counts."""
+    from lens.synthetic import synthetic_feeds
+
+    return synthetic_feeds(seed, storms=3 * scale, quakes=5 * scale, fires=50 * scale, floods=20 * scale)
+
+
+def load_layers(directory):
+    """Recorded collections saved as <feed>.geojson by record_layers()."""
+    return {path.stem: json.loads(path.read_text()) for path in sorted(Path(directory).glob("*.geojson"))}
+
+
+def record_layers(directory):
+    """Fetch every live feed and save it for replay through the mock."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, data in feed_module.fetch_feeds().items():
+        (directory / f"{name}.geojson").write_text(dumps(data))
+        print(f"✅ Recorded {name}: {len(data['features']):,} features")
+
+
+# -----------------------
+# SERVER
+# -----------------------
+
+class MockFeatureServer:
+    """Serves layers under SERVICES_PATH with the same service/layer paths as the feeds."""
+
+    def __init__(self, layers, latency=0.0, jitter=0.0, error_rate=0.0, page_size=PAGE_SIZE, seed=0):
+        self.routes = {SERVICES_PATH + feed_module.feed_path(name): Layer(data)
+                       for name, data in layers.items() if name in feed_module.FEEDS}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.requests = 0
+
+    def delay(self):
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def respond(self, path, query):
+        layer = self.routes.get(path.rstrip("/"))
+        if layer is None:
+            return 404, {"error": {"code": 400, "message": "Invalid URL", "details": []}}
+        if self.random.random() < self.error_rate:
+            return 500, {"error": {"code": 500, "message": "Injected error", "details": []}}
+        try:
+            return 200, layer.query(query, self.page_size)
+        except (QueryError, ValueError) as e:
+            # ArcGIS reports bad queries as HTTP 200 with an error body
+            return 200, {"error": {"code": 400, "message": str(e), "details": []}}
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                return
+            method, target = parts[0], parts[1]
+            path, _, raw_query = target.partition("?")
+            self.requests += 1
+            # Decide the delay before any await, so the seeded sequence does not depend on scheduling
+            delay = self.delay()
+            if method != "GET":
+                status, body = 405, {}
+            else:
+                status, body = self.respond(unquote_plus(path), dict(parse_qsl(raw_query)))
+            await asyncio.sleep(delay)
+            payload = dumps(body).encode("utf-8")
+            head = (f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/geo+json\r\n"
+                    f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n")
+            writer.write(head.encode("latin-1") + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=0):
+        server = await asyncio.start_server(self.handle, host, port)
+        host, port = server.sockets[0].getsockname()[:2]
+        return server, f"http://{host}:{port}{SERVICES_PATH}"
+
+    def start_in_thread(self, host="127.0.0.1", port=0):
+        """Run the server on a background event loop; returns its services root URL."""
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        result = {}
+
+        def run():
+            asyncio.set_event_loop(loop)
+            result["server"], result["url"] = loop.run_until_complete(self.start(host, port))
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True, name="lens-mock-arcgis").start()
+        started.wait()
+        return result["url"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local mock of the ArcGIS FeatureServer layers LENS reads.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--recorded", metavar="DIR", help="serve <feed>.geojson files instead of synthetic layers")
+    parser.add_argument("--record", metavar="DIR", help="fetch the live layers into DIR and exit")
+    parser.add_argument("--scale", type=int, default=1, help="multiply the synthetic feature counts")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of uniform latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="maxRecordCount per page")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record_layers(args.record)
+        return
+    layers = load_layers(args.recorded) if args.recorded else synthetic_layers(args.seed, args.scale)
+    mock = MockFeatureServer(layers, args.latency, args.jitter, args.error_rate, args.page_size, args.seed)
+
+    async def serve():
+        server, url = await mock.start(args.host, args.port)
+        print(f"✅ Mock ArcGIS services on {url} ({len(mock.routes)} layers); run LENS with LENS_ARCGIS_URL={url}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Monte Carlo hurricane loss: correlated wind outcomes sampled from the forecast probability bands.
+
+For each storm, the wind probability feeds give nested polygons with the chance
+of tropical-storm (>= 34 kt) and hurricane-force (>= 64 kt) winds. Weighting
+each band's exposure by its probability and summing the overlapping bands
+gives neither an expectation nor a distribution, so each trial draws one
+outcome per storm instead. A location gets a threshold's winds when
+its draw falls below its chance of them, which is the highest band of that
+threshold it lies in. The draws follow a one-factor Gaussian copula: a
+storm-wide factor shared by every location, plus a factor per correlation
+cell (a CELL_DEGREES grid) shared by the locations inside it. A location's
+tropical-storm and hurricane-force outcomes come from the same draw.
+
+The bands are joined like any other hazard. Exposure and loss are summed per
+(storm, wind band, probability, correlation cell, account group). Each band
+is charged at its representative wind (vulnerability.representative_kt), and
+hurricane-force bands carry only the damage above tropical-storm winds
+(vulnerability.damage_matrix floor). Nested bands telescope into the loss of
+the locations whose highest band is at each probability level. A trial's
+exposure and loss per participant are then a lookup of each cell's draw in a
+small (cell x participant x level) table, so the trials cost the same for any
+book size. The exposure is that of the locations reached by the storm's
+lowest wind band. Chunks of trials run in the join process pool when it has
+more than one worker. Exposure and gross loss are taken after location
+deductibles but before account attachment and limit, since those would need
+every trial's loss per account group; the panel keeps them out of the banner
+totals, which are after account terms.
+
+    LENS_MC_TRIALS=10000 LENS_MC_CORRELATION=0.5 LENS_MC_CELL_DEGREES=1 python -m lens run
+"""
+
+import os
+import zlib
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from lens.artifacts import content_hash
+
+TRIALS = int(os.environ.get("LENS_MC_TRIALS", 10_000))
+
+# Share of a location's draw that is common to the whole storm, against its correlation cell's
+CORRELATION = float(os.environ.get("LENS_MC_CORRELATION", 0.5))
+
+# Correlation cell size, degrees
+CELL_DEGREES = float(os.environ.get("LENS_MC_CELL_DEGREES", 1.0))
+
+SEED = int(os.environ.get("LENS_MC_SEED", 0))
+
+# Trials per random stream (and per pool task)
+TRIAL_CHUNK = 1_000
+
+# Exceedance probabilities reported as loss quantiles
+EXCEEDANCE = [0.5, 0.1, 0.05, 0.01]
+
+# Band join output: one row per (band, cell, account group)
+BAND_COLUMNS = ["storm", "wind_kt", "prob", "cell", "participant_name"]
+
+STAT_COLUMNS = [
+    "trapped_exposure_usd",
+    "ground_up_loss_usd",
+    "gross_loss_usd",
+    "gross_loss_std_usd",
+    *[f"gross_loss_ep{ep * 100:g}_usd" for ep in EXCEEDANCE],
+]
+
+
+def settings_key():
+    return content_hash(TRIALS, CORRELATION, CELL_DEGREES, SEED, EXCEEDANCE)
+
+
+# -----------------------
+# BANDS
+# -----------------------
+
+def cell_count(degrees):
+    return int(np.ceil(180 / degrees)) * int(np.ceil(360 / degrees))
+
+
+def point_cells(lon, lat, degrees):
+    """Correlation cell of every point: row-major index into the global ``degrees`` grid."""
+    columns = int(np.ceil(360 / degrees))
+    col = np.clip(((np.asarray(lon, dtype=np.float64) + 180) // degrees).astype(np.int64), 0, columns - 1)
+    row = np.clip(((np.asarray(lat, dtype=np.float64) + 90) // degrees).astype(np.int64), 0, int(np.ceil(180 / degrees)) - 1)
+    return row * columns + col
+
+
+def wind_bands(prob_gdf):
+    """Probability bands with ``floor_kt``, the next lower wind threshold among the bands (NaN for the lowest)."""
+    prob_gdf = prob_gdf.copy()
+    wind = prob_gdf["wind_kt"].to_numpy(dtype=float) if not prob_gdf.empty else np.empty(0)
+    levels = np.unique(wind[~np.isnan(wind)])
+    prob_gdf["floor_kt"] = np.append(levels, np.nan)[np.searchsorted(levels, wind) - 1]
+    return prob_gdf
+
+
+# -----------------------
+# TRIALS
+# -----------------------
+
+def level_thresholds(probs):
+    """Standard normal quantile of each probability (percent); a draw below it gets the band's winds."""
+    normal = NormalDist()
+    return np.array([-np.inf if p <= 0 else np.inf if p >= 100 else normal.inv_cdf(p / 100) for p in probs])
+
+
+def trial_losses(table, thresholds, correlation, seed, trials):
+    """trials x columns losses for one random stream over a (cell x column x level) ``table``."""
+    rng = np.random.default_rng(seed)
+    common = rng.standard_normal((trials, 1))
+    draws = np.sqrt(correlation) * common + np.sqrt(1 - correlation) * rng.standard_normal((trials, table.shape[0]))
+    # Level j: the draw is below the thresholds of level j and up, so those levels' locations get their winds
+    level = np.searchsorted(thresholds, draws, side="right")
+    losses = np.zeros((trials, table.shape[1]))
+    for j in range(table.shape[2]):
+        hit = level == j
+        if hit.any():
+            losses += hit.astype(np.float64) @ table[:, :, j]
+    return losses
+
+
+def loss_table(frame, participant, n_participants):
+    """(cell x [exposure, ground-up, gross] per participant x level) table of one storm's band rows, and its levels.
+
+    Entry j holds the exposure and loss of the locations that get winds when
+    the draw falls below level j's threshold, i.e. those whose highest band is
+    at level j or up. Only the storm's lowest wind band counts towards the
+    exposure, since the others lie inside it.
+    """
+    wind = np.unique(frame["wind_kt"].to_numpy(dtype=float), return_inverse=True)[1]
+    cells, cell = np.unique(frame["cell"].to_numpy(dtype=np.int64), return_inverse=True)
+    levels, level = np.unique(frame["prob"].to_numpy(dtype=float), return_inverse=True)
+    n_cells, n_levels = len(cells), len(levels)
+
+    # Band sums per (wind, cell, participant, level), in that key order
+    group = (wind * n_cells + cell) * n_participants + participant
+    keys, inverse = np.unique(group * n_levels + level, return_inverse=True)
+    values = [
+        np.where(wind == 0, frame["trapped_exposure_usd"].to_numpy(dtype=np.float64), 0.0),
+        frame["ground_up_loss_usd"].to_numpy(dtype=np.float64),
+        frame["gross_loss_usd"].to_numpy(dtype=np.float64),
+    ]
+    sums = np.column_stack([np.bincount(inverse, weights=weights, minlength=len(keys)) for weights in values])
+    # Nested bands: each level's sum includes the higher levels' locations, so take those off
+    same = np.append(keys[1:] // n_levels == keys[:-1] // n_levels, False)
+    exact = sums - np.where(same[:, None], np.roll(sums, -1, axis=0), 0.0)
+
+    group, level = np.divmod(keys, n_levels)
+    cell = group // n_participants % n_cells
+    participant = group % n_participants
+    table = np.zeros((n_cells, 3 * n_participants, n_levels))
+    for column in range(3):
+        np.add.at(table, (cell, column * n_participants + participant, level), exact[:, column])
+    # Level j collects the exact-level losses of level j and up
+    table = np.flip(np.cumsum(np.flip(table, axis=2), axis=2), axis=2)
+    return table, levels
+
+
+def storm_trials(storm, table, levels, trials=TRIALS, correlation=CORRELATION, seed=SEED):
+    """trials x columns losses of one storm, in TRIAL_CHUNK streams seeded by (seed, storm, chunk)."""
+    from lens import parallel
+
+    thresholds = level_thresholds(levels)
+    chunks = [(start, min(TRIAL_CHUNK, trials - start)) for start in range(0, trials, TRIAL_CHUNK)]
+    storm_seed = zlib.crc32(str(storm).encode())
+    args = [(table, thresholds, correlation, [seed, storm_seed, start], n) for start, n in chunks]
+    if parallel.WORKERS > 1 and len(args) > 1:
+        futures = [parallel.pool().submit(trial_losses, *arg) for arg in args]
+        return np.vstack([future.result() for future in futures])
+    return np.vstack([trial_losses(*arg) for arg in args])
+
+
+def trial_stats(exposure, ground_up, gross):
+    """STAT_COLUMNS over the trials (rows) of each column."""
+    stats = {
+        "trapped_exposure_usd": exposure.mean(axis=0),
+        "ground_up_loss_usd": ground_up.mean(axis=0),
+        "gross_loss_usd": gross.mean(axis=0),
+        "gross_loss_std_usd": gross.std(axis=0, ddof=1) if len(gross) > 1 else np.zeros(gross.shape[1]),
+    }
+    for ep, col in zip(EXCEEDANCE, STAT_COLUMNS[4:]):
+        stats[col] = np.quantile(gross, 1 - ep, axis=0)
+    return stats
+
+
+def hurricane_loss(bands, groups, trials=TRIALS, correlation=CORRELATION, seed=SEED):
+    """Mean exposure and loss, and the gross loss's standard deviation and exceedance quantiles, per (storm, participant).
+
+    ``bands`` is the band join (BAND_COLUMNS plus sums) and ``groups`` the
+    account groups its participant_name keys refer to (LocationStore.account_view).
+    Each storm also gets a row without a participant_name for its total over
+    all participants, since quantiles do not add up.
+    """
+    from lens.terms import group_index
+
+    columns = ["storm", "participant_name", *STAT_COLUMNS]
+    if bands.empty or trials <= 0:
+        return pd.DataFrame(columns=columns)
+    g, found = group_index(bands, groups)
+    bands = bands[found]
+    participant_codes = groups["participant"][g[found]]
+
+    frames = []
+    for storm, rows in bands.groupby("storm", sort=True).indices.items():
+        present, participant = np.unique(participant_codes[rows], return_inverse=True)
+        table, levels = loss_table(bands.iloc[rows], participant, len(present))
+        losses = np.split(storm_trials(storm, table, levels, trials, correlation, seed), 3, axis=1)
+        participants = np.asarray(groups["participants"], dtype=object)[present]
+        frames.append(pd.DataFrame({"storm": str(storm), "participant_name": participants, **trial_stats(*losses)}))
+        totals = [values.sum(axis=1, keepdims=True) for values in losses]
+        frames.append(pd.DataFrame({"storm": str(storm), "participant_name": [None], **trial_stats(*totals)}))
+    return pd.concat(frames, ignore_index=True)[columns] if frames else pd.DataFrame(columns=columns)
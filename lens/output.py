@@ -0,0 +1,136 @@
+"""Output stage: minified HTML plus gzip/brotli variants and a size manifest."""
+
+import gzip
+import json
+import os
+import re
+from pathlib import Path
+
+from lens import instrument
+from lens.serialize import dumps
+
+try:
+    import brotli
+except ImportError:  # brotli variants are skipped when the module is not installed
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:  # the conservative line minifier below is used instead
+    rjsmin = None
+
+MANIFEST_NAME = "lens_manifest.json"
+
+_BLOCK = re.compile(r"(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2\s*>)", re.S | re.I)
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE = re.compile(r"\s*([{};,])\s*")
+
+
+# -----------------------
+# MINIFICATION
+# -----------------------
+
+def minify_css(css):
+    css = _CSS_COMMENT.sub("", css)
+    css = _CSS_SPACE.sub(r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return re.sub(r"\s+", " ", css).replace(";}", "}").strip()
+
+
+def minify_js(js):
+    """Drop indentation, blank lines and whole-line // comments.
+
+    Lines inside template literals or after a line continuation are kept
+    verbatim, so string contents never change.
+    """
+    if rjsmin is not None:
+        return rjsmin.jsmin(js)
+    out = []
+    in_template = False
+    continued = False
+    for line in js.split("\n"):
+        if in_template or continued:
+            out.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith("//"):
+                out.append(stripped)
+        in_template ^= (line.count("`") - line.count("\\`")) % 2 == 1
+        continued = line.endswith("\\")
+    return "\n".join(out)
+
+
+def _minify_markup(html):
+    # Newlines still separate inline elements, so collapsing indentation keeps text spacing
+    return "\n".join(line.strip() for line in html.split("\n") if line.strip())
+
+
+def minify_html(html):
+    """Minify a rendered page: markup indentation, inline <style> and inline <script> blocks."""
+    out, pos = [], 0
+    for match in _BLOCK.finditer(html):
+        out.append(_minify_markup(html[pos:match.start()]))
+        open_tag, tag, body, close_tag = match.group(1), match.group(2).lower(), match.group(3), match.group(4)
+        if tag == "style":
+            body = minify_css(body)
+        elif tag == "script" and "src=" not in open_tag.lower() and body.strip():
+            body = minify_js(body)
+        out.append(open_tag + body + close_tag)
+        pos = match.end()
+    out.append(_minify_markup(html[pos:]))
+    return "\n".join(part for part in out if part)
+
+
+# -----------------------
+# ARTIFACTS
+# -----------------------
+
+def _write_atomic(path, data):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def write_artifact(path, html, minify=True):
+    """Write an HTML artifact with .gz and .br siblings; returns its manifest entry."""
+    path = Path(path)
+    raw = html.encode("utf-8")
+    data = minify_html(html).encode("utf-8") if minify else raw
+    _write_atomic(path, data)
+    entry = {"raw_bytes": len(raw), "bytes": len(data)}
+
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    _write_atomic(path.with_name(path.name + ".gz"), gz)
+    entry["gzip_bytes"] = len(gz)
+
+    if brotli is not None:
+        br = brotli.compress(data, quality=11, mode=brotli.MODE_TEXT)
+        _write_atomic(path.with_name(path.name + ".br"), br)
+        entry["brotli_bytes"] = len(br)
+    return entry
+
+
+def update_manifest(entries, directory="."):
+    """Merge {file name: sizes} into the manifest next to the artifacts."""
+    manifest_path = Path(directory) / MANIFEST_NAME
+    manifest = {}
+    if manifest_path.exists():
+        try:
+            manifest = json.loads(manifest_path.read_text())
+        except ValueError:
+            manifest = {}
+    manifest.update(entries)
+    _write_atomic(manifest_path, dumps(manifest, sort_keys=True).encode())
+    return manifest
+
+
+def publish(path, html, minify=True):
+    """Write one page artifact, its compressed variants and its manifest entry."""
+    path = Path(path)
+    with instrument.stage("publish"):
+        entry = write_artifact(path, html, minify)
+    instrument.count("bytes_written", entry["bytes"], artifact=path.name)
+    update_manifest({path.name: entry}, path.parent)
+    sizes = ", ".join(f"{k.replace('_bytes', '')} {v:,}" for k, v in entry.items())
+    print(f"✅ Wrote {path} ({sizes} bytes{'' if brotli else '; brotli not installed, no .br'})")
+    return entry
@@ -0,0 +1,332 @@
+"""Disaster panel: participant x hazard exposure matrix and its virtualized hazard list."""
+
+from lens.serialize import dumps
+
+
+def panel_payload(sections):
+    """Flatten panel sections into display rows plus sparse participant x hazard entries.
+
+    Each section is a dict with ``title``, ``color``, ``kind`` (picks the zoom
+    handler), ``empty`` (message when it has no rows), ``rows`` as
+    [(hazard key, label)] and ``exposure`` as {participant: {hazard key: value}}.
+    Optional ``ground_up`` and ``loss`` dicts of the same shape hold estimated
+    losses, sent as "gu" and "gl" alongside each exposure entry. Optional
+    ``bounds`` as {hazard key: [[south, west], [north, east]]} are what a
+    click on the hazard's row zooms to. A section with ``banner`` False is
+    left out of the banner totals; with ``banner`` as {participant: {hazard
+    key: value}} those values are counted in the banner in place of its rows'. Optional ``stats`` as {label: {participant
+    or None for all participants: {hazard key: value}}} are shown after the
+    hazard's figures, and sent as "stats" with p = -1 for all participants.
+    Hazards that only appear in ``exposure`` still count towards the banner total.
+    """
+    participants = sorted({p for section in sections for p in section["exposure"]} |
+                          {p for section in sections if isinstance(section.get("banner"), dict) for p in section["banner"]})
+    p_index = {p: i for i, p in enumerate(participants)}
+
+    hazards, rows = [], []
+    p_codes, h_codes, values, ground_up, loss = [], [], [], [], []
+    stat_labels, stat_rows = [], {}
+    for section in sections:
+        h_index = {}
+        bounds = section.get("bounds", {})
+        banner = section.get("banner", True)
+        extra = {} if banner is True else {"banner": False}
+        for key, label in section["rows"]:
+            h_index[key] = len(hazards)
+            hazards.append({"key": key, "label": label, "kind": section["kind"], "color": section["color"], **extra})
+            if key in bounds:
+                hazards[-1]["bounds"] = bounds[key]
+        for by_hazard in section["exposure"].values():
+            for key in by_hazard:
+                if key not in h_index:
+                    h_index[key] = len(hazards)
+                    hazards.append({"key": key, "label": str(key), "kind": section["kind"], "color": section["color"],
+                                    **extra})
+
+        rows.append({"type": "header", "label": section["title"]})
+        if section["rows"]:
+            rows.extend({"type": "hazard", "hazard": h_index[key]} for key, _ in section["rows"])
+        else:
+            rows.append({"type": "empty", "label": section["empty"]})
+
+        for participant, by_hazard in section["exposure"].items():
+            ground_up_by_hazard = section.get("ground_up", {}).get(participant, {})
+            loss_by_hazard = section.get("loss", {}).get(participant, {})
+            for key, value in by_hazard.items():
+                p_codes.append(p_index[participant])
+                h_codes.append(h_index[key])
+                values.append(float(value))
+                ground_up.append(float(ground_up_by_hazard.get(key, 0.0)))
+                loss.append(float(loss_by_hazard.get(key, 0.0)))
+
+        if isinstance(banner, dict):
+            # Banner-only hazards: never shown as rows
+            banner_index = {}
+            for participant, by_hazard in banner.items():
+                for key, value in by_hazard.items():
+                    if key not in banner_index:
+                        banner_index[key] = len(hazards)
+                        hazards.append({"key": key, "label": str(key), "kind": section["kind"], "color": section["color"]})
+                    p_codes.append(p_index[participant])
+                    h_codes.append(banner_index[key])
+                    values.append(float(value))
+                    ground_up.append(0.0)
+                    loss.append(0.0)
+
+        for label, by_participant in section.get("stats", {}).items():
+            if label not in stat_labels:
+                stat_labels.append(label)
+            for participant, by_hazard in by_participant.items():
+                p = -1 if participant is None else p_index.get(participant)
+                for key, value in by_hazard.items():
+                    if p is not None and key in h_index:
+                        stat_rows.setdefault((p, h_index[key]), {})[label] = float(value)
+
+    return {
+        "participants": participants,
+        "hazards": hazards,
+        "rows": rows,
+        "p": p_codes,
+        "h": h_codes,
+        "v": values,
+        "gu": ground_up,
+        "gl": loss,
+        "stats": {
+            "labels": stat_labels,
+            "p": [p for p, _ in stat_rows],
+            "h": [h for _, h in stat_rows],
+            "v": [[row.get(label) for label in stat_labels] for row in stat_rows.values()],
+        },
+    }
+
+
+DISASTER_PANEL_HTML = """
+<div id="disaster-panel" style="position: fixed; bottom: 30px; right: 30px; width: 380px;
+     background-color: white; border:2px solid grey; z-index:9999; font-size:14px; border-radius: 8px; padding:10px;
+     box-shadow:2px 2px 6px rgba(0,0,0,0.3);">
+<div style="font-weight:bold; cursor:pointer;" onclick="togglePanel('disaster-content')">
+Active Disasters & Trapped Exposure (click to expand/collapse)
+</div>
+<div id="disaster-content" style="position:relative; margin-top:5px; max-height:440px; overflow-y:auto; display:block;">
+  <div id="disaster-spacer" style="position:relative; width:100%;"></div>
+</div>
+</div>
+
+<script>
+window.lensPanel = __PANEL_JSON__;
+var hurricane_bounds = __HURRICANE_BOUNDS_JSON__;
+var eq_bounds = __EQ_BOUNDS_JSON__;
+
+function togglePanel(contentId) {
+  var content = document.getElementById(contentId);
+  if (content) content.style.display = content.style.display === 'none' ? 'block' : 'none';
+}
+
+function getMap() {
+  if (window._leaflet_map) return window._leaflet_map;
+  for (var k in window)
+    if (window[k] instanceof L.Map) {
+      window._leaflet_map = window[k];
+      return window._leaflet_map;
+    }
+  return null;
+}
+
+function zoomToHurricane(name) {
+    var map = getMap();
+    if (!map) return;
+    var bounds = hurricane_bounds[name];
+    if (!bounds) return;
+    var latLngBounds = L.latLngBounds(bounds);
+    map.fitBounds(latLngBounds, {padding:[50,50], maxZoom:6});
+    if (map.getZoom() < 3) map.setZoom(3);
+}
+
+function zoomToBounds(bounds) {
+  var map = getMap();
+  if (map) map.fitBounds(L.latLngBounds(bounds), {padding:[50,50], maxZoom:11});
+}
+
+function zoomToEarthquake(eq_id) {
+  var map = getMap();
+  if (!map) return;
+  var coords = eq_bounds[eq_id];
+  if (coords) map.setView(coords[0], 7);
+}
+
+(function() {
+  var ROW_HEIGHT = 22, OVERSCAN = 6;
+  var data, P, H, figures, participantIndex, stats, statIndex;
+
+  // Dense participant x hazard matrix plus precomputed "All Participants" column sums;
+  // the banner totals skip hazards marked banner: false
+  function dense(values) {
+    var matrix = new Float64Array(P * H), all = new Float64Array(H), totals = new Float64Array(P), grand = 0;
+    var counted = new Float64Array(H);
+    for (var h = 0; h < H; h++) counted[h] = data.hazards[h].banner === false ? 0 : 1;
+    for (var i = 0; i < values.length; i++) matrix[data.p[i] * H + data.h[i]] += values[i];
+    for (var p = 0; p < P; p++) {
+      var base = p * H, sum = 0;
+      for (var h = 0; h < H; h++) {
+        all[h] += matrix[base + h];
+        sum += counted[h] * matrix[base + h];
+      }
+      totals[p] = sum;
+      grand += sum;
+    }
+    return {matrix: matrix, all: all, totals: totals, grand: grand};
+  }
+
+  // Exposure, ground-up loss and gross loss
+  function load(payload) {
+    data = payload;
+    P = data.participants.length;
+    H = data.hazards.length;
+    figures = {v: dense(data.v), gu: dense(data.gu || []), gl: dense(data.gl || [])};
+    // Extra figures per (participant, hazard); participant -1 is all participants
+    stats = data.stats || {labels: [], p: [], h: [], v: []};
+    statIndex = new Map();
+    for (var i = 0; i < stats.v.length; i++) statIndex.set((stats.p[i] + 1) * H + stats.h[i], stats.v[i]);
+    participantIndex = new Map();
+    data.participants.forEach(function(name, idx) { participantIndex.set(name, idx); });
+  }
+  load(window.lensPanel);
+
+  // The figures of one participant (idx), all participants (undefined) or none (-1)
+  function view(idx) {
+    var out = {};
+    Object.keys(figures).forEach(function(name) {
+      var f = figures[name];
+      if (idx === -1) out[name] = {values: new Float64Array(H), total: 0};
+      else if (idx === undefined) out[name] = {values: f.all, total: f.grand};
+      else out[name] = {values: f.matrix.subarray(idx * H, (idx + 1) * H), total: f.totals[idx]};
+    });
+    return out;
+  }
+
+  var fmt = new Intl.NumberFormat(undefined, {maximumFractionDigits: 0});
+  var current = view(undefined), currentIdx;
+  var viewport, spacer, select, totalEl, lossEl, pool = [], pending = false;
+
+  function rowText(row) {
+    if (row.type !== 'hazard') return row.label;
+    var text = data.hazards[row.hazard].label + ': $' + fmt.format(current.v.values[row.hazard]);
+    var loss = current.gl.values[row.hazard], groundUp = current.gu.values[row.hazard];
+    if (loss > 0 || groundUp > 0) text += ' · loss $' + fmt.format(loss) + ' (GU $' + fmt.format(groundUp) + ')';
+    var extra = currentIdx === -1 ? undefined : statIndex.get((currentIdx === undefined ? 0 : currentIdx + 1) * H + row.hazard);
+    if (extra)
+      for (var i = 0; i < extra.length; i++)
+        if (extra[i] !== null) text += ' · ' + stats.labels[i] + ' $' + fmt.format(extra[i]);
+    return text;
+  }
+
+  function styleRow(el, row) {
+    if (row.type === 'header') {
+      el.style.fontWeight = 'bold'; el.style.color = '#000'; el.style.fontStyle = 'normal'; el.style.cursor = 'default';
+    } else if (row.type === 'empty') {
+      el.style.fontWeight = 'normal'; el.style.color = '#000'; el.style.fontStyle = 'italic'; el.style.cursor = 'default';
+    } else {
+      var hazard = data.hazards[row.hazard];
+      el.style.fontWeight = hazard.kind === 'earthquake' ? 'normal' : 'bold';
+      el.style.color = hazard.color; el.style.fontStyle = 'normal'; el.style.cursor = 'pointer';
+    }
+  }
+
+  // Only the rows inside the scroll window (plus overscan) exist in the DOM
+  function renderRows() {
+    pending = false;
+    var first = Math.max(0, Math.floor(viewport.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    var last = Math.min(data.rows.length, Math.ceil((viewport.scrollTop + viewport.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+    while (pool.length < last - first) {
+      var el = document.createElement('div');
+      el.style.cssText = 'position:absolute; left:0; right:0; height:' + ROW_HEIGHT + 'px; line-height:' + ROW_HEIGHT +
+        'px; white-space:nowrap; overflow:hidden; text-overflow:ellipsis;';
+      spacer.appendChild(el);
+      pool.push(el);
+    }
+    for (var i = 0; i < pool.length; i++) {
+      var el = pool[i], idx = first + i;
+      if (idx >= last) { el.style.display = 'none'; continue; }
+      var row = data.rows[idx];
+      if (el._row !== idx) {
+        el._row = idx;
+        el.style.top = (idx * ROW_HEIGHT) + 'px';
+        styleRow(el, row);
+      }
+      el.style.display = 'block';
+      el.textContent = el.title = rowText(row);
+    }
+    totalEl = totalEl || document.getElementById('total-trapped');
+    if (totalEl) totalEl.textContent = fmt.format(current.v.total);
+    lossEl = lossEl || document.getElementById('total-loss');
+    if (lossEl) lossEl.textContent = fmt.format(current.gl.total);
+  }
+
+  function scheduleRender() {
+    if (pending) return;
+    pending = true;
+    window.requestAnimationFrame(renderRows);
+  }
+
+  window.updateParticipantView = function() {
+    select = select || document.getElementById('participantSelect');
+    var idx = (select && select.value) ? participantIndex.get(select.value) : undefined;
+    currentIdx = idx === undefined && select && select.value ? -1 : idx;
+    current = view(currentIdx);
+    scheduleRender();
+
+    // Heatmap is re-binned from the shared grid for the selected participant
+    if (typeof updateHeatGrid === 'function') updateHeatGrid();
+  };
+
+  // Swap in fresh exposure figures (serve mode) without rebuilding the page
+  window.setPanelData = function(payload, hurricaneBounds, eqBounds) {
+    window.lensPanel = payload;
+    hurricane_bounds = hurricaneBounds;
+    eq_bounds = eqBounds;
+    load(payload);
+    select = select || document.getElementById('participantSelect');
+    if (select) {
+      var selected = select.value;
+      while (select.options.length > 1) select.remove(1);
+      data.participants.forEach(function(name) { select.add(new Option(name, name)); });
+      select.value = participantIndex.has(selected) ? selected : '';
+    }
+    if (spacer) spacer.style.height = (data.rows.length * ROW_HEIGHT) + 'px';
+    pool.forEach(function(el) { el._row = undefined; });
+    window.updateParticipantView();
+  };
+
+  function init() {
+    viewport = document.getElementById('disaster-content');
+    spacer = document.getElementById('disaster-spacer');
+    spacer.style.height = (data.rows.length * ROW_HEIGHT) + 'px';
+    viewport.addEventListener('scroll', scheduleRender, {passive: true});
+    viewport.addEventListener('click', function(e) {
+      var el = e.target;
+      if (el._row === undefined) return;
+      var row = data.rows[el._row];
+      if (row.type !== 'hazard') return;
+      var hazard = data.hazards[row.hazard];
+      if (hazard.bounds) zoomToBounds(hazard.bounds);
+      else if (hazard.kind === 'earthquake') zoomToEarthquake(hazard.key);
+      else zoomToHurricane(hazard.key);
+    });
+    renderRows();
+  }
+
+  if (document.readyState === 'loading') document.addEventListener('DOMContentLoaded', init);
+  else init();
+})();
+</script>
+"""
+
+
+def disaster_panel_html(payload, hurricane_bounds, eq_bounds):
+    """Panel markup and script for a payload built by panel_payload."""
+    return (
+        DISASTER_PANEL_HTML
+        .replace("__PANEL_JSON__", dumps(payload))
+        .replace("__HURRICANE_BOUNDS_JSON__", dumps(hurricane_bounds))
+        .replace("__EQ_BOUNDS_JSON__", dumps(eq_bounds))
+    )
@@ -0,0 +1,614 @@
+"""Sharded spatial joins: grid-partitioned exposure points joined in a process pool.
+
+Points come from the persisted, memory-mapped lens.locindex index, whose
+Hilbert-ordered leaves act as cells. Without an artifact store, they are
+instead sorted by grid cell once per exposure snapshot, and their coordinates,
+trapped exposure (one array per peril, see lens.terms) and participant codes
+are copied into shared memory. Per
+join, cells whose point extent misses every hazard footprint are pruned, and
+the rest are split into shards of contiguous rows. Workers receive only the
+index path or shared-memory names, their row ranges and the hazard geometries
+(as WKB) that touch their shard. Each worker returns the summed exposure of
+every joined (hazard geometry, participant) pair, keyed by one integer per
+pair, and the partial sums are merged by key. Losses are summed in the same
+pass: the parent looks up a small (occupancy x hazard geometry) damage-ratio
+matrix (lens.vulnerability), and workers weight each joined point's value by
+its entry. The frames built from the merged sums match lens.joins.
+"""
+
+import atexit
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from lens import joins, montecarlo, shakegrid, vulnerability, windfield
+from lens.terms import GROUND_UP
+
+# Grid cell size used to partition points
+CELL_DEGREES = 5.0
+
+# Below this many points the geopandas joins are as fast as sharding
+MIN_PARALLEL_POINTS = 200_000
+
+# Shards per worker, so uneven shards still balance across the pool
+SHARDS_PER_WORKER = 4
+
+WORKERS = int(os.environ.get("LENS_JOIN_WORKERS", os.cpu_count() or 1))
+
+# Point-side predicate -> the hazard-side predicate used when querying a tree of points
+REVERSE_PREDICATES = {"within": "contains", "intersects": "intersects"}
+
+def value_arrays(locations):
+    """Value arrays to share: trapped exposure as "value", plus "value_<peril>" and the
+    ground-up value as "value_ground_up" for stores with financial terms."""
+    from lens.terms import PERILS, peril_column
+
+    arrays = {"value": locations.values["trapped_exposure_usd"]}
+    for peril in PERILS:
+        if peril_column(peril) in locations.values:
+            arrays[f"value_{peril}"] = locations.values[peril_column(peril)]
+    if GROUND_UP in locations.values:
+        arrays["value_ground_up"] = locations.values[GROUND_UP]
+    return arrays
+
+
+def occupancy_codes(locations):
+    """Occupancy code of every location (-1 without one), and the occupancy categories."""
+    if "occupancy" not in locations.codes:
+        return np.full(len(locations), -1, dtype=np.int32), pd.Index([])
+    return locations.codes["occupancy"], locations.categories["occupancy"]
+
+
+def array_dtype(name):
+    return np.int32 if name in ("code", "occupancy") else np.float64
+
+
+# -----------------------
+# SHARED POINTS
+# -----------------------
+
+class SharedPoints:
+    """Exposure points sorted by grid cell, held in shared memory for the worker pool."""
+
+    def __init__(self, locations, cell_degrees=CELL_DEGREES):
+        lon, lat = locations.lon, locations.lat
+        codes, self.participants = locations.codes["participant_name"], locations.categories["participant_name"]
+        occupancy, self.occupancies = occupancy_codes(locations)
+
+        n_cols, n_rows = int(np.ceil(360 / cell_degrees)), int(np.ceil(180 / cell_degrees))
+        col = np.clip(((lon + 180) // cell_degrees).astype(np.int64), 0, n_cols - 1)
+        row = np.clip(((lat + 90) // cell_degrees).astype(np.int64), 0, n_rows - 1)
+        cell = row * n_cols + col
+        order = np.argsort(cell, kind="stable")
+
+        self.n = len(order)
+        # Store row of each sorted row
+        self.order = order
+        self.blocks = {}
+        sorted_values = {
+            "lon": lon[order],
+            "lat": lat[order],
+            "code": codes[order],
+            "occupancy": occupancy[order],
+            # Missing exposure counts as 0, as in a groupby sum
+            **{name: np.nan_to_num(values)[order] for name, values in value_arrays(locations).items()},
+        }
+        for name, values in sorted_values.items():
+            dtype = array_dtype(name)
+            block = shared_memory.SharedMemory(create=True, size=max(self.n * np.dtype(dtype).itemsize, 1))
+            np.ndarray(self.n, dtype=dtype, buffer=block.buf)[:] = values
+            self.blocks[name] = block
+        self.names = {name: block.name for name, block in self.blocks.items()}
+        self.columns = set(self.names)
+        self.source = ("shm", self.names, self.n)
+        self._finalizer = weakref.finalize(self, _release, list(self.blocks.values()))
+
+        # Row range and point extent of every non-empty cell
+        _, starts = np.unique(cell[order], return_index=True)
+        self.starts = starts
+        self.ends = np.append(starts[1:], self.n)
+        self.extents = np.column_stack([
+            np.minimum.reduceat(sorted_values["lon"], starts), np.minimum.reduceat(sorted_values["lat"], starts),
+            np.maximum.reduceat(sorted_values["lon"], starts), np.maximum.reduceat(sorted_values["lat"], starts),
+        ]) if self.n else np.empty((0, 4))
+
+    def close(self):
+        self._finalizer()
+
+    def touching(self, bounds):
+        """Cells whose point extent touches any of ``bounds`` (k x 4)."""
+        if not len(bounds) or not self.n:
+            return np.empty(0, dtype=np.int64)
+        e, b = self.extents[:, None, :], bounds[None, :, :]
+        return np.flatnonzero(((e[..., 0] <= b[..., 2]) & (e[..., 2] >= b[..., 0]) &
+                               (e[..., 1] <= b[..., 3]) & (e[..., 3] >= b[..., 1])).any(axis=1))
+
+
+def shards(points, bounds, workers):
+    """Cells of ``points`` (SharedPoints or a LocationIndex) touching ``bounds``, grouped into balanced shards."""
+    cells = points.touching(bounds)
+    rows = int((points.ends[cells] - points.starts[cells]).sum())
+    target = max(rows // max(workers * SHARDS_PER_WORKER, 1), 1)
+
+    grouped, current, size = [], [], 0
+    for c in cells:
+        current.append(c)
+        size += points.ends[c] - points.starts[c]
+        if size >= target:
+            grouped.append(current)
+            current, size = [], 0
+    if current:
+        grouped.append(current)
+    return grouped
+
+
+def row_ranges(points, cells):
+    """(start, end) row ranges of the cells, with adjacent ranges merged."""
+    ranges = []
+    for c in cells:
+        start, end = int(points.starts[c]), int(points.ends[c])
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def _release(blocks):
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+# -----------------------
+# WORKERS
+# -----------------------
+
+_attached = {}
+
+
+def _attach(source):
+    """Point arrays in a worker: shared-memory blocks or a memory-mapped lens.locindex directory."""
+    key = repr(source)
+    if key not in _attached:
+        _attached.clear()
+        if source[0] == "mmap":
+            from lens.locindex import load_arrays
+
+            _attached[key] = {name: (None, array) for name, array in load_arrays(source[1]).items()}
+        else:
+            _, names, n = source
+            arrays = {}
+            for name, block_name in names.items():
+                # Workers share the parent's resource tracker, which already owns the block
+                try:
+                    block = shared_memory.SharedMemory(name=block_name, track=False)
+                except TypeError:  # track= is new in Python 3.13
+                    block = shared_memory.SharedMemory(name=block_name)
+                arrays[name] = (block, np.ndarray(n, dtype=array_dtype(name), buffer=block.buf))
+            _attached[key] = arrays
+    return {name: array for name, (_, array) in _attached[key].items()}
+
+
+def reduce_pairs(keys, weights):
+    """(unique keys, summed weights) of (hazard geometry, participant) pair keys; weights may be n x columns."""
+    keys, inverse = np.unique(keys, return_inverse=True)
+    if weights.ndim == 2:
+        return keys, np.column_stack([np.bincount(inverse, weights=w, minlength=len(keys)) for w in weights.T])
+    return keys, np.bincount(inverse, weights=weights, minlength=len(keys))
+
+
+def point_occupancy(arrays, rows):
+    # -1 (no occupancy) picks the last row of a damage matrix, the default curve
+    return arrays["occupancy"][rows] if "occupancy" in arrays else np.full(len(rows), -1)
+
+
+def loss_weights(arrays, rows, value, ratio):
+    """Value, ground-up loss and gross loss of each joined point at its damage ``ratio``."""
+    values = arrays[value][rows]
+    ground_up = arrays["value_ground_up"][rows] if "value_ground_up" in arrays else values
+    return np.column_stack([values, ground_up * ratio, values * ratio])
+
+
+def pair_weights(arrays, rows, hazard_idx, value, damage):
+    """Value of each joined point, plus its ground-up and gross loss when a ``damage`` matrix is given."""
+    if damage is None:
+        return arrays[value][rows]
+    return loss_weights(arrays, rows, value, damage[point_occupancy(arrays, rows), hazard_idx])
+
+
+def join_shard(source, ranges, hazard_wkb, predicate, n_participants, value="value", damage=None, cell_degrees=None):
+    """Sum exposure (the ``value`` array) per joined (hazard geometry, participant) pair over the row ranges.
+
+    Returns sparse (pair keys, sums), key = hazard index * n_participants +
+    participant code, since account groups make the dense matrix too large.
+    With a ``damage`` matrix (occupancy + 1 x hazard, see
+    vulnerability.damage_matrix) the sums are n x 3: exposure, ground-up loss
+    and gross loss. With ``cell_degrees`` the pairs are split by the points'
+    correlation cells (lens.montecarlo): the participant code becomes
+    code * cells + cell, and ``n_participants`` counts those.
+    """
+    arrays = _attach(source)
+    hazards = shapely.from_wkb(hazard_wkb)
+    # Query the points' tree with the (prepared) hazard geometries, as geopandas does for "within"
+    reverse = REVERSE_PREDICATES[predicate]
+    keys, weights = [np.empty(0, dtype=np.int64)], [np.empty((0, 3)) if damage is not None else np.empty(0)]
+    for start, end in ranges:
+        tree = shapely.STRtree(shapely.points(arrays["lon"][start:end], arrays["lat"][start:end]))
+        hazard_idx, point_idx = tree.query(hazards, predicate=reverse)
+        code = arrays["code"][start:end][point_idx]
+        # Points without a participant are dropped, as groupby drops NaN keys
+        keep = code >= 0
+        if not keep.any():
+            continue
+        code = code[keep].astype(np.int64)
+        if cell_degrees:
+            rows = start + point_idx[keep]
+            cells = montecarlo.point_cells(arrays["lon"][rows], arrays["lat"][rows], cell_degrees)
+            code = code * montecarlo.cell_count(cell_degrees) + cells
+        keys.append(hazard_idx[keep] * n_participants + code)
+        weights.append(pair_weights(arrays, start + point_idx[keep], hazard_idx[keep], value, damage))
+    return reduce_pairs(np.concatenate(keys), np.concatenate(weights))
+
+
+def member_shard(source, ranges, hazard_wkb, predicate, value="value"):
+    """(hazard index, row, participant code, value) of every joined point over the row ranges.
+
+    Rows are in the points' sorted order; points without a participant are dropped.
+    """
+    arrays = _attach(source)
+    hazards = shapely.from_wkb(hazard_wkb)
+    reverse = REVERSE_PREDICATES[predicate]
+    hazard_parts, row_parts = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for start, end in ranges:
+        tree = shapely.STRtree(shapely.points(arrays["lon"][start:end], arrays["lat"][start:end]))
+        hazard_idx, point_idx = tree.query(hazards, predicate=reverse)
+        keep = arrays["code"][start:end][point_idx] >= 0
+        hazard_parts.append(hazard_idx[keep])
+        row_parts.append(start + point_idx[keep])
+    hazard_idx, rows = np.concatenate(hazard_parts), np.concatenate(row_parts)
+    return hazard_idx, rows, arrays["code"][rows].astype(np.int64), np.asarray(arrays[value][rows])
+
+
+def wind_shard(source, ranges, steps, n_participants, value, curve_rows):
+    """Sum exposure and loss per (storm, participant) over the row ranges from the track points' wind field.
+
+    ``steps`` are windfield.step_arrays of the track points near the shard and
+    ``curve_rows`` the wind curve of each occupancy code (vulnerability.class_rows).
+    """
+    arrays = _attach(source)
+    keys, weights = [np.empty(0, dtype=np.int64)], [np.empty((0, 3))]
+    for start, end in ranges:
+        storm, point, wind = windfield.peak_winds(arrays["lon"][start:end], arrays["lat"][start:end], steps)
+        code = arrays["code"][start:end][point]
+        keep = code >= 0
+        if not keep.any():
+            continue
+        rows = start + point[keep]
+        ratio = vulnerability.row_damage("ws", wind[keep], curve_rows[point_occupancy(arrays, rows)])
+        keys.append(storm[keep] * n_participants + code[keep])
+        weights.append(loss_weights(arrays, rows, value, ratio))
+    return reduce_pairs(np.concatenate(keys), np.concatenate(weights))
+
+
+def grid_shard(source, ranges, grids, n_participants, value, curve_rows):
+    """Sum exposure and loss per (ShakeMap grid, participant) over the row ranges at each point's interpolated MMI.
+
+    ``grids`` are the lens.shakegrid grids overlapping the shard and
+    ``curve_rows`` the earthquake curve of each occupancy code.
+    """
+    arrays = _attach(source)
+    keys, weights = [np.empty(0, dtype=np.int64)], [np.empty((0, 3))]
+    for start, end in ranges:
+        grid, point, mmi = shakegrid.sample_grids(grids, arrays["lon"][start:end], arrays["lat"][start:end])
+        code = arrays["code"][start:end][point]
+        keep = code >= 0
+        if not keep.any():
+            continue
+        rows = start + point[keep]
+        ratio = vulnerability.row_damage("eq", mmi[keep], curve_rows[point_occupancy(arrays, rows)])
+        keys.append(grid[keep] * n_participants + code[keep])
+        weights.append(loss_weights(arrays, rows, value, ratio))
+    return reduce_pairs(np.concatenate(keys), np.concatenate(weights))
+
+
+_pool = None
+
+
+def pool(workers=WORKERS):
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        atexit.register(_pool.shutdown)
+    return _pool
+
+
+def pair_sums(shared, geoms, predicate, workers=WORKERS, value="value", damage=None, cell_degrees=None):
+    """(pair keys, sums) over every shard, merged; see join_shard."""
+    geoms = np.asarray(geoms, dtype=object)
+    n_participants = len(shared.participants) * (montecarlo.cell_count(cell_degrees) if cell_degrees else 1)
+    empty = np.empty((0, 3)) if damage is not None else np.empty(0)
+    if not len(geoms):
+        return reduce_pairs(np.empty(0, dtype=np.int64), empty)
+
+    futures = []
+    for ranges, hit in shard_hits(shared, shapely.bounds(geoms), workers):
+        args = (shared.source, ranges, shapely.to_wkb(geoms[hit]), predicate, n_participants, value,
+                None if damage is None else damage[:, hit], cell_degrees)
+        futures.append((hit, pool(workers).submit(join_shard, *args) if workers > 1 else _Done(join_shard(*args))))
+
+    keys, sums = [np.empty(0, dtype=np.int64)], [empty]
+    for hit, future in futures:
+        part_keys, part_sums = future.result()
+        # Shard-local hazard indices back to indices into geoms
+        local, code = np.divmod(part_keys, n_participants)
+        keys.append(hit[local] * n_participants + code)
+        sums.append(part_sums)
+    return reduce_pairs(np.concatenate(keys), np.concatenate(sums))
+
+
+def pair_members(shared, geoms, predicate, workers=WORKERS, value="value"):
+    """(hazard index, store row, participant code, value) of every joined (hazard geometry, point) pair."""
+    geoms = np.asarray(geoms, dtype=object)
+    futures = []
+    if len(geoms):
+        for ranges, hit in shard_hits(shared, shapely.bounds(geoms), workers):
+            args = (shared.source, ranges, shapely.to_wkb(geoms[hit]), predicate, value)
+            futures.append((hit, pool(workers).submit(member_shard, *args) if workers > 1 else _Done(member_shard(*args))))
+    parts = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))]
+    for hit, future in futures:
+        hazard_idx, rows, code, values = future.result()
+        parts.append((hit[hazard_idx], np.asarray(shared.order[rows], dtype=np.int64), code, values))
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+def shard_hits(shared, bounds, workers):
+    """(row ranges, indices of the hazard ``bounds`` overlapping them) of every shard some hazard overlaps."""
+    for cells in shards(shared, bounds, workers):
+        extent = np.asarray(shared.extents[cells])
+        lo, hi = extent[:, :2].min(axis=0), extent[:, 2:].max(axis=0)
+        # Only the hazards overlapping this shard travel to its worker
+        hit = np.flatnonzero((bounds[:, 0] <= hi[0]) & (bounds[:, 2] >= lo[0]) &
+                             (bounds[:, 1] <= hi[1]) & (bounds[:, 3] >= lo[1]))
+        if len(hit):
+            yield row_ranges(shared, cells), hit
+
+
+def wind_sums(shared, steps, workers=WORKERS, value="value", curve_rows=None):
+    """(storm x participant keys, sums) of the wind field of track point ``steps``; see wind_shard."""
+    n_participants = len(shared.participants)
+    futures = []
+    for ranges, hit in shard_hits(shared, windfield.step_bounds(steps), workers):
+        local = {name: column if name == "storms" else column[hit] for name, column in steps.items()}
+        args = (shared.source, ranges, local, n_participants, value, curve_rows)
+        futures.append(pool(workers).submit(wind_shard, *args) if workers > 1 else _Done(wind_shard(*args)))
+    keys, sums = [np.empty(0, dtype=np.int64)], [np.empty((0, 3))]
+    for future in futures:
+        part_keys, part_sums = future.result()
+        keys.append(part_keys)
+        sums.append(part_sums)
+    return reduce_pairs(np.concatenate(keys), np.concatenate(sums))
+
+
+def grid_sums(shared, grids, workers=WORKERS, value="value", curve_rows=None):
+    """(grid x participant keys, sums) of the ShakeMap ``grids``; see grid_shard."""
+    n_participants = len(shared.participants)
+    futures = []
+    for ranges, hit in shard_hits(shared, shakegrid.grid_bounds(grids), workers):
+        args = (shared.source, ranges, [grids[i] for i in hit], n_participants, value, curve_rows)
+        futures.append((hit, pool(workers).submit(grid_shard, *args) if workers > 1 else _Done(grid_shard(*args))))
+    keys, sums = [np.empty(0, dtype=np.int64)], [np.empty((0, 3))]
+    for hit, future in futures:
+        part_keys, part_sums = future.result()
+        local, code = np.divmod(part_keys, n_participants)
+        keys.append(hit[local] * n_participants + code)
+        sums.append(part_sums)
+    return reduce_pairs(np.concatenate(keys), np.concatenate(sums))
+
+
+class _Done:
+    """Stand-in future for in-process shards."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+
+def pair_frame(shared, hazard_gdf, predicate, columns, workers=WORKERS, value="value", damage=None, cell_degrees=None):
+    """Long frame of hazard columns, participant_name and the summed values per joined pair."""
+    keys, sums = pair_sums(shared, hazard_gdf.geometry.values, predicate, workers, value, damage, cell_degrees)
+    return sums_frame(hazard_gdf, columns, shared.participants, keys, sums, cell_degrees)
+
+
+def sums_frame(hazard_gdf, columns, participants, keys, sums, cell_degrees=None):
+    """The joined (hazard geometry, participant) pairs of merged pair sums as a long frame.
+
+    Sums with loss columns (see join_shard) fill joins.VALUE_COLUMNS, otherwise trapped_exposure_usd.
+    Pairs split by correlation cell get a "cell" column.
+    """
+    cells = montecarlo.cell_count(cell_degrees) if cell_degrees else 1
+    hazard_idx, participant_idx = np.divmod(keys, len(participants) * cells)
+    participant_idx, cell = np.divmod(participant_idx, cells)
+    frame = hazard_gdf.iloc[hazard_idx][columns].reset_index(drop=True)
+    if cell_degrees:
+        frame["cell"] = cell
+    frame["participant_name"] = np.asarray(participants)[participant_idx]
+    if sums.ndim == 2:
+        for col, column_sums in zip(joins.VALUE_COLUMNS, sums.T):
+            frame[col] = column_sums
+    else:
+        frame["trapped_exposure_usd"] = sums
+    return frame
+
+
+# -----------------------
+# SHARDED JOINS
+# -----------------------
+
+class ShardedJoins:
+    """Drop-in for the lens.joins functions, backed by SharedPoints and the process pool.
+
+    The points argument is only checked for .empty and .crs, so the
+    LocationStore can be passed in place of a points GeoDataFrame.
+    """
+
+    def __init__(self, shared, workers=WORKERS, value="value"):
+        self.shared = shared
+        self.workers = workers
+        self.value = value
+
+    def for_peril(self, peril):
+        """These joins summing trapped exposure under ``peril``'s terms, where the points carry them."""
+        name = f"value_{peril}"
+        return ShardedJoins(self.shared, self.workers, name) if name in self.shared.columns else self
+
+    @property
+    def occupancies(self):
+        return self.shared.occupancies
+
+    @property
+    def participants(self):
+        return self.shared.participants
+
+    def damage(self, peril, intensity, floor=None):
+        """Damage ratios per (occupancy, hazard geometry) for these points; see vulnerability.damage_matrix."""
+        return vulnerability.damage_matrix(peril, intensity, self.occupancies, floor)
+
+    def pairs(self, hazard_gdf, predicate, columns, damage=None, cell_degrees=None):
+        return pair_frame(self.shared, hazard_gdf, predicate, columns, self.workers, self.value, damage, cell_degrees)
+
+    def members(self, geoms, predicate):
+        """(hazard index, store row, participant code, value) of every joined pair; see pair_members."""
+        return pair_members(self.shared, geoms, predicate, self.workers, self.value)
+
+    def hurricane_band_exposure(self, band_gdf, points_gdf, cell_degrees):
+        if band_gdf.empty or points_gdf.empty:
+            return pd.DataFrame(columns=[*montecarlo.BAND_COLUMNS, *joins.VALUE_COLUMNS])
+        band_gdf = joins.clean_prob_gdf(band_gdf, points_gdf.crs)
+        damage = self.damage("ws", vulnerability.representative_kt(band_gdf["wind_kt"]),
+                             vulnerability.representative_kt(band_gdf["floor_kt"]))
+        pairs = self.pairs(band_gdf, "within", ["storm", "wind_kt", "prob"], damage, cell_degrees)
+        bands = pairs.groupby(montecarlo.BAND_COLUMNS, as_index=False)[joins.VALUE_COLUMNS].sum()
+        bands["storm"] = bands["storm"].astype(str)
+        return bands
+
+    def wind_sums(self, steps):
+        return wind_sums(self.shared, steps, self.workers, self.value, vulnerability.class_rows("ws", self.occupancies))
+
+    def windfield_exposure(self, track_steps, points_gdf):
+        columns = ["storm", "participant_name", *joins.VALUE_COLUMNS]
+        if track_steps.empty or points_gdf.empty:
+            return pd.DataFrame(columns=columns)
+        steps = windfield.step_arrays(track_steps)
+        keys, sums = self.wind_sums(steps)
+        storms = pd.DataFrame({"storm": steps["storms"].astype(str)})
+        return sums_frame(storms, ["storm"], self.participants, keys, sums)[columns]
+
+    def grid_sums(self, grids):
+        return grid_sums(self.shared, grids, self.workers, self.value, vulnerability.class_rows("eq", self.occupancies))
+
+    def grid_shake_exposure(self, grids, points_gdf):
+        if not grids or points_gdf.empty:
+            return pd.DataFrame(columns=joins.EMPTY_SHAKE_EXPOSURE)
+        keys, sums = self.grid_sums(grids)
+        events = pd.DataFrame({"eq_id": [grid["eq_id"] for grid in grids]})
+        return sums_frame(events, ["eq_id"], self.participants, keys, sums).reindex(columns=joins.EMPTY_SHAKE_EXPOSURE)
+
+    def observed_track_exposure(self, observed_track_gdf, points_gdf):
+        if observed_track_gdf.empty or points_gdf.empty:
+            print("⚠️ observed_track_gdf or points_gdf is empty — skipping observed hurricane exposure.")
+            return pd.DataFrame()
+        print("🔹 Calculating trapped exposure within observed hurricane tracks...")
+        damage = self.damage("ws", vulnerability.category_kt(observed_track_gdf["saffir_scale"]))
+        pairs = self.pairs(observed_track_gdf, "intersects", ["storm"], damage)
+        if pairs.empty:
+            print("⚠️ No trapped exposures found in observed hurricane tracks.")
+            return pd.DataFrame()
+        observed = pairs.groupby(["storm", "participant_name"])[joins.VALUE_COLUMNS].sum().reset_index()
+        print(f"✅ Found {len(observed)} exposures within observed tracks.")
+        return observed
+
+    def wildfire_exposure(self, band_gdf, points_gdf):
+        columns = ["incident", "band", "participant_name", "trapped_exposure_usd"]
+        if band_gdf.empty or points_gdf.empty:
+            return pd.DataFrame(columns=columns)
+        pairs = self.pairs(band_gdf.to_crs(points_gdf.crs), "within", ["incident", "band"])
+        return pairs.groupby(["incident", "band", "participant_name"], as_index=False)["trapped_exposure_usd"].sum()
+
+    def flood_members(self, flood_gdf, points_gdf):
+        if flood_gdf.empty or points_gdf.empty:
+            return pd.DataFrame(columns=joins.FLOOD_MEMBER_COLUMNS)
+        flood_gdf = flood_gdf.to_crs(points_gdf.crs)
+        hazard_idx, rows, code, values = self.members(flood_gdf.geometry.values, "within")
+        return pd.DataFrame({
+            "flood_id": flood_gdf["flood_id"].to_numpy()[hazard_idx],
+            "severity": flood_gdf["severity"].to_numpy()[hazard_idx],
+            "location": rows,
+            "participant_name": np.asarray(self.participants)[code],
+            "trapped_exposure_usd": values,
+        })
+
+    def earthquake_exposure(self, eq_gdf, shake_gdf, points_gdf, grids=()):
+        shake_gdf_bbox = joins.without_gridded(joins.shake_envelopes(shake_gdf, eq_gdf), grids) if not shake_gdf.empty else shake_gdf
+        if not shake_gdf_bbox.empty and not points_gdf.empty and not eq_gdf.empty:
+            damage = self.damage("eq", shake_gdf_bbox["intensity"], shake_gdf_bbox["floor_intensity"])
+            pairs = self.pairs(shake_gdf_bbox, "within", ["shake_id", "intensity"], damage)
+            trapped_by_shake = pairs.groupby(
+                ["shake_id", "intensity", "participant_name"], as_index=False
+            )[joins.VALUE_COLUMNS].sum()
+            trapped_by_shake_eq = joins.link_shakes_to_earthquakes(trapped_by_shake, shake_gdf_bbox)
+        else:
+            trapped_by_shake_eq = pd.DataFrame(columns=joins.EMPTY_SHAKE_EXPOSURE)
+        if not eq_gdf.empty:
+            trapped_by_shake_eq = joins.shake_exposure_frames(trapped_by_shake_eq, self.grid_shake_exposure(grids, points_gdf))
+
+        if eq_gdf.empty or points_gdf.empty:
+            print("⚠️ No trapped exposure data for earthquakes ≥6")
+            return pd.DataFrame(columns=joins.EMPTY_EQ_EXPOSURE)
+        direct = self.pairs(eq_gdf, "intersects", ["eq_id", "mag", "place"],
+                            self.damage("eq", vulnerability.epicentral_mmi(eq_gdf["mag"])))
+        trapped_per_eq_direct = direct.groupby(
+            ["eq_id", "mag", "place", "participant_name"], as_index=False
+        )[joins.VALUE_COLUMNS].sum()
+        trapped_per_eq = joins.combine_earthquake_exposure(trapped_per_eq_direct, trapped_by_shake_eq)
+        if not trapped_per_eq.empty:
+            trapped_per_eq["eq_id"] = trapped_per_eq["eq_id"].astype(str)
+        return trapped_per_eq
+
+
+def join_backend(snapshot, store=None, workers=WORKERS):
+    """ShardedJoins for large snapshots, otherwise lens.joins.
+
+    With one worker the shards run in-process; pruning and the bincount
+    aggregation still beat sjoin + groupby at this size. With an artifact
+    store the points come from the persisted lens.locindex index (built once
+    per exposure key, patched for delta snapshots, and memory-mapped
+    afterwards); without one they are copied into shared memory once per
+    snapshot and released with it.
+    Spilled snapshots (lens.streaming) always use the streaming joins.
+    """
+    # Joins sum per (account, participant) group; lens.terms applies the account terms afterwards
+    locations, _ = snapshot["locations"].account_view()
+    if snapshot.get("streaming"):
+        from lens.streaming import StreamingJoins
+
+        return StreamingJoins(locations)
+    if len(locations) < MIN_PARALLEL_POINTS:
+        return joins
+    if "shared_points" not in snapshot:
+        if store is not None:
+            from lens.locindex import location_index
+
+            change = snapshot.get("delta")
+            base = change and (change["base_key"], change["removed_mask"])
+            snapshot["shared_points"] = location_index(store, snapshot["tiv_key"], locations, base)
+        else:
+            snapshot["shared_points"] = SharedPoints(locations)
+    return ShardedJoins(snapshot["shared_points"], workers)
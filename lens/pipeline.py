@@ -0,0 +1,600 @@
+"""End-to-end LENS run: feeds -> hazard layers -> exposure joins -> panel -> saved map.
+
+Every stage is keyed on a content hash of its inputs and stored in the artifact
+store, so a refresh only recomputes (and re-serializes) the layers whose inputs
+changed; the page is then assembled from cached fragments.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+
+import folium
+import pandas as pd
+
+from lens import (
+    delta, exposure, hazards, instrument, joins, montecarlo, output, parallel, render, shakegrid, streaming, terms,
+    vulnerability, wildfire, windfield,
+)
+from lens.artifacts import ArtifactStore, content_hash
+from lens.feeds import fetch_feeds
+from lens.panel import disaster_panel_html, panel_payload
+from lens.render import render_fragment
+from lens.serialize import use_fast_encoder
+from lens.store import LocationStore
+
+OUTPUT_HTML = "full_disaster_map_one_row_per_hazard.html"
+NATIVE_ZOOM_HTML = "map_with_native_zoom_limits.html"
+
+HURRICANE_FEEDS = ["hurricane_observed", "hurricane_forecast", "hurricane_cone", "hurricane_ts_prob", "hurricane_hf_prob"]
+
+# -----------------------
+# HAZARD STAGES
+# -----------------------
+
+def build_storms(feeds):
+    locations = feeds["hurricane_locations"]
+    return {
+        "bounds": hazards.storm_location_bounds(locations),
+        "layer": render_fragment(hazards.build_storm_layer(locations)),
+    }
+
+
+def build_hurricanes(feeds):
+    hurricane_layer, observed_layer, observed_track_gdf, prob_gdf = hazards.build_hurricane_layers(feeds)
+    return {
+        "layer": render_fragment(hurricane_layer),
+        "observed_layer": render_fragment(observed_layer),
+        "observed_track_gdf": observed_track_gdf,
+        "prob_gdf": prob_gdf,
+        "track_steps": windfield.track_steps(feeds),
+    }
+
+
+def build_earthquakes(feeds):
+    return {
+        "layer": render_fragment(hazards.build_earthquake_layer(feeds["eq_points"])),
+        "eq_gdf": hazards.earthquake_gdf(feeds["eq_points"]),
+    }
+
+
+def build_shake(feeds):
+    return {
+        "layer": render_fragment(hazards.build_shake_layer(feeds["eq_intensity"])),
+        "shake_gdf": hazards.shake_gdf(feeds["eq_intensity"]),
+    }
+
+
+def build_wildfires(feeds):
+    return {
+        "layer": render_fragment(hazards.build_wildfire_layer(feeds["wildfires"])),
+        "perimeters": hazards.wildfire_gdf(feeds["wildfires"]),
+    }
+
+
+def build_floods(feeds):
+    return {
+        "layer": render_fragment(hazards.build_flood_layer(feeds["floods"])),
+        "flood_gdf": hazards.flood_gdf(feeds["floods"]),
+    }
+
+
+# Hazard stage -> (feeds it is keyed on, builder)
+HAZARD_STAGES = {
+    "storms": (["hurricane_locations"], build_storms),
+    "hurricanes": (HURRICANE_FEEDS, build_hurricanes),
+    "earthquakes": (["eq_points"], build_earthquakes),
+    "shake": (["eq_intensity"], build_shake),
+    "wildfires": (["wildfires"], build_wildfires),
+    "floods": (["floods"], build_floods),
+}
+
+
+def feed_key(name, data):
+    return content_hash(name, data)
+
+
+def hazard_keys(feeds, feed_keys=None):
+    """Stage keys for the hazard stages whose feeds are present.
+
+    ``feed_keys`` reuses hashes already taken at fetch time.
+    """
+    feed_keys = dict(feed_keys or {})
+    for name, data in feeds.items():
+        if name not in feed_keys:
+            feed_keys[name] = feed_key(name, data)
+    return {
+        stage: content_hash(*[feed_keys[name] for name in names])
+        for stage, (names, _) in HAZARD_STAGES.items()
+        if all(name in feed_keys for name in names)
+    }
+
+
+def hazard_stages(store, feeds, keys):
+    """Per-feed hazard layers and GeoDataFrames, rebuilt only when their feed changed."""
+    return {
+        stage: store.cached(stage, keys[stage], lambda: builder(feeds))
+        for stage, (_, builder) in HAZARD_STAGES.items()
+        if stage in keys
+    }
+
+
+# -----------------------
+# EXPOSURE STAGES
+# -----------------------
+
+@instrument.timed("load_exposure")
+def load_exposure(engine, store=None, previous=None, full=False):
+    """Exposure snapshot from Postgres, hashed once so later builds can reuse it as-is.
+
+    The exposure-table query runs on its own pooled connection while the TIV
+    query streams into the location store. With streaming joins enabled
+    (lens.streaming) the locations are spilled under the store instead of
+    held in memory. With delta loads enabled (lens.delta), ``previous`` or the
+    base kept in the store is patched with the changed accounts only, unless
+    ``full`` is set or there is no base yet.
+    """
+    if delta.ENABLED and not full and not streaming.STREAMING:
+        base = previous if previous and previous.get("loaded_at") is not None else None
+        if base is None and store is not None:
+            base = delta.load_base(store)
+        if base is not None:
+            snapshot = delta.delta_snapshot(engine, base)
+            if store is not None:
+                delta.save_base(store, snapshot)
+            return snapshot
+
+    # Taken before the reads, so changes made during them are picked up by the next delta
+    loaded_at = exposure.db_now(engine) if delta.ENABLED else None
+    spill_to = streaming.spill_dir(store) if streaming.STREAMING and store is not None else None
+
+    def read_exposure_table():
+        with instrument.stage("db_exposure_table"):
+            return exposure.read_exposure_table(engine)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="lens-db") as pool:
+        table = pool.submit(read_exposure_table)
+        # The TIV query is encoded chunk by chunk as it is read (stage "ingest")
+        locations = ingest_locations(exposure.read_tiv(engine, chunksize=exposure.TIV_CHUNK_ROWS), spill_to)
+        exposure_df = table.result()
+    snapshot = exposure_snapshot(exposure_df, locations, spill_to)
+    snapshot["loaded_at"] = loaded_at
+    if delta.ENABLED and store is not None:
+        delta.save_base(store, snapshot)
+    return snapshot
+
+
+def load_exposure_async(engine, store=None):
+    """load_exposure() on a background thread; returns its Future."""
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lens-exposure")
+    future = pool.submit(load_exposure, engine, store)
+    pool.shutdown(wait=False)
+    return future
+
+
+def ingest_locations(tiv, spill_dir=None):
+    """LocationStore from the TIV query (one frame or an iterable of chunks), spilled to spill_dir if given."""
+    with instrument.stage("ingest"):
+        if spill_dir:
+            chunks = tiv
+            if isinstance(tiv, pd.DataFrame):
+                chunks = (tiv.iloc[i:i + exposure.TIV_CHUNK_ROWS] for i in range(0, len(tiv), exposure.TIV_CHUNK_ROWS))
+            return streaming.spill_chunks(chunks, spill_dir)
+        if isinstance(tiv, pd.DataFrame):
+            return LocationStore.from_frame(tiv)
+        return LocationStore.from_chunks(tiv)
+
+
+def exposure_snapshot(exposure_df, tiv, spill_dir=None):
+    """Snapshot from the raw exposure table and the TIV query (a frame, chunks or an ingested LocationStore).
+
+    Given a spill_dir, the locations are written there and memory-mapped (see lens.streaming).
+    """
+    locations = tiv if isinstance(tiv, LocationStore) else ingest_locations(tiv, spill_dir)
+    instrument.count("rows_loaded", 0 if exposure_df is None else len(exposure_df), table="exposure")
+    instrument.count("rows_loaded", len(locations), table="tiv")
+    with instrument.stage("hash_exposure"):
+        tiv_key, polygons_key = content_hash(*locations.content_parts()), content_hash(exposure_df)
+    return {
+        "exposure_df": exposure_df,
+        "locations": locations,
+        "tiv_key": tiv_key,
+        "polygons_key": polygons_key,
+        "streaming": bool(spill_dir),
+    }
+
+
+def exposure_stages(store, snapshot, hazard, keys):
+    """Exposure rollups, heatmap and hazard joins, keyed on the exposure data and hazard hashes."""
+    exposure_df, locations = snapshot["exposure_df"], snapshot["locations"]
+    tiv_key, polygons_key = snapshot["tiv_key"], snapshot["polygons_key"]
+
+    @cache
+    def exposure_gdf():
+        return exposure.attach_trapped(exposure.exposure_polygons(exposure_df), locations)
+
+    def build_rollup(id_value):
+        layer = render.add_trapped_polygons(exposure_gdf(), exposure.LAYER_NAMES, id_value)
+        if layer:
+            print(f"✅ Added polygon layer: {exposure.LAYER_NAMES.get(id_value)}")
+        else:
+            print(f"⚠️ No valid polygons for layer: {exposure.LAYER_NAMES.get(id_value)}")
+        return render_fragment(layer)
+
+    rollups = [
+        store.cached(f"rollup_{id_value}", content_hash(polygons_key, tiv_key, id_value), lambda: build_rollup(id_value))
+        for id_value in exposure.LAYER_NAMES
+    ]
+
+    def build_heat():
+        heat_layer, script = render.build_heat_layer(locations)
+        return {"layer": render_fragment(heat_layer), "script": script}
+
+    heat = store.cached("heatmap", content_hash(tiv_key), build_heat)
+
+    hurricanes, earthquakes, shake = hazard["hurricanes"], hazard["earthquakes"], hazard["shake"]
+    # Earthquakes with a ShakeMap grid are sampled from it (lens/shakegrid.py)
+    grid_paths = shakegrid.event_grids(earthquakes["eq_gdf"])
+    # Losses depend on the vulnerability curves in use too
+    curves = vulnerability.curves_key()
+    hazard_join_keys = {
+        "observed": content_hash(keys["hurricanes"], curves),
+        "windfield": content_hash(keys["hurricanes"], curves),
+        "bands": content_hash(keys["hurricanes"], curves, montecarlo.CELL_DEGREES),
+        "earthquake": content_hash(keys["earthquakes"], keys["shake"], curves, shakegrid.grids_key(grid_paths)),
+        "wildfire": content_hash(keys["wildfires"], wildfire.settings_key()),
+        "flood": content_hash(keys["floods"]),
+    }
+    join_keys = {name: content_hash(key, tiv_key) for name, key in hazard_join_keys.items()}
+    # Sharded across a process pool for large portfolios (see lens/parallel.py and lens/locindex.py)
+    backend = parallel.join_backend(snapshot, store)
+
+    @cache
+    def accounts():
+        # Joins sum gross exposure per (account, participant) group; the account terms come after
+        return locations.account_view()
+
+    @cache
+    def points(peril):
+        # Point geometry is only built for the geopandas joins; the sharded joins read the store's arrays
+        return locations if backend is not joins else accounts()[0].for_peril(peril).points_gdf()
+
+    def peril_backend(peril):
+        return backend if backend is joins else backend.for_peril(peril)
+
+    @cache
+    def grids():
+        return shakegrid.load_grids(grid_paths)
+
+    @cache
+    def fire_bands():
+        return wildfire.proximity_bands(hazard["wildfires"]["perimeters"])
+
+    def join(name, backend, points):
+        if name == "observed":
+            return backend.observed_track_exposure(hurricanes["observed_track_gdf"], points)
+        if name == "windfield":
+            return backend.windfield_exposure(hurricanes["track_steps"], points)
+        if name == "wildfire":
+            return backend.wildfire_exposure(fire_bands(), points)
+        if name == "flood":
+            return joins.flood_totals(backend.flood_members(hazard["floods"]["flood_gdf"], points), hazards.FLOOD_SEVERITIES)
+        if name == "bands":
+            return backend.hurricane_band_exposure(
+                montecarlo.wind_bands(hurricanes["prob_gdf"]), points, montecarlo.CELL_DEGREES
+            )
+        return backend.earthquake_exposure(earthquakes["eq_gdf"], shake["shake_gdf"], points, grids())
+
+    def flood_polygons(backend, points):
+        """Locations inside each flood polygon, joining only the polygons not yet joined against this exposure snapshot."""
+        flood_gdf = hazard["floods"]["flood_gdf"]
+        key = content_hash(tiv_key)
+        current = set(flood_gdf["flood_id"])
+        seen = store.get("flood_polygons", key) or {"joined": set(), "members": None}
+        fresh = flood_gdf[~flood_gdf["flood_id"].isin(seen["joined"])]
+        instrument.count("flood_polygons_joined", len(fresh))
+        if seen["members"] is not None and fresh.empty and seen["joined"] == current:
+            return seen["members"]
+
+        frames = [backend.flood_members(fresh, points)]
+        if seen["members"] is not None:
+            frames.append(seen["members"][seen["members"]["flood_id"].isin(current)])
+        frames = [frame for frame in frames if not frame.empty] or frames[:1]
+        members = pd.concat(frames, ignore_index=True)
+        store.put("flood_polygons", key, {"joined": current, "members": members})
+        return members
+
+    change = snapshot.get("delta")
+
+    def build_join(name):
+        # Each join sums the gross exposure under its own peril's deductibles (lens/terms.py)
+        peril = terms.JOIN_PERILS[name]
+        # A delta snapshot patches the base snapshot's join with the changed accounts' rows
+        base = change and store.get(f"join_{name}", content_hash(hazard_join_keys[name], change["base_key"]))
+        if base is None and name == "flood":
+            # A feed refresh only joins the flood polygons that are new or changed
+            return joins.flood_totals(flood_polygons(peril_backend(peril), points(peril)), hazards.FLOOD_SEVERITIES)
+        if base is None:
+            return join(name, peril_backend(peril), points(peril))
+        with instrument.stage(f"patch_join_{name}"):
+            added, removed = (change[side].account_view()[0].for_peril(peril) for side in ("added", "removed"))
+            return delta.patch_join(base, join(name, joins, added.points_gdf()), join(name, joins, removed.points_gdf()))
+
+    def build_exposure(name):
+        gross = store.cached(f"join_{name}", join_keys[name], lambda: build_join(name))
+        return terms.account_exposure(gross, terms.JOIN_KEYS[name], accounts()[1], terms.JOIN_EVENTS.get(name))
+
+    exposures = {name: store.cached(f"terms_{name}", join_keys[name], lambda: build_exposure(name))
+                 for name in terms.JOIN_KEYS}
+    for name, df in exposures.items():
+        instrument.count("rows_joined", len(df), join=name)
+
+    # Loss distribution of the forecast storms, from their wind bands' sums per correlation cell
+    loss_key = content_hash(join_keys["bands"], montecarlo.settings_key())
+    hurricane_loss = store.cached("hurricane_loss", loss_key, lambda: montecarlo.hurricane_loss(
+        store.cached("join_bands", join_keys["bands"], lambda: build_join("bands")), accounts()[1]
+    ))
+    return {"rollups": rollups, "heat": heat, "exposures": exposures, "hurricane_loss": hurricane_loss,
+            "join_keys": {**join_keys, "hurricane_loss": loss_key}}
+
+
+# -----------------------
+# DISASTER PANEL
+# -----------------------
+
+# Spread of the simulated gross loss shown on the Hurricanes rows: column -> label
+LOSS_SPREAD = {
+    "gross_loss_std_usd": "σ",
+    **{col: f"1-in-{1 / ep:g}" for ep, col in zip(montecarlo.EXCEEDANCE, montecarlo.STAT_COLUMNS[4:])},
+}
+
+
+def build_panel(hurricane_location_bounds, eq_gdf, exposures, hurricane_loss, fire_perimeters, flood_gdf):
+    """Panel markup plus the participants offered in the banner.
+
+    Forecast storm exposure and losses are the Monte Carlo means
+    (lens.montecarlo). They are before account terms, so they stay out of the
+    banner totals. The wind-field rows stay out too: they cover the same
+    storms as the observed tracks.
+    """
+    storm_totals = hurricane_loss[hurricane_loss["participant_name"].isna()]
+    hurricane_loss = hurricane_loss[hurricane_loss["participant_name"].notna()]
+    observed_track_exposure = exposures["observed"]
+    windfield_exposure = exposures["windfield"]
+    trapped_per_eq = exposures["earthquake"]
+    wildfire_exposure = exposures["wildfire"]
+    flood_exposure = exposures["flood"]
+    flood_highest = flood_exposure[flood_exposure["scope"] == joins.FLOOD_HIGHEST]
+    flood_exposure = flood_exposure[flood_exposure["scope"] == joins.FLOOD_ALL]
+
+    total_per_observed = joins.hazard_totals(observed_track_exposure, "storm")
+    total_per_windfield = joins.hazard_totals(windfield_exposure, "storm")
+    total_per_eq = joins.hazard_totals(trapped_per_eq, "eq_id")
+
+    # Metadata for zooming
+    hurricane_bounds = {str(k): v for k, v in hurricane_location_bounds.items()}
+
+    eq_gdf = eq_gdf.copy()
+    if 'latitude' not in eq_gdf.columns or 'longitude' not in eq_gdf.columns:
+        eq_gdf['latitude'] = eq_gdf.geometry.y
+        eq_gdf['longitude'] = eq_gdf.geometry.x
+
+    eq_meta = eq_gdf.set_index('eq_id')[['mag','place','latitude','longitude']].to_dict(orient='index') if not eq_gdf.empty else {}
+    eq_meta = {str(k): v for k, v in eq_meta.items()}
+
+    eq_bounds = {str(eq_id): [[meta['latitude'], meta['longitude']]] for eq_id, meta in eq_meta.items()}
+
+    def eq_label(eq_id):
+        meta = eq_meta.get(eq_id, {})
+        return f"M{meta.get('mag',0):.1f} – {meta.get('place','Unknown')}"
+
+    # One row per (incident, proximity band), bands from the perimeter outwards
+    wildfire_exposure = wildfire_exposure.assign(
+        fire=wildfire_exposure["incident"].astype(str) + " · " + wildfire_exposure["band"].astype(str)
+    )
+    band_order = {band: i for i, band in enumerate(wildfire.band_labels())}
+    fire_rows = (
+        wildfire_exposure[["incident", "band", "fire"]].drop_duplicates()
+        .assign(order=lambda df: df["band"].map(band_order))
+        .sort_values(["incident", "order"])
+    )
+
+    # A click on a fire's row zooms to its perimeters
+    fire_extent = fire_perimeters.set_index("incident").bounds
+    fire_bounds = {}
+    for row in fire_rows.itertuples():
+        if row.incident in fire_extent.index:
+            b = fire_extent.loc[row.incident]
+            fire_bounds[row.fire] = [[float(b.miny), float(b.minx)], [float(b.maxy), float(b.maxx)]]
+
+    # Flood severities, most severe first, zooming to all of that severity's polygons
+    total_per_flood = joins.hazard_totals(flood_exposure, "severity")
+    flood_bounds = {}
+    for severity, polygons in flood_gdf.groupby("severity"):
+        minx, miny, maxx, maxy = polygons.total_bounds
+        flood_bounds[severity] = [[float(miny), float(minx)], [float(maxy), float(maxx)]]
+
+    panel_data = panel_payload([
+        {
+            "title": "Hurricanes (Simulated, before Account Terms)",
+            "kind": "hurricane",
+            "color": "#1E90FF",
+            "empty": "No active hurricanes.",
+            "rows": [(storm, storm) for storm in hurricane_location_bounds.keys()],
+            "exposure": joins.participant_exposure(hurricane_loss, "storm"),
+            "ground_up": joins.participant_exposure(hurricane_loss, "storm", "ground_up_loss_usd"),
+            "loss": joins.participant_exposure(hurricane_loss, "storm", "gross_loss_usd"),
+            "stats": {
+                label: {**joins.participant_exposure(hurricane_loss, "storm", col),
+                        None: dict(zip(storm_totals["storm"], storm_totals[col]))}
+                for col, label in LOSS_SPREAD.items()
+            },
+            "banner": False,
+        },
+        {
+            "title": "Observed Hurricane Tracks (Trapped Exposure)",
+            "kind": "hurricane",
+            "color": "#FF6347",
+            "empty": "No trapped exposures in observed hurricane tracks.",
+            "rows": [(storm, storm) for storm in total_per_observed.keys()],
+            "exposure": joins.participant_exposure(observed_track_exposure, "storm"),
+            "ground_up": joins.participant_exposure(observed_track_exposure, "storm", "ground_up_loss_usd"),
+            "loss": joins.participant_exposure(observed_track_exposure, "storm", "gross_loss_usd"),
+        },
+        {
+            "title": "Hurricane Wind Field ≥34 kt (Trapped Exposure)",
+            "kind": "hurricane",
+            "color": "#8A2BE2",
+            "empty": "No trapped exposures within gale-force winds.",
+            "rows": [(storm, storm) for storm in total_per_windfield.keys()],
+            "exposure": joins.participant_exposure(windfield_exposure, "storm"),
+            "ground_up": joins.participant_exposure(windfield_exposure, "storm", "ground_up_loss_usd"),
+            "loss": joins.participant_exposure(windfield_exposure, "storm", "gross_loss_usd"),
+            "banner": False,
+        },
+        {
+            "title": "Earthquakes ≥6 (Trapped Exposure)",
+            "kind": "earthquake",
+            "color": "#ce4823",
+            "empty": "No earthquakes ≥ M6 detected in the last 7 days.",
+            "rows": [(eq_id, eq_label(eq_id)) for eq_id in total_per_eq.keys()],
+            "exposure": joins.participant_exposure(trapped_per_eq, "eq_id"),
+            "ground_up": joins.participant_exposure(trapped_per_eq, "eq_id", "ground_up_loss_usd"),
+            "loss": joins.participant_exposure(trapped_per_eq, "eq_id", "gross_loss_usd"),
+        },
+        {
+            "title": "Wildfires by Proximity (Trapped Exposure)",
+            "kind": "wildfire",
+            "color": "#FF4500",
+            "empty": "No trapped exposures within wildfire proximity bands.",
+            "rows": [(fire, fire) for fire in fire_rows["fire"]],
+            "exposure": joins.participant_exposure(wildfire_exposure, "fire"),
+            "bounds": fire_bounds,
+        },
+        {
+            "title": "Flood Watches & Warnings (Trapped Exposure)",
+            "kind": "flood",
+            "color": "#2171b5",
+            "empty": "No trapped exposures within flood watches or warnings.",
+            "rows": [(severity, severity) for severity in hazards.FLOOD_SEVERITIES if severity in total_per_flood],
+            "exposure": joins.participant_exposure(flood_exposure, "severity"),
+            "bounds": flood_bounds,
+            # A location under several alerts counts once in the banner, at its most severe
+            "banner": joins.participant_exposure(flood_highest, "severity"),
+        },
+    ])
+    return {
+        "html": disaster_panel_html(panel_data, hurricane_bounds, eq_bounds),
+        "participants": panel_data["participants"],
+        "payload": panel_data,
+        "hurricane_bounds": hurricane_bounds,
+        "eq_bounds": eq_bounds,
+    }
+
+
+# -----------------------
+# BUILD
+# -----------------------
+
+def build(store, feeds=None, engine=None, snapshot=None, feed_keys=None):
+    """Run every stage through the store and return the pipeline state.
+
+    ``feeds`` and ``snapshot`` (see load_exposure) let long-running callers pass
+    in data they already hold instead of refetching it. The page record used
+    by render.assemble is also stored as the last page, for replay runs.
+    """
+    # Layer data goes through the fast quantized encoder instead of json.dumps
+    use_fast_encoder(folium.GeoJson._template)
+
+    # The exposure load (database) runs while the feeds are fetched (network) and the
+    # hazard-only layers are built; credentials are asked for before the thread starts
+    pending = None if snapshot else load_exposure_async(engine or exposure.get_engine(), store)
+
+    feeds = fetch_feeds() if feeds is None else feeds
+    with instrument.stage("hash_feeds"):
+        keys = hazard_keys(feeds, feed_keys)
+    hazard = hazard_stages(store, feeds, keys)
+
+    if pending is not None:
+        # Time the joins spent waiting on the database beyond the hazard work
+        with instrument.stage("wait_exposure"):
+            snapshot = pending.result()
+    exp = exposure_stages(store, snapshot, hazard, keys)
+
+    panel_key = content_hash(keys["storms"], keys["earthquakes"], *exp["join_keys"].values())
+    panel = store.cached("panel", panel_key, lambda: build_panel(
+        hazard["storms"]["bounds"], hazard["earthquakes"]["eq_gdf"], exp["exposures"], exp["hurricane_loss"],
+        hazard["wildfires"]["perimeters"], hazard["floods"]["flood_gdf"],
+    ))
+
+    # Layers in page order, keyed by the stage that built them
+    layers = {
+        "storms": hazard["storms"]["layer"],
+        "hurricanes": hazard["hurricanes"]["layer"],
+        "observed": hazard["hurricanes"]["observed_layer"],
+        "wildfires": hazard["wildfires"]["layer"],
+        "floods": hazard["floods"]["layer"],
+        **{f"rollup_{id_value}": rollup for id_value, rollup in zip(exposure.LAYER_NAMES, exp["rollups"])},
+        "heatmap": exp["heat"]["layer"],
+        "earthquakes": hazard["earthquakes"]["layer"],
+        "shake": hazard["shake"]["layer"],
+    }
+    for name, fragment in layers.items():
+        if fragment:
+            instrument.count("bytes_serialized", fragment_bytes(fragment), layer=name)
+    instrument.count("bytes_serialized", len(panel["html"].encode("utf-8")), layer="panel")
+    layers = list(layers.values())
+    page = {
+        "layers": layers,
+        "heat_script": exp["heat"]["script"],
+        "panel_html": panel["html"],
+        "participants": panel["participants"],
+        # Rebuilt fragments get fresh element names, so this changes exactly when a layer did
+        "version": {
+            "layers": content_hash(*[fragment["name"] if fragment else None for fragment in layers]),
+            "panel": panel_key,
+        },
+    }
+    store.put(*render.LAST_PAGE, page)
+    return {"feeds": feeds, "hazard": hazard, "exposure": exp, "panel": panel, "page": page}
+
+
+def fragment_bytes(fragment):
+    return sum(len(markup.encode("utf-8")) for part in render.FRAGMENT_PARTS for markup in fragment[part].values())
+
+
+def run(store=None, path=OUTPUT_HTML, report_path=instrument.REPORT_NAME, prometheus_path=None):
+    """Build and publish the map, then write the run report (and optional Prometheus textfile)."""
+    store = store or ArtifactStore()
+    instrument.start_run()
+    output.publish(NATIVE_ZOOM_HTML, render.new_map().get_root().render())
+
+    state = build(store)
+    with instrument.stage("render_page"):
+        m = render.assemble(state["page"])
+        html = m.get_root().render()
+    output.publish(path, html)
+    print(f"✅ Map saved as {path}")
+    print(f"✅ {len(store.built)} stage(s) rebuilt, {len(store.reused)} reused from {store.root}")
+    instrument.finish_run(report_path, prometheus_path)
+    return m
+
+
+def run_stage(name, store=None):
+    """Run one stage on its own: a hazard stage (fetching only its feeds), "feeds" or "exposure"."""
+    store = store or ArtifactStore()
+    if name == "feeds":
+        for feed, data in fetch_feeds().items():
+            print(f"✅ {feed}: {len(data.get('features', [])):,} features")
+        return
+    if name == "exposure":
+        snapshot = load_exposure(exposure.get_engine(), store)
+        print(f"✅ {len(snapshot['locations']):,} exposure locations (key {snapshot['tiv_key']})")
+        # Large portfolios get their location index built now, so the next run only maps it
+        parallel.join_backend(snapshot, store)
+        return snapshot
+    names, _ = HAZARD_STAGES[name]
+    use_fast_encoder(folium.GeoJson._template)
+    feeds = fetch_feeds(names)
+    value = hazard_stages(store, feeds, hazard_keys(feeds))[name]
+    print(f"✅ Stage {name}: {'rebuilt' if store.built else 'unchanged, reused'} in {store.root}")
+    return value
@@ -0,0 +1,503 @@
+"""Map assembly: base map, exposure rollup and heat layers, layer fragments and page furniture."""
+
+import folium
+import numpy as np
+from branca.colormap import StepColormap
+from branca.element import Element
+from folium import FeatureGroup, GeoJson, Tooltip, plugins
+from folium.map import Layer
+from folium.plugins import HeatMap
+
+from lens.heatgrid import build_heat_grid, heat_grid_points, heat_grid_script
+from lens.serialize import dumps
+
+# Fixed map id so cached layer fragments always reference the same map variable
+MAP_ID = "lens"
+
+# (stage, key) of the page record written by every build, for replay runs
+LAST_PAGE = ("page", "latest")
+
+
+# -----------------------
+# MAP INIT
+# -----------------------
+
+def new_map():
+    m = folium.Map(
+        location=[20, 0],
+        zoom_start=3,
+        min_zoom=3,
+        max_zoom=9,
+        max_bounds=True
+    )
+    m._id = MAP_ID
+    return m
+
+
+def add_basemaps(m):
+    basemaps = {
+        "OpenStreetMap": folium.TileLayer(
+            "OpenStreetMap",
+            name="OpenStreetMap",
+            control=True,
+            no_wrap=True,
+            attr="© OpenStreetMap contributors",
+            overlay=False
+        ),
+        "Dark": folium.TileLayer(
+            "CartoDB dark_matter",
+            name="Dark",
+            control=True,
+            no_wrap=True,
+            attr="© OpenStreetMap contributors © CartoDB",
+            overlay=False
+        ),
+        "Light": folium.TileLayer(
+            "CartoDB positron",
+            name="Light",
+            control=True,
+            no_wrap=True,
+            attr="© OpenStreetMap contributors © CartoDB",
+            overlay=False
+        ),
+        "Satellite": folium.TileLayer(
+            tiles="https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
+            attr="© ESRI & OpenStreetMap contributors",
+            name="Satellite",
+            control=True,
+            no_wrap=True,
+            overlay=False
+        )
+    }
+    for b in basemaps.values():
+        b.add_to(m)
+
+
+# -----------------------
+# TRAPPED EXPOSURE POLYGONS
+# -----------------------
+
+def add_trapped_polygons(exposure_gdf, layer_names, id_value, n_breaks=5):
+    layer_name = layer_names.get(id_value, f"Geography {id_value}")
+    sub = exposure_gdf[exposure_gdf["ExposureGeographyId"] == id_value].copy()
+    if sub.empty or sub.geometry.notnull().sum() == 0:
+        return None
+
+    layer = FeatureGroup(name=layer_name, show=True if id_value == '1' else False)
+
+    values = sub['trapped_exposure_usd']
+    if values.max() > 0:
+        quantiles = np.unique(np.quantile(values, np.linspace(0, 1, n_breaks + 1)))
+        num_bins = len(quantiles) - 1
+        base_colors = ["#deebf7", "#9ecae1", "#6baed6", "#3182bd", "#08519c"]
+        if num_bins <= len(base_colors):
+            colors = base_colors[:num_bins]
+        else:
+            # matplotlib is only needed for this fallback palette
+            import matplotlib.cm as cm
+            import matplotlib.colors as mcolors
+            colors = [mcolors.rgb2hex(cm.Blues(i)) for i in range(num_bins)]
+        colormap = StepColormap(colors=colors, index=quantiles, vmin=values.min(), vmax=values.max())
+    else:
+        colormap = None
+
+    # ---- LOOP OVER POLYGONS ----
+    for idx, row in sub.iterrows():
+        geom = row['Geometry']
+        if geom is None or geom.is_empty:
+            continue
+
+        fill_color = colormap(row['trapped_exposure_usd']) if colormap else "#3182bd"
+
+        gj = GeoJson(
+            geom.__geo_interface__,
+            style_function=lambda x, col=fill_color: {
+                "fillColor": col,
+                "color": "black",
+                "weight": 1,
+                "fillOpacity": 0.8
+            },
+            tooltip=Tooltip(
+                f"{row.get('Name','')}<br>Trapped Exposure: ${row['trapped_exposure_usd']:,.0f}",
+                sticky=False
+            )
+        )
+
+        # Attach participant_names for JS filtering
+        participant_str = row.get('participant_name', '')
+        gj.add_child(folium.Element(
+            f"<div style='display:none;' data-participants='{participant_str}'></div>"
+        ))
+
+        gj.add_to(layer)
+
+    return layer
+
+
+# -----------------------
+# HEATMAP (TRAPPED EXPOSURE)
+# One binned grid per zoom band, with a per-participant breakdown per cell,
+# feeds the heat layer for every participant view (see lens/heatgrid.py).
+# -----------------------
+
+def build_heat_layer(locations):
+    """Heat layer plus its grid script, or (None, None) when there is nothing to draw."""
+    if locations.empty:
+        print("⚠️ No trapped exposure points available")
+        return None, None
+    valid = np.flatnonzero(locations.finite("trapped_exposure_usd"))
+    if not len(valid):
+        print("⚠️ No valid trapped exposure points for heatmap")
+        return None, None
+
+    heat_layer = FeatureGroup(name="Exposure Heatmap (Trapped Exposure)", show=False)
+    heat_grid = build_heat_grid(
+        locations.lat[valid],
+        locations.lon[valid],
+        locations.values["trapped_exposure_usd"][valid],
+        locations.codes["participant_name"][valid]
+    )
+    heat_map = HeatMap(data=heat_grid_points(heat_grid[0]), radius=10, blur=15, min_opacity=0.3, max_opacity=0.8)
+    heat_map.add_to(heat_layer)
+    script = heat_grid_script(heat_grid, locations.categories["participant_name"], heat_map.get_name())
+    n_cells = sum(len(band['lat']) for band in heat_grid)
+    print(f"✅ Heatmap added (weighted by trapped exposure, {len(valid):,} points binned into {n_cells:,} cells)")
+    return heat_layer, script
+
+
+# -----------------------
+# LEGEND, BANNER AND CONTROLS
+# -----------------------
+
+LEGEND_HTML = """
+<div id="legend" style="position: fixed; bottom: 30px; left: 30px; width: 380px; max-height: 400px; overflow-y: auto; background-color: white; border:2px solid grey; z-index:9999; font-size:14px; border-radius: 8px; padding:10px; box-shadow:2px 2px 6px rgba(0,0,0,0.3);">
+  <div onclick="toggleLegend()" style="background:#f2f2f2;cursor:pointer;padding:5px;font-weight:bold;">
+    Legend + Quick Zoom (click to expand/collapse)
+  </div>
+  <div id="legend-content" style="display:none; padding:5px;">
+
+     <b>Hurricanes</b><br>
+    <i style="background:#87CEFA50;width:15px;height:15px;float:left;margin-right:5px;border:1px solid #003366;"></i> Forecast Cone<br>
+    <i style="background:#000000;width:15px;height:2px;float:left;margin-right:5px;"></i> Forecast / Historic Track<br><br>
+
+    <b>Hurricane Force Probability</b><br>
+    <div style="position: relative; width: 150px; height: 15px; background: linear-gradient(to right, 
+    #7CFC0070 0%, 
+    #FFFF0070 20%, 
+    #FFA50070 40%, 
+    #FF000070 60%, 
+    #80008070 80%, 
+    #80008070 100%); border:1px solid #000; margin:5px 0;"></div>
+    <div style="display: flex; justify-content: space-between; font-size: 12px; width: 150px; margin-top: 2px;">
+    <span>0%</span>
+    <span>100%</span>
+    </div>
+    <br>
+
+    <b>Earthquakes (last 7 days)</b><br>
+    <i style="background:#ce4823;width:15px;height:15px;float:left;margin-right:5px;"></i> M6.0–7.0<br>
+    <i style="background:#ff3333;width:15px;height:15px;float:left;margin-right:5px;"></i> M≥7.0<br>
+    <b>Shake Intensity</b><br>
+    <i style="background:#ADD8FF;width:15px;height:15px;float:left;margin-right:5px;"></i> 4<br>
+    <i style="background:#00FF00;width:15px;height:15px;float:left;margin-right:5px;"></i> 5<br>
+    <i style="background:#FFFF00;width:15px;height:15px;float:left;margin-right:5px;"></i> 6<br>
+    <i style="background:#FFA500;width:15px;height:15px;float:left;margin-right:5px;"></i> 7<br>
+    <i style="background:#FF8C00;width:15px;height:15px;float:left;margin-right:5px;"></i> 8<br>
+    <i style="background:#FF6666;width:15px;height:15px;float:left;margin-right:5px;"></i> 9<br>
+    <i style="background:#8B0000;width:15px;height:15px;float:left;margin-right:5px;"></i> 10<br><br>
+
+
+    <b>Wildfires</b><br>
+    <i style="background:red;width:15px;height:15px;float:left;margin-right:5px;"></i> Wildfire Daily Fire Perimeter<br>
+    <i style="background:orange;width:15px;height:15px;float:left;margin-right:5px;"></i> Other Fire<br><br>
+
+    <b>Flood Events</b><br>
+    <i style="background:#08306b;width:15px;height:15px;float:left;margin-right:5px;"></i> Flash Flood Warning<br>
+    <i style="background:#2171b5;width:15px;height:15px;float:left;margin-right:5px;"></i> Flood Warning<br>
+    <i style="background:#6baed6;width:15px;height:15px;float:left;margin-right:5px;"></i> Flood Watch<br>
+    <i style="background:#c6dbef;width:15px;height:15px;float:left;margin-right:5px;"></i> Other Flood Events<br><br>
+
+    <b>Quick Zoom</b><br>
+    <div style="margin-top:5px;">
+        <div onclick="zoomTo('usa')" style="display:inline-block; padding:3px 6px; margin:2px; background:#007bff; color:white; border-radius:4px; cursor:pointer;">USA</div>
+        <div onclick="zoomTo('europe')" style="display:inline-block; padding:3px 6px; margin:2px; background:#007bff; color:white; border-radius:4px; cursor:pointer;">Europe</div>
+        <div onclick="zoomTo('japan')" style="display:inline-block; padding:3px 6px; margin:2px; background:#007bff; color:white; border-radius:4px; cursor:pointer;">Japan</div>
+        <div onclick="zoomTo('world')" style="display:inline-block; padding:3px 6px; margin:2px; background:#007bff; color:white; border-radius:4px; cursor:pointer;">World</div>
+    </div>
+
+  </div>
+</div>
+
+<script>
+function toggleLegend() {
+  var x = document.getElementById("legend-content");
+  x.style.display = (x.style.display === "none") ? "block" : "none";
+}
+
+function getMap() {
+    if (window._leaflet_map) return window._leaflet_map;
+    for (var key in window) {
+        if (window[key] instanceof L.Map) {
+            window._leaflet_map = window[key];
+            return window._leaflet_map;
+        }
+    }
+    return null;
+}
+
+function zoomTo(region) {
+    var map = getMap();
+    if (!map) return;
+    if (region === 'usa') { map.setView([37.8, -96], 4); }
+    else if (region === 'europe') { map.setView([54, 15], 4); }
+    else if (region === 'japan') { map.setView([36, 138], 5); }
+    else if (region === 'world') { map.setView([20, 0], 2); }
+}
+
+// Pre-cache map reference after Leaflet initializes
+setTimeout(getMap, 1000);
+</script>
+"""
+
+BANNER_HTML = """
+<div id="top-banner" style="position: fixed; top: 0; left: 0; width: 100%; backdrop-filter: blur(8px);
+     background: rgba(0,0,0,0.6); color: white; z-index: 10001; display: flex; align-items: center; padding: 5px 20px; 
+     font-family: Arial, sans-serif; height: 60px; gap: 20px; box-sizing: border-box; box-shadow: 0 2px 8px rgba(0,0,0,0.4);">
+    <div style="display:flex; flex-direction:column; justify-content:center;">
+        <span style="font-size: 32px; font-weight: bold;">LENS</span>
+        <span style="font-size: 12px;">Loss Exposure & Natural-hazard Scanner</span>
+    </div>
+    <div style="margin-left: 30px;">
+        <label for="participantSelect" style="font-size: 13px; margin-right: 6px;">Participant:</label>
+        <select id="participantSelect" style="padding:5px 8px; font-size:13px; border-radius:6px; border:none; outline:none; cursor:pointer;"
+                onchange="updateParticipantView()">
+            <option value="" selected>All Participants</option>
+            __PARTICIPANT_OPTIONS__
+        </select>
+    </div>
+    <div style="margin-left: auto; font-size:13px; white-space: nowrap;">
+        <b>Total Trapped Exposure (USD):</b> 
+        <span id="total-trapped" style="color:#00FF7F; font-weight:bold;">0</span>
+        <b style="margin-left: 16px;">Est. Gross Loss (USD):</b>
+        <span id="total-loss" style="color:#FFD700; font-weight:bold;">0</span>
+    </div>
+</div>
+"""
+
+
+def banner_html(participants):
+    options = "".join([f'<option value="{p}">{p}</option>' for p in participants])
+    return BANNER_HTML.replace("__PARTICIPANT_OPTIONS__", options)
+
+
+# Adjust Leaflet controls so top banner doesn't overlap
+CONTROLS_CSS = """
+<style>
+/* Move zoom control and layers control down to avoid overlap with top banner */
+.leaflet-top.leaflet-left {
+    top: 80px !important; /* banner height (60px) + spacing */
+    left: 10px !important;
+}
+.leaflet-top.leaflet-right {
+    top: 80px !important;
+    right: 10px !important;
+}
+#top-banner {
+    z-index: 10000 !important;
+    position: fixed !important;
+}
+</style>
+"""
+
+
+def draw_control():
+    return plugins.Draw(
+        export=True,
+        filename='drawn_shapes.geojson',
+        draw_options={
+            'polyline': False,
+            'rectangle': True,
+            'circle': True,
+            'polygon': True,
+            'marker': False,
+            'circlemarker': False
+        },
+        edit_options={
+            'edit': True,
+            'remove': True
+        }
+    )
+
+
+# -----------------------
+# LIVE REFRESH (SERVE MODE)
+# Polls the local server instead of ArcGIS: new exposure figures are swapped
+# into the panel in place, changed hazard layers reload the page at the same view.
+# -----------------------
+
+LIVE_REFRESH_HTML = """
+<script>
+(function() {
+  var version = __VERSION_JSON__;
+  var POLL_MS = __POLL_MS__;
+  var VIEW_KEY = 'lens-view';
+
+  function restoreView() {
+    var saved = sessionStorage.getItem(VIEW_KEY);
+    if (!saved) return;
+    sessionStorage.removeItem(VIEW_KEY);
+    saved = JSON.parse(saved);
+    var map = getMap();
+    if (map) map.setView(saved.center, saved.zoom);
+    var select = document.getElementById('participantSelect');
+    if (select && saved.participant) {
+      select.value = saved.participant;
+      updateParticipantView();
+    }
+  }
+
+  function reloadAtView() {
+    var map = getMap(), select = document.getElementById('participantSelect');
+    if (map) {
+      sessionStorage.setItem(VIEW_KEY, JSON.stringify({
+        center: map.getCenter(), zoom: map.getZoom(), participant: select ? select.value : ''
+      }));
+    }
+    window.location.reload();
+  }
+
+  function poll() {
+    fetch('/api/state', {cache: 'no-cache'})
+      .then(function(response) { return response.json(); })
+      .then(function(state) {
+        if (state.layers !== version.layers) return reloadAtView();
+        if (state.panel === version.panel) return;
+        return fetch('/api/exposure')
+          .then(function(response) { return response.json(); })
+          .then(function(exposure) {
+            setPanelData(exposure.panel, exposure.hurricane_bounds, exposure.eq_bounds);
+            version = state;
+          });
+      })
+      .catch(function(err) { console.warn('LENS refresh failed', err); });
+  }
+
+  setTimeout(restoreView, 1000);
+  setInterval(poll, POLL_MS);
+})();
+</script>
+"""
+
+
+def live_refresh_html(version, poll_seconds=60):
+    return (
+        LIVE_REFRESH_HTML
+        .replace("__VERSION_JSON__", dumps(version))
+        .replace("__POLL_MS__", str(int(poll_seconds * 1000)))
+    )
+
+
+# -----------------------
+# LAYER FRAGMENTS
+# -----------------------
+
+FRAGMENT_PARTS = ("header", "html", "script")
+
+
+def render_fragment(layer):
+    """Pre-render a layer into the header/html/script markup it contributes to the page.
+
+    The layer is rendered under a stub map with the same id as the real map,
+    so its add-to-map script is valid when the fragment is injected later.
+    """
+    if layer is None:
+        return None
+    stub = folium.Map(tiles=None)
+    stub._id = MAP_ID
+    layer.add_to(stub)
+    figure = stub.get_root()
+    before = {part: set(getattr(figure, part)._children) for part in FRAGMENT_PARTS}
+    layer.render()
+    fragment = {
+        part: {
+            name: child.render()
+            for name, child in getattr(figure, part)._children.items()
+            if name not in before[part]
+        }
+        for part in FRAGMENT_PARTS
+    }
+    fragment.update(
+        name=layer.get_name(),
+        layer_name=layer.layer_name,
+        overlay=layer.overlay,
+        control=layer.control,
+        show=layer.show,
+    )
+    return fragment
+
+
+class RawElement(Element):
+    """Markup emitted as-is, without another Jinja pass."""
+
+    def __init__(self, text):
+        super().__init__()
+        self.text = text
+
+    def render(self, **kwargs):
+        return self.text
+
+
+class CachedLayer(Layer):
+    """A layer restored from a fragment; still listed by LayerControl under its original name."""
+
+    def __init__(self, fragment):
+        super().__init__(
+            name=fragment["layer_name"],
+            overlay=fragment["overlay"],
+            control=fragment["control"],
+            show=fragment["show"],
+        )
+        self.fragment = fragment
+
+    def get_name(self):
+        return self.fragment["name"]
+
+    def render(self, **kwargs):
+        figure = self.get_root()
+        for part in FRAGMENT_PARTS:
+            for name, text in self.fragment[part].items():
+                getattr(figure, part).add_child(RawElement(text), name=name)
+
+
+# -----------------------
+# PAGE ASSEMBLY
+# -----------------------
+
+def assemble(page, live_poll=None):
+    """Build the map from a page record (layer fragments, heat script, panel, version).
+
+    With ``live_poll`` (seconds) the page polls the local server for fresh
+    figures instead of being a static snapshot (see lens/server.py).
+    """
+    m = new_map()
+    add_basemaps(m)
+
+    for fragment in page["layers"]:
+        if fragment:
+            CachedLayer(fragment).add_to(m)
+    folium.LayerControl(collapsed=True).add_to(m)
+
+    html_parts = [
+        page["heat_script"],
+        LEGEND_HTML,
+        page["panel_html"],
+        banner_html(page["participants"]),
+        CONTROLS_CSS,
+    ]
+    if live_poll:
+        html_parts.append(live_refresh_html(page["version"], live_poll))
+    for html in html_parts:
+        if html:
+            m.get_root().html.add_child(folium.Element(html))
+    draw_control().add_to(m)
+    return m
@@ -0,0 +1,212 @@
+"""Quantized map payload serialization built straight from numpy coordinate arrays."""
+
+import json
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+try:
+    import orjson
+except ImportError:  # the stdlib encoder is used when orjson is not installed
+    orjson = None
+
+# Highest zoom the map allows (see folium.Map(max_zoom=...))
+MAP_MAX_ZOOM = 9
+
+# "geojson" embeds rounded GeoJSON; "topojson" embeds quantized, delta-encoded arcs
+MAP_ENCODING = "geojson"
+
+
+def precision_for_zoom(max_zoom=MAP_MAX_ZOOM):
+    """Decimal places that keep coordinates below a tenth of a pixel at max_zoom."""
+    pixel_deg = 360.0 / (256 * 2 ** max_zoom)
+    return int(np.ceil(-np.log10(pixel_deg / 10)))
+
+
+COORD_PRECISION = precision_for_zoom()
+
+
+# -----------------------
+# JSON ENCODING
+# -----------------------
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj, sort_keys=False):
+    """Compact JSON text, using orjson (with native numpy support) when available."""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option).decode()
+    return json.dumps(obj, default=_default, separators=(",", ":"), sort_keys=sort_keys)
+
+
+def use_fast_encoder(template):
+    """Route the Jinja ``tojson`` filter of a folium template environment through ``dumps``.
+
+    All folium templates share one environment, so this covers every layer's
+    embedded data.
+    """
+    template.environment.policies["json.dumps_function"] = lambda obj, **kwargs: dumps(
+        obj, sort_keys=kwargs.get("sort_keys", False)
+    )
+
+
+# -----------------------
+# GEOMETRY -> COORDINATES
+# -----------------------
+
+def latlngs(geom, precision=COORD_PRECISION):
+    """[[lat, lon], ...] for a LineString or ring, as expected by folium.PolyLine/Polygon."""
+    coords = shapely.get_coordinates(geom)
+    return np.round(coords[:, ::-1], precision).tolist()
+
+
+def _split(values, offsets):
+    return [values[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+# shapely type id -> family exported together by shapely.to_ragged_array
+_FAMILIES = {0: "point", 4: "point", 1: "line", 5: "line", 2: "polygon", 3: "polygon", 6: "polygon"}
+
+
+def _ragged_parts(geoms):
+    """Yield (positions, type name, coords, offsets) for each geometry family in geoms."""
+    family = np.array([_FAMILIES.get(t, "") for t in shapely.get_type_id(geoms)], dtype=object)
+    for fam in dict.fromkeys(family):
+        idx = np.flatnonzero(family == fam)
+        if not fam:
+            raise ValueError("GeometryCollections cannot be serialized")
+        geom_type, coords, offsets = shapely.to_ragged_array(geoms[idx])
+        yield idx, shapely.GeometryType(geom_type).name, coords, offsets
+
+
+def _nest(values, name, offsets):
+    """Regroup a flat per-coordinate list into per-geometry nested coordinate lists."""
+    if name == "POINT":
+        return values
+    parts = _split(values, offsets[0])
+    for level in offsets[1:]:
+        parts = _split(parts, level)
+    return parts
+
+
+_GEOJSON_TYPES = {
+    "POINT": "Point", "MULTIPOINT": "MultiPoint",
+    "LINESTRING": "LineString", "MULTILINESTRING": "MultiLineString",
+    "POLYGON": "Polygon", "MULTIPOLYGON": "MultiPolygon",
+}
+
+
+def geometry_dicts(geoms, precision=COORD_PRECISION):
+    """Quantized GeoJSON geometries; coordinates never pass through per-point Python code."""
+    geoms = np.asarray(geoms, dtype=object)
+    out = [None] * len(geoms)
+    if len(geoms) == 0:
+        return out
+    for idx, name, coords, offsets in _ragged_parts(geoms):
+        nested = _nest(np.round(coords, precision).tolist(), name, offsets)
+        for i, coordinates in zip(idx, nested):
+            out[i] = {"type": _GEOJSON_TYPES[name], "coordinates": coordinates}
+    return out
+
+
+def feature_collection(geoms, properties=None, precision=COORD_PRECISION):
+    """Build a quantized FeatureCollection dict from geometries and matching property dicts."""
+    properties = properties if properties is not None else [{}] * len(geoms)
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "properties": props, "geometry": geom}
+            for geom, props in zip(geometry_dicts(geoms, precision), properties)
+        ],
+    }
+
+
+def _feature_geometries(data):
+    features, geoms = [], []
+    for f in data.get("features", []):
+        if not f.get("geometry"):
+            continue
+        try:
+            geom = shape(f["geometry"])
+        except Exception:
+            continue
+        if not geom.is_empty:
+            features.append(f)
+            geoms.append(geom)
+    return features, geoms
+
+
+def quantize_geojson(data, precision=COORD_PRECISION):
+    """Re-emit a GeoJSON FeatureCollection (e.g. an ArcGIS response) with quantized coordinates."""
+    features, geoms = _feature_geometries(data)
+    return feature_collection(geoms, [f.get("properties", {}) for f in features], precision)
+
+
+# -----------------------
+# TOPOJSON (QUANTIZED + DELTA-ENCODED ARCS)
+# -----------------------
+
+def topology(geoms, properties=None, quantization=1e5, object_name="data"):
+    """Encode geometries as a TopoJSON Topology with quantized, delta-encoded arcs.
+
+    Every ring/line becomes its own arc (no arc sharing), which keeps encoding
+    to a handful of numpy operations per geometry family.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    properties = properties if properties is not None else [{}] * len(geoms)
+    coords = shapely.get_coordinates(geoms) if len(geoms) else np.zeros((1, 2))
+    lo = coords.min(axis=0)
+    scale = (coords.max(axis=0) - lo) / (quantization - 1)
+    scale[scale == 0] = 1.0
+
+    arcs = []
+    objects = [None] * len(geoms)
+    for idx, name, coords, offsets in (_ragged_parts(geoms) if len(geoms) else []):
+        q = np.round((coords - lo) / scale).astype(np.int64)
+        if name == "POINT":
+            for i, pt in zip(idx, q.tolist()):
+                objects[i] = {"type": "Point", "coordinates": pt}
+            continue
+        if name == "MULTIPOINT":
+            for i, pts in zip(idx, _split(q.tolist(), offsets[0])):
+                objects[i] = {"type": "MultiPoint", "coordinates": pts}
+            continue
+
+        # Delta-encode every line/ring against its previous position, keeping ring starts absolute
+        ring_offsets = offsets[0]
+        delta = q.copy()
+        delta[1:] -= q[:-1]
+        delta[ring_offsets[:-1]] = q[ring_offsets[:-1]]
+        first = len(arcs)
+        arcs.extend(_split(delta.tolist(), ring_offsets))
+
+        nested = [[a] for a in range(first, len(arcs))]
+        for level in offsets[1:]:
+            nested = _split(nested, level)
+        for i, geom_arcs in zip(idx, nested):
+            objects[i] = {"type": _GEOJSON_TYPES[name], "arcs": geom_arcs}
+
+    for obj, props in zip(objects, properties):
+        obj["properties"] = props
+    return {
+        "type": "Topology",
+        "transform": {"scale": scale.tolist(), "translate": lo.tolist()},
+        "objects": {object_name: {"type": "GeometryCollection", "geometries": objects}},
+        "arcs": arcs,
+    }
+
+
+def quantize_topojson(data, quantization=1e5, object_name="data"):
+    """TopoJSON counterpart of quantize_geojson for a GeoJSON FeatureCollection."""
+    features, geoms = _feature_geometries(data)
+    return topology(geoms, [f.get("properties", {}) for f in features], quantization, object_name)
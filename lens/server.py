@@ -0,0 +1,218 @@
+"""Serve mode: one shared pipeline refresh per interval behind a small asyncio HTTP app.
+
+Browsers poll this server rather than ArcGIS, so any number of open maps
+costs one upstream fetch per interval. The exposure snapshot is kept warm
+between refreshes, as in daemon mode: it is reloaded on its own interval,
+and with delta loads enabled (lens.delta) patched with the changed accounts
+in between. Endpoints:
+
+    /                       the map (polls /api/state and updates itself)
+    /api/state              current layer/panel versions and refresh time
+    /api/layers             names of the hazard layers
+    /api/layers/<name>      quantized GeoJSON for one hazard feed
+    /api/exposure           pre-joined exposure totals and simulated loss spread (panel payload and zoom bounds)
+    /api/report             run report of the last refresh (see lens/instrument.py)
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import time
+from email.utils import formatdate
+
+from lens import delta, exposure, instrument, pipeline, render
+from lens.artifacts import ArtifactStore
+from lens.serialize import dumps, quantize_geojson
+
+REFRESH_SECONDS = 300
+POLL_SECONDS = 60
+
+# Seconds between full exposure reloads, and between delta loads when enabled
+EXPOSURE_SECONDS = 24 * 3600
+DELTA_SECONDS = 15 * 60
+
+_REASONS = {200: "OK", 304: "Not Modified", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+class Response:
+    """A prepared response body with its ETag and a gzip variant."""
+
+    def __init__(self, body, content_type):
+        self.body = body if isinstance(body, bytes) else body.encode("utf-8")
+        self.content_type = content_type
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=12).hexdigest() + '"'
+        self.gzipped = gzip.compress(self.body, compresslevel=6, mtime=0)
+
+
+def json_response(obj):
+    return Response(dumps(obj), "application/json")
+
+
+def state_responses(state, poll_seconds=POLL_SECONDS):
+    """Every endpoint's response, prepared once per refresh."""
+    page = render.assemble(state["page"], live_poll=poll_seconds).get_root().render()
+    panel = state["panel"]
+    responses = {
+        "/": Response(page, "text/html; charset=utf-8"),
+        "/api/state": json_response({**state["page"]["version"], "refreshed": time.time()}),
+        "/api/layers": json_response(sorted(state["feeds"])),
+        "/api/exposure": json_response({
+            "panel": panel["payload"],
+            "hurricane_bounds": panel["hurricane_bounds"],
+            "eq_bounds": panel["eq_bounds"],
+        }),
+    }
+    for name, data in state["feeds"].items():
+        responses[f"/api/layers/{name}"] = Response(dumps(quantize_geojson(data)), "application/geo+json")
+    return responses
+
+
+class LensServer:
+    def __init__(self, host="127.0.0.1", port=8000, refresh_seconds=REFRESH_SECONDS,
+                 poll_seconds=POLL_SECONDS, store=None, engine=None,
+                 exposure_seconds=EXPOSURE_SECONDS, delta_seconds=None):
+        self.host = host
+        self.port = port
+        self.refresh_seconds = refresh_seconds
+        self.poll_seconds = poll_seconds
+        self.store = store or ArtifactStore()
+        self.engine = engine
+        self.exposure_seconds = exposure_seconds
+        # Seconds between delta loads; None reloads the full tables only
+        self.delta_seconds = delta_seconds or (DELTA_SECONDS if delta.ENABLED else None)
+        self.snapshot = None
+        self.exposure_due = 0.0
+        self.delta_due = 0.0
+        self.responses = {}
+
+    def refresh_exposure(self, now):
+        """Reload the exposure snapshot when its interval is up, or patch it with a delta load when that one is.
+
+        A failed reload keeps the previous snapshot.
+        """
+        full = self.snapshot is None or now >= self.exposure_due
+        if not full and not (self.delta_seconds and now >= self.delta_due):
+            return
+        try:
+            snapshot = pipeline.load_exposure(self.engine, self.store, previous=self.snapshot, full=full)
+        except Exception as e:
+            if self.snapshot is None:
+                raise
+            print(f"❌ Exposure reload failed, keeping the previous snapshot: {e}")
+            return
+        self.snapshot = snapshot
+        if full:
+            self.exposure_due = now + self.exposure_seconds
+        if self.delta_seconds:
+            self.delta_due = now + self.delta_seconds
+
+    def _build(self):
+        report = instrument.start_run()
+        self.refresh_exposure(time.monotonic())
+        state = pipeline.build(self.store, snapshot=self.snapshot)
+        with instrument.stage("render_page"):
+            responses = state_responses(state, self.poll_seconds)
+        responses["/api/report"] = json_response(report.as_dict())
+        return responses
+
+    async def refresh(self):
+        """Run the pipeline off the event loop, then swap in the new responses at once."""
+        started = time.perf_counter()
+        try:
+            self.responses = await asyncio.to_thread(self._build)
+        except Exception as e:
+            print(f"❌ Refresh failed, still serving the previous state: {e}")
+            return
+        print(f"✅ State refreshed in {time.perf_counter() - started:.1f}s")
+
+    async def refresh_forever(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                return
+            method, path = parts[0], parts[1].split("?", 1)[0]
+            writer.write(self.respond(method, path, headers))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def respond(self, method, path, headers):
+        if method not in ("GET", "HEAD"):
+            return _raw(405, b"", "text/plain")
+        if not self.responses:
+            return _raw(503, b"LENS is still building its first state", "text/plain", {"Retry-After": "5"})
+        response = self.responses.get(path.rstrip("/") or "/")
+        if response is None:
+            return _raw(404, b"", "text/plain")
+        extra = {"ETag": response.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if headers.get("if-none-match") == response.etag:
+            return _raw(304, b"", response.content_type, extra, send_body=False)
+        body = response.body
+        if "gzip" in headers.get("accept-encoding", ""):
+            body = response.gzipped
+            extra["Content-Encoding"] = "gzip"
+        return _raw(200, body, response.content_type, extra, send_body=method == "GET")
+
+    async def serve(self):
+        # One engine for the server's lifetime, so credentials are asked for once
+        if self.engine is None:
+            self.engine = exposure.get_engine()
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        print(f"✅ Serving LENS on http://{self.host}:{self.port} (refresh every {self.refresh_seconds}s)")
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.refresh_forever())
+
+
+def _raw(status, body, content_type, headers=None, send_body=True):
+    lines = [
+        f"HTTP/1.1 {status} {_REASONS[status]}",
+        f"Date: {formatdate(usegmt=True)}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        "Connection: close",
+    ]
+    lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+    return head + (body if send_body else b"")
+
+
+def main(argv=None, store=None, engine=None):
+    parser = argparse.ArgumentParser(description="Serve the LENS map and its JSON endpoints locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--refresh", type=float, default=REFRESH_SECONDS, help="seconds between upstream refreshes")
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="seconds between browser polls")
+    parser.add_argument("--exposure-hours", type=float, default=EXPOSURE_SECONDS / 3600,
+                        help="hours between exposure table reloads")
+    parser.add_argument("--delta-minutes", type=float, default=None,
+                        help="minutes between delta loads of changed accounts (default: off, or 15 with LENS_EXPOSURE_DELTA=1)")
+    args = parser.parse_args(argv)
+    if args.delta_minutes:
+        delta.ENABLED = True
+    server = LensServer(args.host, args.port, args.refresh, args.poll, store=store, engine=engine,
+                        exposure_seconds=args.exposure_hours * 3600,
+                        delta_seconds=args.delta_minutes and args.delta_minutes * 60)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
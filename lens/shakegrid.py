@@ -0,0 +1,214 @@
+"""ShakeMap intensity grids: shaking sampled at each location instead of contour polygons.
+
+With LENS_SHAKEMAP_DIR set, an earthquake whose ShakeMap grid is in that
+directory takes its shaking from the grid rather than from the shake feed's
+contour polygons. Grids are USGS grid.xml files (<eq_id>.xml, optionally
+gzipped as <eq_id>.xml.gz) or MMI GeoTIFFs (<eq_id>.tif, read with rasterio
+when it is installed). With LENS_SHAKEMAP_DOWNLOAD=1, missing grids are
+downloaded from the USGS event service into the directory first. Grids older
+than MAX_AGE_SECONDS are fetched again, since ShakeMaps are revised in the
+hours after an event.
+
+Every location inside a grid gets its MMI by bilinear interpolation between
+the four surrounding grid nodes, which is one vectorized pass over the points.
+Locations at MIN_MMI or above count as exposed, and their loss is taken at
+their own intensity. Contours nearest to a gridded event are left out of the
+polygon join, and the epicentre join is kept for every event.
+
+    LENS_SHAKEMAP_DIR=shakemaps LENS_SHAKEMAP_DOWNLOAD=1 python -m lens run
+"""
+
+import gzip
+import os
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+
+from lens import instrument
+from lens.artifacts import content_hash
+
+try:
+    import rasterio
+except ImportError:  # GeoTIFF grids are skipped when rasterio is not installed
+    rasterio = None
+
+GRID_DIR = os.environ.get("LENS_SHAKEMAP_DIR")
+DOWNLOAD = os.environ.get("LENS_SHAKEMAP_DOWNLOAD", "") == "1"
+
+EVENT_URL = "https://earthquake.usgs.gov/fdsnws/event/1/query?eventid={eq_id}&format=geojson"
+MAX_AGE_SECONDS = 3600
+TIMEOUT_SECONDS = 30
+
+# Lowest interpolated intensity counted as exposed
+MIN_MMI = 4.0
+
+SUFFIXES = [".xml", ".xml.gz", ".tif"]
+
+
+# -----------------------
+# FILES
+# -----------------------
+
+def grid_path(eq_id, directory=None):
+    """Grid file of ``eq_id`` in the grid directory, or None."""
+    directory = Path(directory or GRID_DIR)
+    for suffix in SUFFIXES:
+        path = directory / f"{eq_id}{suffix}"
+        if path.exists() and (suffix != ".tif" or rasterio is not None):
+            return path
+    return None
+
+
+def download_grid(eq_id, directory):
+    """Fetch the event's current grid.xml into ``directory``; returns its path, or None without a ShakeMap."""
+    import requests
+
+    event = requests.get(EVENT_URL.format(eq_id=eq_id), timeout=TIMEOUT_SECONDS)
+    event.raise_for_status()
+    shakemaps = event.json().get("properties", {}).get("products", {}).get("shakemap", [])
+    contents = shakemaps[0].get("contents", {}) if shakemaps else {}
+    if "download/grid.xml" not in contents:
+        return None
+    grid = requests.get(contents["download/grid.xml"]["url"], timeout=TIMEOUT_SECONDS)
+    grid.raise_for_status()
+    path = Path(directory) / f"{eq_id}.xml"
+    partial = path.with_name(path.name + ".part")
+    partial.write_bytes(grid.content)
+    partial.replace(path)
+    return path
+
+
+def event_grids(eq_gdf, directory=None, download=None):
+    """{eq_id: grid file} of the earthquakes with a grid, downloading missing or stale ones when enabled."""
+    directory = directory or GRID_DIR
+    download = DOWNLOAD if download is None else download
+    if not directory or eq_gdf.empty:
+        return {}
+    paths = {}
+    with instrument.stage("shakemap_grids"):
+        for eq_id in eq_gdf["eq_id"].astype(str):
+            path = grid_path(eq_id, directory)
+            if download and (path is None or time.time() - path.stat().st_mtime > MAX_AGE_SECONDS):
+                Path(directory).mkdir(parents=True, exist_ok=True)
+                try:
+                    path = download_grid(eq_id, directory) or path
+                except Exception as e:
+                    print(f"⚠️ ShakeMap grid download failed for {eq_id}: {e}")
+            if path is not None:
+                paths[eq_id] = path
+    if paths:
+        print(f"✅ ShakeMap grids for {len(paths)} of {len(eq_gdf)} earthquakes")
+    return paths
+
+
+def grids_key(paths):
+    """Content hash of the grid files in use, by name, size and modification time."""
+    return content_hash(sorted((eq_id, path.name, path.stat().st_size, path.stat().st_mtime_ns)
+                               for eq_id, path in paths.items()))
+
+
+# -----------------------
+# GRIDS
+# -----------------------
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_grid_xml(data, field="MMI"):
+    """USGS grid.xml bytes -> grid of ``field``; nodes are placed by their own LON/LAT, so row order does not matter."""
+    root = ET.fromstring(data)
+    spec, fields, text = None, {}, ""
+    for element in root:
+        name = _local(element.tag)
+        if name == "grid_specification":
+            spec = element.attrib
+        elif name == "grid_field":
+            fields[element.attrib["name"].upper()] = int(element.attrib["index"]) - 1
+        elif name == "grid_data":
+            text = element.text or ""
+    lon0, lat0 = float(spec["lon_min"]), float(spec["lat_min"])
+    nlon, nlat = int(spec["nlon"]), int(spec["nlat"])
+    dlon, dlat = float(spec["nominal_lon_spacing"]), float(spec["nominal_lat_spacing"])
+    rows = np.array(text.split(), dtype=np.float64).reshape(-1, len(fields))
+    col = np.clip(np.rint((rows[:, fields["LON"]] - lon0) / dlon).astype(np.int64), 0, nlon - 1)
+    row = np.clip(np.rint((rows[:, fields["LAT"]] - lat0) / dlat).astype(np.int64), 0, nlat - 1)
+    values = np.full((nlat, nlon), np.nan, dtype=np.float32)
+    values[row, col] = rows[:, fields[field]]
+    return {"lon0": lon0, "lat0": lat0, "dlon": dlon, "dlat": dlat, "values": values}
+
+
+def read_geotiff(path):
+    """Band 1 of a north-up GeoTIFF as a grid, rows flipped to run south to north."""
+    with rasterio.open(path) as src:
+        values = src.read(1, masked=True).astype(np.float32).filled(np.nan)
+        t = src.transform
+    return {
+        "lon0": t.c + t.a / 2,
+        "lat0": t.f + t.e * (values.shape[0] - 0.5),
+        "dlon": t.a,
+        "dlat": -t.e,
+        "values": np.flipud(values),
+    }
+
+
+def load_grid(eq_id, path):
+    path = Path(path)
+    if path.suffix == ".tif":
+        grid = read_geotiff(path)
+    else:
+        data = path.read_bytes()
+        grid = parse_grid_xml(gzip.decompress(data) if path.suffix == ".gz" else data)
+    return {"eq_id": str(eq_id), **grid}
+
+
+def load_grids(paths):
+    """Grids of {eq_id: grid file}; files that fail to load are skipped."""
+    grids = []
+    for eq_id, path in sorted(paths.items()):
+        try:
+            grids.append(load_grid(eq_id, path))
+        except Exception as e:
+            print(f"⚠️ Skipping ShakeMap grid {path}: {e}")
+    return grids
+
+
+def grid_bounds(grids):
+    """(minx, miny, maxx, maxy) of every grid's nodes."""
+    return np.array([
+        [g["lon0"], g["lat0"], g["lon0"] + g["dlon"] * (g["values"].shape[1] - 1),
+         g["lat0"] + g["dlat"] * (g["values"].shape[0] - 1)]
+        for g in grids
+    ]).reshape(-1, 4)
+
+
+def sample(grid, lon, lat):
+    """Bilinear interpolation of the grid at each point; NaN outside it."""
+    values = grid["values"]
+    nlat, nlon = values.shape
+    fx = (np.asarray(lon, dtype=np.float64) - grid["lon0"]) / grid["dlon"]
+    fy = (np.asarray(lat, dtype=np.float64) - grid["lat0"]) / grid["dlat"]
+    inside = (fx >= 0) & (fx <= nlon - 1) & (fy >= 0) & (fy <= nlat - 1)
+    x0 = np.clip(np.floor(fx), 0, max(nlon - 2, 0)).astype(np.int64)
+    y0 = np.clip(np.floor(fy), 0, max(nlat - 2, 0)).astype(np.int64)
+    x1, y1 = np.minimum(x0 + 1, nlon - 1), np.minimum(y0 + 1, nlat - 1)
+    tx, ty = fx - x0, fy - y0
+    mmi = ((1 - tx) * (1 - ty) * values[y0, x0] + tx * (1 - ty) * values[y0, x1]
+           + (1 - tx) * ty * values[y1, x0] + tx * ty * values[y1, x1])
+    return np.where(inside, mmi, np.nan)
+
+
+def sample_grids(grids, lon, lat):
+    """(grid index, point index, MMI) of the points at MIN_MMI or above in each grid."""
+    lon, lat = np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+    grid_idx, point_idx, mmi = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0)]
+    for i, (grid, (x0, y0, x1, y1)) in enumerate(zip(grids, grid_bounds(grids))):
+        points = np.flatnonzero((lon >= x0) & (lon <= x1) & (lat >= y0) & (lat <= y1))
+        values = sample(grid, lon[points], lat[points])
+        keep = values >= MIN_MMI
+        grid_idx.append(np.full(int(keep.sum()), i, dtype=np.int64))
+        point_idx.append(points[keep])
+        mmi.append(values[keep])
+    return np.concatenate(grid_idx), np.concatenate(point_idx), np.concatenate(mmi)
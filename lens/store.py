@@ -0,0 +1,279 @@
+"""Compact location store: coordinate and value arrays plus categorical codes.
+
+Each string dimension (participant, country, location and account names,
+occupancy) is held once as categories plus an int32 code per location.
+Geometry, frames and per-dimension aggregates are derived on demand from the
+arrays, using masks and index arrays rather than copies of the whole book. The TIV query can be
+read in chunks, so the object-dtype frame never exists for the full book.
+Rows carrying financial terms get their per-peril gross exposure computed as
+each chunk is encoded (lens.terms).
+"""
+
+import numpy as np
+import pandas as pd
+
+from lens.exposure import TIV_CHUNK_ROWS, code_to_country
+from lens.terms import ACCOUNT_TERMS, GROUND_UP, PERIL_COLUMNS, apply_terms, group_keys, has_terms, peril_column
+
+CRS = "EPSG:4326"
+
+STRING_COLUMNS = ["participant_name", "country_code", "locname", "accntname", "account_number", "occupancy"]
+VALUE_COLUMNS = ["trapped_exposure_usd", "participant_value_usd"]
+
+
+def _encode(chunk):
+    """One TIV query chunk as float64 arrays and Categoricals, with missing required columns filled in."""
+    computed = {}
+    if has_terms(chunk):
+        computed = apply_terms(chunk)
+        # Rows with nothing to lose under any peril are dropped
+        keep = np.logical_or.reduce([computed[col] > 0 for col in ("trapped_exposure_usd", *PERIL_COLUMNS)])
+        if not keep.all():
+            chunk = chunk[keep]
+            computed = {col: array[keep] for col, array in computed.items()}
+    n = len(chunk)
+    arrays = {
+        col: chunk[col].to_numpy(dtype=np.float64) if col in chunk.columns else np.full(n, np.nan)
+        for col in ["latitude", "longitude", *VALUE_COLUMNS]
+    }
+    arrays.update({col: chunk[col].to_numpy(dtype=np.float64)
+                   for col in (*PERIL_COLUMNS, *ACCOUNT_TERMS) if col in chunk.columns})
+    arrays.update(computed)
+    categoricals = {}
+    for col in STRING_COLUMNS:
+        if col in chunk.columns:
+            categoricals[col] = pd.Categorical(chunk[col])
+    if "participant_name" not in categoricals:
+        categoricals["participant_name"] = pd.Categorical(["Unknown"] * n)
+    return arrays, categoricals
+
+
+class LocationStore:
+    """Exposure locations as parallel arrays; string dimensions as codes into shared categories."""
+
+    crs = CRS
+
+    def __init__(self, lat, lon, values, codes, categories):
+        self.lat = lat
+        self.lon = lon
+        self.values = values
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def from_frame(cls, tiv_df):
+        # Encoded in query-sized slices, so the terms arrays stay chunk-sized
+        return cls.from_chunks(tiv_df.iloc[i:i + TIV_CHUNK_ROWS] for i in range(0, max(len(tiv_df), 1), TIV_CHUNK_ROWS))
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """Build from TIV query frames, encoding each chunk before the next one is read."""
+        encoded = [_encode(chunk) for chunk in chunks]
+        if not encoded:
+            encoded = [_encode(pd.DataFrame())]
+
+        values = {col: np.concatenate([arrays[col] for arrays, _ in encoded]) for col in encoded[0][0]}
+        codes, categories = {}, {}
+        for col in STRING_COLUMNS:
+            parts = [cats[col] for _, cats in encoded if col in cats]
+            if len(parts) != len(encoded):
+                continue
+            merged = pd.api.types.union_categoricals(parts, sort_categories=True) if len(parts) > 1 else parts[0]
+            codes[col] = merged.codes.astype(np.int32)
+            categories[col] = merged.categories
+
+        # Missing participant names become "Unknown"
+        missing = codes["participant_name"] < 0
+        if missing.any():
+            names = categories["participant_name"]
+            if "Unknown" not in names:
+                names = names.append(pd.Index(["Unknown"]))
+            codes["participant_name"][missing] = names.get_loc("Unknown")
+            categories["participant_name"] = names
+
+        lat, lon = values.pop("latitude"), values.pop("longitude")
+        store = cls(lat, lon, values, codes, categories)
+        if "country_code" in codes:
+            # Country names from the codes; locations with an unknown country are dropped
+            names = categories["country_code"].map(code_to_country)
+            name_index = pd.Index(pd.unique(names.dropna()))
+            lookup = np.append(name_index.get_indexer(names), -1).astype(np.int32)
+            country = lookup[codes["country_code"]]
+            store.codes["country_name"] = country
+            store.categories["country_name"] = name_index
+            keep = country >= 0
+            if not keep.all():
+                store = store.take(np.flatnonzero(keep))
+        return store
+
+    def __len__(self):
+        return len(self.lat)
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def take(self, index):
+        """A store over the locations at ``index`` (array gathers, categories shared)."""
+        return LocationStore(
+            self.lat[index], self.lon[index],
+            {col: array[index] for col, array in self.values.items()},
+            {col: array[index] for col, array in self.codes.items()},
+            self.categories,
+        )
+
+    def for_peril(self, peril):
+        """This store with trapped_exposure_usd set to ``peril``'s gross exposure (arrays shared, not copied).
+
+        Stores loaded without terms have one trapped exposure for every peril.
+        """
+        column = peril_column(peril)
+        if column not in self.values:
+            return self
+        return LocationStore(self.lat, self.lon, {**self.values, "trapped_exposure_usd": self.values[column]},
+                             self.codes, self.categories)
+
+    def account_view(self):
+        """(view, groups): the store with participants replaced by (account, participant) groups.
+
+        The view's participant_name codes index the sorted group keys
+        (terms.group_keys), so the joins aggregate per account group unchanged.
+        ``groups`` holds each group's key, participant code and account terms,
+        for terms.account_exposure. Both are computed once per store.
+        """
+        cached = self.__dict__.get("_account_view")
+        if cached is not None:
+            return cached
+        participant = np.asarray(self.codes["participant_name"])
+        account = np.asarray(self.codes["account_number"]) if "account_number" in self.codes else np.full(len(self), -1)
+        valid = participant >= 0
+        keys, first, inverse = np.unique(group_keys(account[valid], participant[valid]),
+                                         return_index=True, return_inverse=True)
+        group = np.full(len(self), -1, dtype=np.int32)
+        group[valid] = inverse
+        rows = np.flatnonzero(valid)[first]
+
+        def terms(col):
+            return np.asarray(self.values[col])[rows] if col in self.values else np.full(len(keys), np.nan)
+
+        view = LocationStore(self.lat, self.lon, self.values, {**self.codes, "participant_name": group},
+                             {**self.categories, "participant_name": pd.Index(keys)})
+        groups = {
+            "key": keys,
+            "participant": participant[rows],
+            "participants": self.categories["participant_name"],
+            "attachment": terms("attachment_point_usd"),
+            "limit": terms("policy_limit_usd"),
+            "share": terms("participant_share"),
+        }
+        self._account_view = (view, groups)
+        return self._account_view
+
+    def rows_of(self, dimension, values):
+        """Mask of locations whose ``dimension`` is one of ``values``."""
+        if dimension not in self.codes:
+            return np.zeros(len(self), dtype=bool)
+        wanted = self.categories[dimension].get_indexer(pd.Index(values))
+        return np.isin(self.codes[dimension], wanted[wanted >= 0])
+
+    def extend(self, other):
+        """This store followed by ``other``; categories are only appended to, so existing codes stay valid."""
+        codes, categories = {}, {}
+        for dim, own in self.codes.items():
+            names = self.categories[dim]
+            if dim in other.codes:
+                names = names.append(other.categories[dim].difference(names, sort=False))
+                lookup = np.append(names.get_indexer(other.categories[dim]), -1).astype(np.int32)
+                theirs = lookup[other.codes[dim]]
+            else:
+                theirs = np.full(len(other), -1, dtype=np.int32)
+            codes[dim] = np.concatenate([own, theirs])
+            categories[dim] = names
+        return LocationStore(
+            np.concatenate([self.lat, other.lat]), np.concatenate([self.lon, other.lon]),
+            {col: np.concatenate([array, other.values[col]]) for col, array in self.values.items()},
+            codes, categories,
+        )
+
+    def patch(self, accounts, delta):
+        """(patched store, removed mask): rows of the changed ``accounts`` replaced by the ``delta`` store.
+
+        Kept rows stay in order at the front and the delta rows follow, which
+        lens.locindex.patch_index relies on.
+        """
+        removed = self.rows_of("account_number", accounts)
+        return self.take(np.flatnonzero(~removed)).extend(delta), removed
+
+    def column(self, name):
+        """A value array, or a Categorical view over a dimension's codes."""
+        if name in self.values:
+            return self.values[name]
+        if name == "latitude":
+            return self.lat
+        if name == "longitude":
+            return self.lon
+        return pd.Categorical.from_codes(self.codes[name], self.categories[name], validate=False)
+
+    def frame(self, columns=None):
+        columns = columns or ["latitude", "longitude", *self.values, *self.codes]
+        return pd.DataFrame({col: self.column(col) for col in columns}, copy=False)
+
+    def points(self):
+        """Point geometries, built on demand and not kept."""
+        import shapely
+
+        return shapely.points(self.lon, self.lat)
+
+    def points_gdf(self, columns=("participant_name", "country_name", "occupancy", "trapped_exposure_usd", GROUND_UP)):
+        """GeoDataFrame for the geopandas joins; string columns as plain strings, like the query output."""
+        import geopandas as gpd
+
+        data = {}
+        for col in columns:
+            if col in self.codes:
+                data[col] = np.asarray(self.column(col), dtype=object)
+            elif col in self.values:
+                data[col] = self.values[col]
+        return gpd.GeoDataFrame(data, geometry=self.points(), crs=self.crs)
+
+    def finite(self, *columns):
+        """Mask of locations whose coordinates and given value columns are all finite."""
+        mask = np.isfinite(self.lat) & np.isfinite(self.lon)
+        for col in columns:
+            mask &= np.isfinite(self.values[col])
+        return mask
+
+    def sum_by(self, dimension, value="trapped_exposure_usd"):
+        """Series of summed ``value`` per category of ``dimension`` (NaN values count as 0)."""
+        if dimension not in self.codes:
+            return pd.Series(dtype=float)
+        codes = self.codes[dimension]
+        valid = codes >= 0
+        totals = np.bincount(codes[valid], weights=np.nan_to_num(self.values[value][valid]),
+                             minlength=len(self.categories[dimension]))
+        present = np.bincount(codes[valid], minlength=len(self.categories[dimension])) > 0
+        return pd.Series(totals[present], index=self.categories[dimension][present], name=value)
+
+    def participants_by(self, dimension):
+        """Series of sorted, comma-joined participant names per category of ``dimension``."""
+        if dimension not in self.codes:
+            return pd.Series(dtype=object)
+        codes, participants = self.codes[dimension], self.codes["participant_name"]
+        valid = codes >= 0
+        n_participants = len(self.categories["participant_name"])
+        pairs = np.unique(codes[valid].astype(np.int64) * n_participants + participants[valid])
+        names = self.categories["participant_name"]
+        joined = {}
+        for key, participant in zip(pairs // n_participants, pairs % n_participants):
+            joined.setdefault(key, []).append(str(names[participant]))
+        index = self.categories[dimension]
+        return pd.Series({index[key]: ", ".join(sorted(members)) for key, members in joined.items()}, dtype=object)
+
+    def content_parts(self):
+        """Arrays and categories that identify this store's content, for artifacts.content_hash."""
+        parts = [self.lat, self.lon]
+        for col in sorted(self.values):
+            parts += [col, self.values[col]]
+        for col in sorted(self.codes):
+            parts += [col, self.codes[col], list(map(str, self.categories[col]))]
+        return parts
@@ -0,0 +1,277 @@
+"""Out-of-core exposure: locations spilled to disk and joined chunk by chunk.
+
+With LENS_STREAM_JOINS=1, the TIV query is read from the database cursor in
+chunks, and each chunk is encoded and appended to flat column files under
+<artifact root>/locations/. The location store then memory-maps those files
+rather than holding the book in RAM. The hazard joins stream over the mapped
+columns. Each chunk of points is tested against the prepared, in-memory
+hazard geometries, and the matches are reduced straight into
+per-(hazard geometry, participant) sums. No joined frame is built, so a
+join's peak memory is one chunk plus the hazards and the joined pairs. Only
+the participant, account, country and occupancy dimensions are spilled, since
+location and account names are not used downstream. Per-peril gross exposure,
+the ground-up value and the account terms (lens.terms) are spilled when the
+rows carry financial terms.
+"""
+
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from lens import montecarlo, parallel, shakegrid, vulnerability, windfield
+from lens.store import LocationStore
+from lens.terms import ACCOUNT_TERMS, GROUND_UP, PERIL_COLUMNS
+
+STREAMING = os.environ.get("LENS_STREAM_JOINS", "") == "1"
+
+SPILL_STAGE = "locations"
+
+# Locations per join chunk
+STREAM_CHUNK_ROWS = 250_000
+
+# Cell size of the coarse grid used to skip points far from every hazard
+FILTER_DEGREES = 1.0
+
+SPILL_DIMENSIONS = ["participant_name", "country_code", "country_name", "account_number", "occupancy"]
+
+_COLUMNS = (("latitude", np.float64), ("longitude", np.float64),
+            ("trapped_exposure_usd", np.float64), ("participant_value_usd", np.float64),
+            *((dim, np.int32) for dim in SPILL_DIMENSIONS))
+_DTYPES = dict(_COLUMNS)
+
+
+# -----------------------
+# SPILLED LOCATIONS
+# -----------------------
+
+def spill_dir(store):
+    """A fresh spill directory under the artifact store; older spills beyond store.keep are removed."""
+    root = store.root / SPILL_STAGE
+    root.mkdir(parents=True, exist_ok=True)
+    spills = sorted((p for p in root.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime, reverse=True)
+    # Removing a directory leaves existing mappings of its files readable
+    for old in spills[max(store.keep - 1, 0):]:
+        shutil.rmtree(old, ignore_errors=True)
+    return root / f"{time.time_ns():x}"
+
+
+def spill_chunks(chunks, directory):
+    """LocationStore over flat column files, written one TIV chunk at a time and memory-mapped."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    files = {name: open(directory / f"{name}.bin", "wb") for name, _ in _COLUMNS}
+    term_columns = []
+    mappings = {dim: {} for dim in SPILL_DIMENSIONS}
+    n = 0
+    try:
+        for chunk in chunks:
+            # Encoding, the Unknown participant fill and the country mapping all happen per chunk
+            part = LocationStore.from_frame(chunk)
+            columns = {"latitude": part.lat, "longitude": part.lon, **part.values}
+            if not n:
+                # Every chunk of one query has the same value columns
+                term_columns = [col for col in (*PERIL_COLUMNS, *ACCOUNT_TERMS, GROUND_UP) if col in columns]
+                files.update({col: open(directory / f"{col}.bin", "wb") for col in term_columns if col not in files})
+            for dim in SPILL_DIMENSIONS:
+                codes = part.codes.get(dim)
+                if codes is None:
+                    codes = np.full(len(part), -1, dtype=np.int32)
+                else:
+                    # Chunk codes -> codes into the categories seen so far
+                    mapping = mappings[dim]
+                    lookup = np.array([mapping.setdefault(value, len(mapping)) for value in part.categories[dim]]
+                                      + [-1], dtype=np.int32)
+                    codes = lookup[codes]
+                columns[dim] = codes
+            for name, f in files.items():
+                f.write(np.ascontiguousarray(columns[name], dtype=_DTYPES.get(name, np.float64)).data)
+            n += len(part)
+    finally:
+        for f in files.values():
+            f.close()
+
+    def mapped(name, dtype):
+        if not n:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(directory / f"{name}.bin", dtype=dtype, mode="r", shape=(n,))
+
+    arrays = {name: mapped(name, _DTYPES.get(name, np.float64)) for name in files}
+    codes, categories = {}, {}
+    for dim in SPILL_DIMENSIONS:
+        if mappings[dim] or dim == "participant_name":
+            codes[dim] = arrays[dim]
+            categories[dim] = pd.Index(list(mappings[dim]), dtype=object)
+    values = {name: arrays[name] for name in ("trapped_exposure_usd", "participant_value_usd", *term_columns)}
+    return LocationStore(arrays["latitude"], arrays["longitude"], values, codes, categories)
+
+
+# -----------------------
+# STREAMING JOINS
+# -----------------------
+
+def _cell_index(coord, span, cell=FILTER_DEGREES):
+    n = int(np.ceil(span / cell))
+    # NaN coordinates land in cell 0 and are rejected by the exact predicate
+    return np.clip(np.nan_to_num((coord + span / 2) // cell), 0, n - 1).astype(np.int64)
+
+
+def hazard_cells(bounds, cell=FILTER_DEGREES):
+    """Boolean lat x lon grid of the cells touched by any hazard bounding box (k x 4)."""
+    cells = np.zeros((int(np.ceil(180 / cell)), int(np.ceil(360 / cell))), dtype=bool)
+    bounds = bounds[np.isfinite(bounds).all(axis=1)]
+    for (x0, x1), (y0, y1) in zip(
+        np.column_stack([_cell_index(bounds[:, 0], 360, cell), _cell_index(bounds[:, 2], 360, cell)]),
+        np.column_stack([_cell_index(bounds[:, 1], 180, cell), _cell_index(bounds[:, 3], 180, cell)]),
+    ):
+        cells[y0:y1 + 1, x0:x1 + 1] = True
+    return cells
+
+
+class StreamingJoins(parallel.ShardedJoins):
+    """ShardedJoins over location chunks, each reduced against the prepared in-memory hazards."""
+
+    def __init__(self, locations, chunk_rows=STREAM_CHUNK_ROWS):
+        super().__init__(None, workers=1)
+        self.locations = locations
+        self.chunk_rows = chunk_rows
+
+    def for_peril(self, peril):
+        return StreamingJoins(self.locations.for_peril(peril), self.chunk_rows)
+
+    @property
+    def occupancies(self):
+        return parallel.occupancy_codes(self.locations)[1]
+
+    @property
+    def participants(self):
+        return self.locations.categories["participant_name"]
+
+    def chunk_arrays(self, point_rows, occupancy):
+        """Value, ground-up value and occupancy arrays of the given rows, as parallel.pair_weights reads them."""
+        values = self.locations.values
+        arrays = {"value": np.nan_to_num(np.asarray(values["trapped_exposure_usd"][point_rows])),
+                  "occupancy": np.asarray(occupancy[point_rows])}
+        if GROUND_UP in values:
+            arrays["value_ground_up"] = np.nan_to_num(np.asarray(values[GROUND_UP][point_rows]))
+        return arrays
+
+    def pair_sums(self, geoms, predicate, damage=None, cell_degrees=None):
+        """(pair keys, sums) as parallel.pair_sums, one location chunk at a time."""
+        locations = self.locations
+        n_cells = montecarlo.cell_count(cell_degrees) if cell_degrees else 1
+        n_participants = len(locations.categories["participant_name"]) * n_cells
+        occupancy, _ = parallel.occupancy_codes(locations)
+        keys, sums = [np.empty(0, dtype=np.int64)], [np.empty((0, 3)) if damage is not None else np.empty(0)]
+        if len(geoms) and len(locations):
+            shapely.prepare(geoms)
+            reverse = parallel.REVERSE_PREDICATES[predicate]
+            cells = hazard_cells(shapely.bounds(geoms))
+            for start in range(0, len(locations), self.chunk_rows):
+                end = start + self.chunk_rows
+                lon, lat = np.asarray(locations.lon[start:end]), np.asarray(locations.lat[start:end])
+                # Points in grid cells no hazard box touches are never turned into geometries
+                rows = np.flatnonzero(cells[_cell_index(lat, 180), _cell_index(lon, 360)])
+                if not len(rows):
+                    continue
+                # A tree over the chunk's points, queried with the prepared hazards (see parallel.join_shard)
+                tree = shapely.STRtree(shapely.points(lon[rows], lat[rows]))
+                hazard_idx, point_idx = tree.query(geoms, predicate=reverse)
+                point_rows = start + rows[point_idx]
+                code = np.asarray(locations.codes["participant_name"][point_rows])
+                # Points without a participant are dropped, as groupby drops NaN keys
+                keep = code >= 0
+                point_rows = point_rows[keep]
+                code = code[keep].astype(np.int64)
+                if cell_degrees:
+                    hit = rows[point_idx[keep]]
+                    code = code * n_cells + montecarlo.point_cells(lon[hit], lat[hit], cell_degrees)
+                arrays = self.chunk_arrays(point_rows, occupancy)
+                weights = parallel.pair_weights(arrays, np.arange(len(point_rows)), hazard_idx[keep], "value", damage)
+                # Reduced per chunk, so memory follows the joined pairs rather than the points
+                chunk_keys, chunk_sums = parallel.reduce_pairs(hazard_idx[keep] * n_participants + code, weights)
+                keys.append(chunk_keys)
+                sums.append(chunk_sums)
+        return parallel.reduce_pairs(np.concatenate(keys), np.concatenate(sums))
+
+    def members(self, geoms, predicate):
+        """(hazard index, store row, participant code, value) of every joined pair, one location chunk at a time."""
+        locations = self.locations
+        geoms = np.asarray(geoms, dtype=object)
+        parts = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))]
+        if len(geoms) and len(locations):
+            shapely.prepare(geoms)
+            reverse = parallel.REVERSE_PREDICATES[predicate]
+            cells = hazard_cells(shapely.bounds(geoms))
+            for start in range(0, len(locations), self.chunk_rows):
+                end = start + self.chunk_rows
+                lon, lat = np.asarray(locations.lon[start:end]), np.asarray(locations.lat[start:end])
+                rows = np.flatnonzero(cells[_cell_index(lat, 180), _cell_index(lon, 360)])
+                if not len(rows):
+                    continue
+                tree = shapely.STRtree(shapely.points(lon[rows], lat[rows]))
+                hazard_idx, point_idx = tree.query(geoms, predicate=reverse)
+                point_rows = start + rows[point_idx]
+                code = np.asarray(locations.codes["participant_name"][point_rows])
+                keep = code >= 0
+                values = np.nan_to_num(np.asarray(locations.values["trapped_exposure_usd"][point_rows[keep]]))
+                parts.append((hazard_idx[keep], point_rows[keep], code[keep].astype(np.int64), values))
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+    def pairs(self, hazard_gdf, predicate, columns, damage=None, cell_degrees=None):
+        keys, sums = self.pair_sums(np.asarray(hazard_gdf.geometry.values, dtype=object), predicate, damage, cell_degrees)
+        return parallel.sums_frame(hazard_gdf, columns, self.participants, keys, sums, cell_degrees)
+
+    def wind_sums(self, steps):
+        """(storm x participant keys, sums) as parallel.wind_sums, one location chunk at a time."""
+        locations = self.locations
+        n_participants = len(self.participants)
+        occupancy, _ = parallel.occupancy_codes(locations)
+        curve_rows = vulnerability.class_rows("ws", self.occupancies)
+        keys, sums = [np.empty(0, dtype=np.int64)], [np.empty((0, 3))]
+        if len(steps["lon"]) and len(locations):
+            cells = hazard_cells(windfield.step_bounds(steps))
+            for start in range(0, len(locations), self.chunk_rows):
+                end = start + self.chunk_rows
+                lon, lat = np.asarray(locations.lon[start:end]), np.asarray(locations.lat[start:end])
+                rows = np.flatnonzero(cells[_cell_index(lat, 180), _cell_index(lon, 360)])
+                if not len(rows):
+                    continue
+                storm, point, wind = windfield.peak_winds(lon[rows], lat[rows], steps)
+                point_rows = start + rows[point]
+                code = np.asarray(locations.codes["participant_name"][point_rows])
+                keep = code >= 0
+                point_rows = point_rows[keep]
+                arrays = self.chunk_arrays(point_rows, occupancy)
+                ratio = vulnerability.row_damage("ws", wind[keep], curve_rows[arrays["occupancy"]])
+                weights = parallel.loss_weights(arrays, np.arange(len(point_rows)), "value", ratio)
+                chunk_keys, chunk_sums = parallel.reduce_pairs(storm[keep] * n_participants + code[keep], weights)
+                keys.append(chunk_keys)
+                sums.append(chunk_sums)
+        return parallel.reduce_pairs(np.concatenate(keys), np.concatenate(sums))
+
+    def grid_sums(self, grids):
+        """(grid x participant keys, sums) as parallel.grid_sums, one location chunk at a time."""
+        locations = self.locations
+        n_participants = len(self.participants)
+        occupancy, _ = parallel.occupancy_codes(locations)
+        curve_rows = vulnerability.class_rows("eq", self.occupancies)
+        keys, sums = [np.empty(0, dtype=np.int64)], [np.empty((0, 3))]
+        for start in range(0, len(locations) if grids else 0, self.chunk_rows):
+            end = start + self.chunk_rows
+            grid, point, mmi = shakegrid.sample_grids(grids, locations.lon[start:end], locations.lat[start:end])
+            point_rows = start + point
+            code = np.asarray(locations.codes["participant_name"][point_rows])
+            keep = code >= 0
+            point_rows = point_rows[keep]
+            arrays = self.chunk_arrays(point_rows, occupancy)
+            ratio = vulnerability.row_damage("eq", mmi[keep], curve_rows[arrays["occupancy"]])
+            weights = parallel.loss_weights(arrays, np.arange(len(point_rows)), "value", ratio)
+            chunk_keys, chunk_sums = parallel.reduce_pairs(grid[keep] * n_participants + code[keep], weights)
+            keys.append(chunk_keys)
+            sums.append(chunk_sums)
+        return parallel.reduce_pairs(np.concatenate(keys), np.concatenate(sums))
@@ -0,0 +1,273 @@
+"""Synthetic portfolios and hazard feeds for benchmarks and offline runs.
+
+``synthetic_tiv`` returns rows shaped like the TIV_SQL result, with Zipf-skewed
+countries and participants and locations clustered around per-country hubs,
+and per-peril coverage values and deductibles for lens.terms.
+``synthetic_feeds`` returns FeatureCollections shaped like the ArcGIS layers
+(cones, probability bands, tracks, ShakeMap contours, wildfire perimeters and
+NWS warnings), placed over the same hubs so the joins find exposure.
+"""
+
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+import shapely.affinity
+from shapely.geometry import LineString, Point, Polygon, box
+
+from lens.exposure import code_to_country, ded_cols, val_cols
+
+# (country code, lon min, lat min, lon max, lat max), most heavily weighted first
+COUNTRY_BOXES = [
+    ("US", -124.0, 25.5, -67.5, 48.5),
+    ("JP", 130.5, 31.5, 141.5, 41.0),
+    ("GB", -5.5, 50.5, 1.5, 55.5),
+    ("DE", 6.5, 48.0, 14.5, 54.5),
+    ("FR", -1.5, 43.5, 7.0, 50.5),
+    ("CN", 104.0, 22.5, 121.5, 40.0),
+    ("CA", -123.0, 43.5, -71.0, 53.5),
+    ("MX", -106.0, 17.0, -90.0, 26.0),
+    ("AU", 115.0, -37.5, 153.0, -27.0),
+    ("IT", 8.0, 38.5, 16.5, 46.0),
+    ("CL", -72.5, -41.0, -70.0, -20.0),
+    ("TR", 27.0, 37.0, 43.0, 41.5),
+    ("PH", 120.0, 7.0, 125.5, 18.0),
+    ("NZ", 168.5, -46.0, 178.0, -35.0),
+]
+
+# Zipf exponents for country and participant skew
+COUNTRY_SKEW = 1.3
+PARTICIPANT_SKEW = 1.1
+
+N_PARTICIPANTS = 40
+HUBS_PER_COUNTRY = 6
+LOCATIONS_PER_ACCOUNT = 50
+SITE_NAMES = 1000
+
+# Occupancy codes (AIR scheme: residential, commercial, industrial, unknown) and their shares
+OCCUPANCY_CODES = ["301", "311", "321", "300"]
+OCCUPANCY_SHARES = [0.5, 0.3, 0.15, 0.05]
+
+# Share of TIV per coverage (building, other structures, contents/BI)
+COVERAGE_SHARES = [0.6, 0.1, 0.3]
+
+# Peril -> (low, high) deductible; up to 1 is a fraction of the coverage value, above is an amount
+DEDUCTIBLE_RANGES = {
+    "eq": (0.05, 0.15),
+    "ws": (0.02, 0.05),
+    "to": (1_000.0, 25_000.0),
+    "fl": (5_000.0, 50_000.0),
+    "fr": (0.01, 0.02),
+}
+
+
+def zipf_weights(n, skew):
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+def country_hubs(rng):
+    """(lon, lat) hub centres per country, inside each country's box."""
+    lo = np.array([[b[1], b[2]] for b in COUNTRY_BOXES])
+    hi = np.array([[b[3], b[4]] for b in COUNTRY_BOXES])
+    u = rng.random((len(COUNTRY_BOXES), HUBS_PER_COUNTRY, 2))
+    return lo[:, None, :] + u * (hi - lo)[:, None, :]
+
+
+# -----------------------
+# PORTFOLIO
+# -----------------------
+
+def synthetic_tiv(n, seed=0):
+    """``n`` TIV_SQL-shaped rows; text columns are categoricals and terms float32 so 10^7 rows stay in memory."""
+    rng = np.random.default_rng(seed)
+    hubs = country_hubs(np.random.default_rng(seed))
+
+    country = rng.choice(len(COUNTRY_BOXES), n, p=zipf_weights(len(COUNTRY_BOXES), COUNTRY_SKEW))
+    hub = rng.integers(0, HUBS_PER_COUNTRY, n)
+    centre = hubs[country, hub]
+    lo = np.array([[b[1], b[2]] for b in COUNTRY_BOXES])[country]
+    hi = np.array([[b[3], b[4]] for b in COUNTRY_BOXES])[country]
+    lonlat = np.clip(centre + rng.normal(0, 0.6, (n, 2)), lo, hi)
+
+    codes = [b[0] for b in COUNTRY_BOXES]
+    participant = rng.choice(N_PARTICIPANTS, n, p=zipf_weights(N_PARTICIPANTS, PARTICIPANT_SKEW))
+    n_accounts = max(n // LOCATIONS_PER_ACCOUNT, 1)
+    trapped = rng.lognormal(13.0, 1.6, n)
+    site = rng.integers(0, SITE_NAMES, n)
+    occupancy = rng.choice(len(OCCUPANCY_CODES), n, p=OCCUPANCY_SHARES)
+    account = rng.integers(0, n_accounts, n)
+    # Account layers: most attach at ground up and the limit sits below the account's TIV
+    account_tiv = np.bincount(account, weights=trapped, minlength=n_accounts)
+    attachment = np.where(rng.random(n_accounts) < 0.3, account_tiv * rng.uniform(0.0, 0.2, n_accounts), 0.0)[account]
+    layer_limit = (account_tiv * rng.uniform(0.3, 1.0, n_accounts))[account]
+    # Each participant takes a fixed share (partof) of its accounts' layers
+    share = 0.05 + 0.95 * ((account * 7919 + participant * 104729) % 1000) / 1000
+
+    terms = {}
+    for peril in ded_cols:
+        low, high = DEDUCTIBLE_RANGES[peril]
+        deductible = rng.uniform(low, high, n).astype(np.float32)
+        for coverage_share, val_col, ded_col in zip(COVERAGE_SHARES, val_cols[peril], ded_cols[peril]):
+            terms[val_col] = (trapped * coverage_share).astype(np.float32)
+            terms[ded_col] = deductible
+
+    return pd.DataFrame({
+        "country_code": pd.Categorical.from_codes(country, codes),
+        "latitude": lonlat[:, 1].round(5),
+        "longitude": lonlat[:, 0].round(5),
+        "participant_name": pd.Categorical.from_codes(participant, [f"Participant {i:02d}" for i in range(N_PARTICIPANTS)]),
+        "locname": pd.Categorical.from_codes(site, [f"Site {i:04d}" for i in range(SITE_NAMES)]),
+        "accntname": pd.Categorical.from_codes(account, [f"Account {i:06d}" for i in range(n_accounts)]),
+        "account_number": pd.Categorical.from_codes(account, [f"A{i:07d}" for i in range(n_accounts)]),
+        "occupancy": pd.Categorical.from_codes(occupancy, OCCUPANCY_CODES),
+        "total_insurable_value": trapped,
+        "value_to_usd": 1.0,
+        **terms,
+        "attachment_point_usd": attachment,
+        "policy_limit_usd": layer_limit,
+        "participant_share": share,
+        "blanlimamt": layer_limit,
+    })
+
+
+def synthetic_exposure_table(seed=0):
+    """Exposure geography rows: country boxes (level 1) and a state grid over the US (level 2)."""
+    rows = [
+        {"ExposureGeographyId": "1", "Name": code_to_country[code], "Geometry": box(x0, y0, x1, y1).wkb}
+        for code, x0, y0, x1, y1 in COUNTRY_BOXES
+    ]
+    _, x0, y0, x1, y1 = COUNTRY_BOXES[0]
+    xs, ys = np.linspace(x0, x1, 9), np.linspace(y0, y1, 5)
+    for i in range(len(xs) - 1):
+        for j in range(len(ys) - 1):
+            rows.append({
+                "ExposureGeographyId": "2",
+                "Name": f"State {i}-{j}",
+                "Geometry": box(xs[i], ys[j], xs[i + 1], ys[j + 1]).wkb,
+            })
+    return pd.DataFrame(rows)
+
+
+# -----------------------
+# HAZARD FEEDS
+# -----------------------
+
+def _feature(geom, **props):
+    return {"type": "Feature", "properties": props, "geometry": json.loads(shapely.to_geojson(geom, indent=None))}
+
+
+def _collection(features):
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _recent(rng, now_ms=None, days=5):
+    """Epoch-ms timestamp within the last ``days``, so the feeds' lookback filters keep it."""
+    now_ms = time.time() * 1000 if now_ms is None else now_ms
+    return int(now_ms - rng.uniform(0, days * 86400 * 1000))
+
+
+def _blob(rng, lon, lat, radius, vertices=24):
+    """Irregular star-shaped polygon, like a fire perimeter or warning area."""
+    angles = np.sort(rng.uniform(0, 2 * np.pi, vertices))
+    r = radius * rng.uniform(0.5, 1.0, vertices)
+    ring = np.c_[lon + r * np.cos(angles), lat + r * np.sin(angles)].round(5)
+    return Polygon(ring).buffer(0)
+
+
+def storm_feeds(rng, hubs, storms=3):
+    """Forecast tracks, locations, cones, observed tracks and TS/HF probability bands.
+
+    The first storm's observed track ends near a US hub, so the observed-track join has exposure to find;
+    the others are still at sea.
+    """
+    feeds = {name: [] for name in ("hurricane_forecast", "hurricane_locations", "hurricane_cone",
+                                   "hurricane_observed", "hurricane_ts_prob", "hurricane_hf_prob")}
+    for i in range(storms):
+        name = f"SYN{i + 1:02d}"
+        start = np.array([rng.uniform(-75, -60), rng.uniform(15, 22)])
+        heading = np.array([-1.0, 0.6]) + rng.normal(0, 0.15, 2)
+        steps = start + np.outer(np.arange(12), heading * 1.4) + np.c_[np.zeros(12), 0.08 * np.arange(12) ** 2]
+        if i == 0:
+            # Landfall (the last observed point) within a few tens of km of a hub
+            steps += hubs[0, rng.integers(0, HUBS_PER_COUNTRY)] + rng.normal(0, 0.2, 2) - steps[4]
+        observed, forecast = steps[:5], steps[4:]
+
+        now = Point(*observed[-1])
+        feeds["hurricane_locations"].append(_feature(now.buffer(0.4), STORMNAME=name))
+        feeds["hurricane_forecast"].append(_feature(LineString(forecast), STORMNAME=name, STORMTYPE="Hurricane"))
+        track = LineString(forecast)
+        feeds["hurricane_cone"].append(_feature(
+            shapely.union_all([Point(*p).buffer(0.3 + 0.35 * k) for k, p in enumerate(forecast)]).convex_hull,
+            STORMNAME=name))
+        for k in range(len(observed) - 1):
+            feeds["hurricane_observed"].append(_feature(
+                LineString(observed[k:k + 2]), STORMNAME=name, SS=int(min(5, k + rng.integers(0, 2)))))
+        for prob in (5, 10, 20, 30, 40, 50, 60, 70, 80, 90):
+            feeds["hurricane_ts_prob"].append(_feature(track.buffer(4.0 * (1 - prob / 100) + 0.2), STORMNAME=name, PWIND120=prob))
+            if prob <= 60:
+                feeds["hurricane_hf_prob"].append(_feature(track.buffer(2.0 * (1 - prob / 100) + 0.1), STORMNAME=name, PWIND120=prob))
+    return {name: _collection(features) for name, features in feeds.items()}
+
+
+def quake_feeds(rng, hubs, quakes=5, now_ms=None):
+    """Epicentres (M5.5-7.8) near exposure hubs plus ShakeMap intensity annuli."""
+    points, contours = [], []
+    for i in range(quakes):
+        country = rng.integers(0, len(COUNTRY_BOXES))
+        lon, lat = hubs[country, rng.integers(0, HUBS_PER_COUNTRY)] + rng.normal(0, 0.5, 2)
+        mag = round(float(rng.uniform(5.5, 7.8)), 1)
+        event_time = _recent(rng, now_ms)
+        points.append(_feature(Point(round(lon, 5), round(lat, 5)), id=f"syn{i:04d}", mag=mag,
+                               place=f"Synthetic {COUNTRY_BOXES[country][0]} {i}", depth=float(rng.uniform(5, 60)), eventTime=event_time))
+        peak = int(min(9, round(mag) + 2))
+        shape = _blob(rng, 0.0, 0.0, 1.0, vertices=36)
+        discs = [
+            shapely.affinity.translate(shapely.affinity.scale(shape, r, r, origin=(0, 0)), lon, lat)
+            for r in 0.25 * (mag - 4) * np.arange(peak - 1, 0, -1)
+        ]
+        # Annuli from the outermost (intensity 2) in to the peak intensity disc
+        for k, disc in enumerate(discs):
+            ring = disc.difference(discs[k + 1]) if k + 1 < len(discs) else disc
+            contours.append(_feature(ring, grid_value=k + 2, eq_id=f"syn{i:04d}", eventTime=event_time))
+    return _collection(points), _collection(contours)
+
+
+def wildfire_feed(rng, hubs, fires=50, now_ms=None):
+    us_hubs = hubs[0]
+    features = []
+    for i in range(fires):
+        lon, lat = us_hubs[rng.integers(0, HUBS_PER_COUNTRY)] + rng.normal(0, 1.5, 2)
+        category = "Wildfire Daily Fire Perimeter" if rng.random() < 0.7 else "Prescribed Fire"
+        features.append(_feature(_blob(rng, lon, lat, rng.uniform(0.02, 0.3)), IncidentName=f"SYN FIRE {i}",
+                                 FeatureCategory=category, CreateDate=_recent(rng, now_ms), DateCurrent=_recent(rng, now_ms)))
+    return _collection(features)
+
+
+def flood_feed(rng, hubs, warnings=20):
+    events = ["Flood Warning", "Flood Watch", "Flash Flood Warning", "Flood Advisory", "Coastal Flood Warning", "Wind Advisory"]
+    features = []
+    for i in range(warnings):
+        lon, lat = hubs[0, rng.integers(0, HUBS_PER_COUNTRY)] + rng.normal(0, 1.0, 2)
+        features.append(_feature(_blob(rng, lon, lat, rng.uniform(0.1, 0.6), vertices=12),
+                                 Event=events[rng.integers(0, len(events))]))
+    return _collection(features)
+
+
+def synthetic_feeds(seed=0, storms=3, quakes=5, fires=50, floods=20, now_ms=None):
+    """Every feed in lens.feeds.FEEDS, synthesised over the same hubs as synthetic_tiv(seed=seed).
+
+    Event timestamps fall in the days before ``now_ms`` (default: now).
+    """
+    hubs = country_hubs(np.random.default_rng(seed))
+    rng = np.random.default_rng(seed + 1)
+    eq_points, eq_intensity = quake_feeds(rng, hubs, quakes, now_ms)
+    return {
+        **storm_feeds(rng, hubs, storms),
+        "eq_points": eq_points,
+        "eq_intensity": eq_intensity,
+        "wildfires": wildfire_feed(rng, hubs, fires, now_ms),
+        "floods": flood_feed(rng, hubs, floods),
+    }
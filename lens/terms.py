@@ -0,0 +1,192 @@
+"""Financial terms: per-peril deductibles on locations, attachment and limit on accounts.
+
+The TIV query returns each location's coverage values and deductibles for
+every peril (exposure.val_cols / exposure.ded_cols), both in the location
+currency. It also returns the currency's USD rate and the account's
+attachment and limit in USD. When a chunk is ingested, every coverage's
+deductible is taken off its value for all five perils at once, as
+(peril x coverage x location) arrays. The results are summed and converted
+into a gross exposure per peril.
+
+Attachment and limit belong to the account, so they are applied after the
+hazard joins. Each join sums the gross exposure of its peril
+(JOIN_PERILS), and its loss (lens.vulnerability), per hazard and account
+group, where a group is one (account, participant) pair
+(LocationStore.account_view). Each group's attachment is then taken off in
+one vectorized pass, once per event (JOIN_EVENTS: a fire's bands are one
+event). The rest is capped at its limit, and the results are summed per
+participant (account_exposure).
+The limit is the whole layer's (blanlimamt in the query). The participant's
+share of the layer (partof) scales the layer loss afterwards:
+share x min(max(gross - attachment, 0), limit). The all-peril trapped
+exposure, from each location's TIV, still feeds the rollups and heatmap.
+"""
+
+import numpy as np
+import pandas as pd
+
+from lens.exposure import TERM_COLUMNS, ded_cols, val_cols
+from lens.vulnerability import LOSS_COLUMNS
+
+PERILS = list(ded_cols)
+
+# Hazard join -> peril whose terms it uses
+JOIN_PERILS = {
+    "observed": "ws",
+    "windfield": "ws",
+    "earthquake": "eq",
+    "bands": "ws",
+    "wildfire": "fr",
+    "flood": "fl",
+}
+
+# Hazard join -> columns identifying one hazard in its output
+JOIN_KEYS = {
+    "observed": ["storm"],
+    "windfield": ["storm"],
+    "earthquake": ["eq_id", "mag", "place"],
+    "wildfire": ["incident", "band"],
+    "flood": ["severity", "scope"],
+}
+
+# Hazard join -> columns identifying one event, where an event spans several rows of one group
+JOIN_EVENTS = {"wildfire": ["incident"]}
+
+# Account terms, repeated on every location row of the account
+ACCOUNT_TERMS = ["attachment_point_usd", "policy_limit_usd", "participant_share"]
+
+# Location TIV in USD before any terms, the base of the ground-up loss (lens.vulnerability)
+GROUND_UP = "ground_up_usd"
+
+
+def peril_column(peril):
+    """Store value column holding the gross exposure after ``peril``'s deductibles."""
+    return f"gross_{peril}_usd"
+
+
+PERIL_COLUMNS = [peril_column(peril) for peril in PERILS]
+
+
+def has_terms(chunk):
+    return all(col in chunk.columns for col in TERM_COLUMNS)
+
+
+def _column(chunk, col):
+    return chunk[col].to_numpy(dtype=np.float64) if col in chunk.columns else np.full(len(chunk), np.nan)
+
+
+def layer(gross, attachment, limit, share=None):
+    """The participant's ``share`` of the gross loss above the attachment, capped at the layer limit.
+
+    Missing terms neither attach nor cap, and a missing share is the whole layer.
+    """
+    loss = np.fmin(np.maximum(gross - np.nan_to_num(attachment), 0.0), limit)
+    return loss if share is None else loss * np.nan_to_num(share, nan=1.0)
+
+
+def apply_terms(chunk):
+    """Gross exposure per peril, plus the all-peril TIV figures, for one TIV query chunk.
+
+    Deductibles of at most 1 are a fraction of the coverage value; larger ones
+    are amounts. Missing values and deductibles count as 0, as in the query's
+    COALESCEs.
+    """
+    n = len(chunk)
+    to_usd = _column(chunk, "value_to_usd")
+    attachment = _column(chunk, "attachment_point_usd")
+    limit = _column(chunk, "policy_limit_usd")
+    share = _column(chunk, "participant_share")
+
+    ground_up = np.nan_to_num(_column(chunk, "total_insurable_value") * to_usd)
+    whole_layer = layer(ground_up, attachment, limit)
+    result = {
+        "trapped_exposure_usd": whole_layer * np.nan_to_num(share, nan=1.0),
+        # The whole layer, before the participant's share
+        "participant_value_usd": whole_layer,
+        GROUND_UP: ground_up,
+        "attachment_point_usd": attachment,
+        "policy_limit_usd": limit,
+        "participant_share": share,
+    }
+
+    # (peril, coverage, location)
+    shape = (len(PERILS), len(ded_cols[PERILS[0]]), n)
+    values = np.nan_to_num(np.stack([_column(chunk, col) for peril in PERILS for col in val_cols[peril]]).reshape(shape))
+    deductibles = np.nan_to_num(np.stack([_column(chunk, col) for peril in PERILS for col in ded_cols[peril]]).reshape(shape))
+    deductibles = np.where(deductibles <= 1.0, deductibles * values, deductibles)
+    gross = np.nan_to_num(np.maximum(values - deductibles, 0.0).sum(axis=1) * to_usd)
+    for peril, gross_peril in zip(PERILS, gross):
+        result[peril_column(peril)] = gross_peril
+    return result
+
+
+# -----------------------
+# ACCOUNT TERMS
+# -----------------------
+
+def group_keys(account_codes, participant_codes):
+    """int64 key per (account, participant) code pair.
+
+    Store categories are only ever appended to, so a key stays valid across
+    delta patches.
+    """
+    return ((account_codes.astype(np.int64) + 1) << 32) | participant_codes.astype(np.int64)
+
+
+def group_index(frame, groups):
+    """Index into ``groups`` of each row's group key (its participant_name), and whether the key is known."""
+    keys = frame["participant_name"].to_numpy(dtype=np.int64)
+    g = np.searchsorted(groups["key"], keys)
+    found = g < len(groups["key"])
+    found[found] = groups["key"][g[found]] == keys[found]
+    return g, found
+
+
+def account_exposure(frame, keys, groups, event=None):
+    """Participant trapped exposure and loss from a join frame of gross sums per (hazard ``keys``, account group).
+
+    The frame's participant_name holds group keys (see
+    LocationStore.account_view). The account terms apply once per event and
+    group, to the exposure and to the gross loss; the ground-up loss is
+    summed as is. Each row is its own event unless ``event`` names coarser
+    columns (a fire's incident, over its proximity bands). The event's
+    result is then split over its rows in proportion to their gross.
+    """
+    losses = [col for col in LOSS_COLUMNS if col in frame.columns]
+    columns = [*keys, "participant_name", "trapped_exposure_usd", *losses]
+    if frame.empty:
+        return pd.DataFrame(columns=columns)
+
+    g, found = group_index(frame, groups)
+    frame, g = frame[found], g[found]
+
+    # (hazard, participant) sums, in hazard-key then participant order
+    hazard = frame.groupby(list(keys), sort=True, dropna=False).ngroup().to_numpy()
+    if event:
+        events = frame.groupby(list(event), sort=False, dropna=False).ngroup().to_numpy()
+        _, per_event = np.unique(events.astype(np.int64) * len(groups["key"]) + g, return_inverse=True)
+
+    def net(col):
+        gross = frame[col].to_numpy(dtype=np.float64)
+        if not event:
+            return np.nan_to_num(layer(gross, groups["attachment"][g], groups["limit"][g], groups["share"][g]))
+        total = np.bincount(per_event, weights=gross)
+        g_event = np.zeros(len(total), dtype=np.int64)
+        g_event[per_event] = g
+        capped = np.nan_to_num(layer(total, groups["attachment"][g_event], groups["limit"][g_event], groups["share"][g_event]))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(total[per_event] > 0, capped[per_event] * gross / total[per_event], 0.0)
+
+    values = {col: net(col) if col != "ground_up_loss_usd" else frame[col].to_numpy(dtype=np.float64)
+              for col in ("trapped_exposure_usd", *losses)}
+
+    n_participants = len(groups["participants"])
+    pair, inverse = np.unique(hazard * n_participants + groups["participant"][g], return_inverse=True)
+    hazard_idx, participant_idx = np.divmod(pair, n_participants)
+
+    _, first = np.unique(hazard, return_index=True)
+    out = frame.iloc[first[hazard_idx]][list(keys)].reset_index(drop=True)
+    out["participant_name"] = np.asarray(groups["participants"], dtype=object)[participant_idx]
+    for col, col_values in values.items():
+        out[col] = np.bincount(inverse, weights=col_values, minlength=len(pair))
+    return out[columns]
@@ -0,0 +1,204 @@
+"""Vulnerability: damage-ratio curves turning hazard intensity into expected loss.
+
+A curve gives the mean damage ratio (loss / exposed value) of one occupancy
+class at a few intensity knots. Between knots it is interpolated linearly
+(np.interp), and beyond the ends it is flat. A peril's curves share one set
+of knots, so each peril is one (class x knot) table. Wind curves are in knots
+of sustained wind and earthquake curves in MMI.
+
+The joins look up one damage ratio per (occupancy, hazard geometry) pair up
+front (damage_matrix). A joined location's loss is then a gather and a
+multiply, summed next to its exposure. Two losses are kept: ground-up, from
+the location's full value, and gross, from its exposure after deductibles.
+lens.terms later applies the account terms to the gross loss. The curves can
+be replaced or extended from a JSON file:
+
+    LENS_VULNERABILITY_CURVES=curves.json python -m lens run
+
+    {"eq": {"knots": [5, 6, 7, 8, 9, 10], "classes": {"wood": [0, 0.02, 0.08, 0.2, 0.4, 0.65]}}}
+
+A file that gives new knots for a peril replaces all of that peril's curves;
+otherwise its classes are added to the built-in ones. Occupancies without a
+curve of their own use the "default" class.
+"""
+
+import json
+import os
+from functools import cache
+
+import numpy as np
+import pandas as pd
+
+from lens.artifacts import content_hash
+
+CURVES_PATH = os.environ.get("LENS_VULNERABILITY_CURVES")
+
+DEFAULT_CLASS = "default"
+
+# Loss columns summed by the joins next to trapped_exposure_usd
+LOSS_COLUMNS = ["ground_up_loss_usd", "gross_loss_usd"]
+
+# Built-in curves: peril -> knots and class -> damage ratio at each knot
+CURVES = {
+    # 1-minute sustained wind, knots
+    "ws": {
+        "knots": [34, 50, 64, 83, 96, 113, 137, 160],
+        "classes": {
+            "default": [0.0, 0.005, 0.02, 0.06, 0.12, 0.25, 0.45, 0.60],
+            "residential": [0.0, 0.01, 0.03, 0.09, 0.18, 0.35, 0.60, 0.75],
+            "commercial": [0.0, 0.003, 0.015, 0.045, 0.09, 0.20, 0.38, 0.50],
+            "industrial": [0.0, 0.004, 0.018, 0.05, 0.10, 0.22, 0.42, 0.55],
+        },
+    },
+    # Modified Mercalli intensity
+    "eq": {
+        "knots": [5, 6, 7, 8, 9, 10],
+        "classes": {
+            "default": [0.0, 0.01, 0.04, 0.12, 0.30, 0.50],
+            "residential": [0.0, 0.015, 0.06, 0.16, 0.36, 0.60],
+            "commercial": [0.0, 0.008, 0.03, 0.10, 0.26, 0.45],
+            "industrial": [0.0, 0.01, 0.035, 0.11, 0.28, 0.48],
+        },
+    },
+}
+
+# Occupancy codes of the location table (AIR scheme, 300 = unknown) -> curve class
+OCCUPANCY_RANGES = {
+    "residential": (301, 311),
+    "commercial": (311, 321),
+    "industrial": (321, 331),
+}
+
+# Saffir-Simpson category -> lower bound of its sustained wind, knots (0 = tropical storm)
+SAFFIR_SIMPSON_KT = {0: 34, 1: 64, 2: 83, 3: 96, 4: 113, 5: 137}
+
+# Upper end of category 5 for its representative wind, knots
+CATEGORY_5_TOP_KT = 160
+
+
+def saffir_simpson_kt(category):
+    categories = np.clip(np.nan_to_num(np.asarray(category, dtype=np.float64)), 0, 5).astype(np.int64)
+    return np.array([SAFFIR_SIMPSON_KT[c] for c in range(6)], dtype=np.float64)[categories]
+
+
+def representative_kt(threshold_kt):
+    """Wind at which to charge a class of winds of at least ``threshold_kt``.
+
+    It is the midpoint up to the next Saffir-Simpson bound (34 kt -> 49 kt,
+    64 kt -> 73.5 kt): the curves do no damage at 34 kt, so charging a
+    tropical-storm band or category at its lower bound would cost nothing.
+    NaN stays NaN.
+    """
+    threshold = np.asarray(threshold_kt, dtype=np.float64)
+    bounds = np.array([*SAFFIR_SIMPSON_KT.values(), CATEGORY_5_TOP_KT], dtype=np.float64)
+    upper = bounds[np.clip(np.searchsorted(bounds, np.nan_to_num(threshold), side="right"), 0, len(bounds) - 1)]
+    return (threshold + np.maximum(upper, threshold)) / 2
+
+
+def category_kt(category):
+    """Representative wind of each Saffir-Simpson category (see representative_kt)."""
+    return representative_kt(saffir_simpson_kt(category))
+
+
+def epicentral_mmi(mag):
+    """Epicentral intensity from magnitude (M = 0.6 I0 + 1.2), for points hit by the epicentre itself."""
+    return (np.asarray(mag, dtype=np.float64) - 1.2) / 0.6
+
+
+# -----------------------
+# CURVES
+# -----------------------
+
+@cache
+def curves():
+    """peril -> (knots, class names, class x knot table), built-in curves merged with LENS_VULNERABILITY_CURVES."""
+    merged = {peril: {"knots": spec["knots"], "classes": dict(spec["classes"])} for peril, spec in CURVES.items()}
+    if CURVES_PATH:
+        with open(CURVES_PATH) as f:
+            for peril, spec in json.load(f).items():
+                current = merged.get(peril)
+                if current is None or spec.get("knots", current["knots"]) != current["knots"]:
+                    current = merged[peril] = {"knots": spec["knots"], "classes": {}}
+                current["classes"].update(spec.get("classes", {}))
+    tables = {}
+    for peril, spec in merged.items():
+        knots = np.asarray(spec["knots"], dtype=np.float64)
+        names = list(spec["classes"])
+        table = np.asarray([spec["classes"][name] for name in names], dtype=np.float64).reshape(len(names), len(knots))
+        if DEFAULT_CLASS not in names:
+            # A peril without a default curve does no damage to unclassified locations
+            names.append(DEFAULT_CLASS)
+            table = np.vstack([table, np.zeros(len(knots))])
+        tables[peril] = (knots, names, table)
+    return tables
+
+
+def curves_key():
+    """Content hash of the curves in use, for the join cache keys."""
+    parts = []
+    for peril, (knots, names, table) in sorted(curves().items()):
+        parts += [peril, knots, names, table]
+    return content_hash(*parts)
+
+
+def occupancy_class(occupancy):
+    """Curve class of one occupancy value: a class name as is, or an occupancy code by its range."""
+    value = str(occupancy).strip().lower()
+    if value in ("", "nan", "none"):
+        return DEFAULT_CLASS
+    try:
+        code = int(float(value))
+    except ValueError:
+        return value
+    for name, (low, high) in OCCUPANCY_RANGES.items():
+        if low <= code < high:
+            return name
+    return DEFAULT_CLASS
+
+
+def class_rows(peril, occupancies):
+    """Table row of every occupancy category, plus a trailing default row for missing (-1) codes."""
+    _, names, _ = curves()[peril]
+    index = {name: i for i, name in enumerate(names)}
+    default = index[DEFAULT_CLASS]
+    rows = [index.get(occupancy_class(occupancy), default) for occupancy in occupancies]
+    return np.asarray(rows + [default], dtype=np.int64)
+
+
+def _ratios(peril, intensity, floor=None):
+    """class x n damage ratios at ``intensity``, less the ratios at ``floor`` where given."""
+    knots, _, table = curves()[peril]
+    intensity = np.asarray(intensity, dtype=np.float64)
+    ratios = np.stack([np.interp(intensity, knots, curve) for curve in table]) if len(intensity) else np.zeros((len(table), 0))
+    if floor is not None:
+        floor = np.asarray(floor, dtype=np.float64)
+        lower = np.stack([np.interp(np.nan_to_num(floor), knots, curve) for curve in table]) if len(floor) else 0.0
+        ratios = ratios - np.where(np.isnan(floor), 0.0, lower)
+    # Unknown intensity does no damage
+    return np.where(np.isnan(intensity), 0.0, np.maximum(ratios, 0.0))
+
+
+def damage_matrix(peril, intensity, occupancies, floor=None):
+    """(occupancy code + 1) x hazard damage ratios; the last row is for locations without an occupancy.
+
+    ``floor`` is the intensity of the next lower nested contour, if any: a
+    location inside nested contours is then charged each contour's increment,
+    which adds up to the ratio at its highest intensity.
+    """
+    return _ratios(peril, intensity, floor)[class_rows(peril, occupancies)]
+
+
+def damage_ratio(peril, intensity, occupancy=None, floor=None):
+    """Damage ratio of every joined row, from its hazard ``intensity`` and location ``occupancy``."""
+    intensity = np.asarray(intensity, dtype=np.float64)
+    if occupancy is None:
+        codes, occupancies = np.full(len(intensity), -1), pd.Index([])
+    else:
+        codes, occupancies = pd.factorize(pd.Series(occupancy).astype(object))
+    return row_damage(peril, intensity, class_rows(peril, occupancies)[codes], floor)
+
+
+def row_damage(peril, intensity, rows, floor=None):
+    """Damage ratio at each ``intensity`` on the curve of the matching table row (see class_rows)."""
+    ratios = _ratios(peril, intensity, floor)
+    return ratios[rows, np.arange(len(rows))] if len(rows) else np.zeros(0)
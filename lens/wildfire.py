@@ -0,0 +1,75 @@
+"""Wildfire proximity bands: rings around each incident's perimeter for the exposure join.
+
+The perimeters of one incident (IncidentName) are dissolved into a single
+footprint (hazards.wildfire_gdf). It is simplified to SIMPLIFY_M first, since
+daily fire perimeters can carry tens of thousands of vertices and would
+otherwise dominate both the buffering and the point-in-polygon tests. The
+footprint is then grown by each distance in BANDS_KM, for ember attack and
+proximity. Each band is the ring between one distance and the next, so a
+location counts once per incident: in the "inside" band or in the nearest
+ring around it.
+
+Buffers are taken in Web Mercator, with each fire's distances scaled by
+1 / cos(latitude), so they are close to true kilometres at any latitude.
+
+    LENS_WILDFIRE_BANDS_KM=1,5 LENS_WILDFIRE_SIMPLIFY_M=50 python -m lens run
+"""
+
+import os
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from lens.artifacts import content_hash
+
+# Outer edges of the proximity rings, km
+BANDS_KM = sorted(float(km) for km in os.environ.get("LENS_WILDFIRE_BANDS_KM", "1,5").split(",") if km.strip())
+
+# Perimeter simplification tolerance, metres
+SIMPLIFY_M = float(os.environ.get("LENS_WILDFIRE_SIMPLIFY_M", 50))
+
+INSIDE = "inside"
+
+BAND_COLUMNS = ["incident", "band", "geometry"]
+
+
+def settings_key():
+    return content_hash(BANDS_KM, SIMPLIFY_M)
+
+
+def band_labels(bands_km=BANDS_KM):
+    """Band names from the perimeter outwards."""
+    edges = [0.0, *bands_km]
+    return [INSIDE, *[f"{low:g}–{high:g} km" for low, high in zip(edges[:-1], edges[1:])]]
+
+
+def proximity_bands(perimeters, bands_km=BANDS_KM, simplify_m=SIMPLIFY_M):
+    """One row per (incident, band) with the band's polygon, in the perimeters' CRS."""
+    if perimeters.empty:
+        return gpd.GeoDataFrame(columns=BAND_COLUMNS, geometry="geometry", crs=perimeters.crs or "EPSG:4326")
+    bounds = perimeters.to_crs(4326).geometry.bounds
+    # Web Mercator metres per true metre at each fire's latitude
+    scale = 1 / np.cos(np.radians(np.clip((bounds["miny"] + bounds["maxy"]).to_numpy() / 2, -85, 85)))
+    footprint = shapely.make_valid(shapely.simplify(
+        perimeters.to_crs(3857).geometry.values, simplify_m * scale, preserve_topology=True
+    ))
+
+    incidents = perimeters["incident"].to_numpy()
+    parts, inner = [(incidents, INSIDE, footprint)], footprint
+    for label, km in zip(band_labels(bands_km)[1:], bands_km):
+        outer = shapely.buffer(footprint, km * 1000 * scale)
+        parts.append((incidents, label, shapely.difference(outer, inner)))
+        inner = outer
+
+    bands = gpd.GeoDataFrame(
+        {
+            "incident": np.concatenate([incident for incident, _, _ in parts]),
+            "band": np.concatenate([np.full(len(incident), label, dtype=object) for incident, label, _ in parts]),
+            "geometry": np.concatenate([np.asarray(geoms, dtype=object) for _, _, geoms in parts]),
+        },
+        geometry="geometry",
+        crs=3857,
+    )
+    bands = bands[~bands.geometry.is_empty]
+    return bands.to_crs(perimeters.crs).reset_index(drop=True)
@@ -0,0 +1,230 @@
+"""Parametric wind field: peak sustained wind at each location from the storms' track points.
+
+The observed and forecast track lines (Active_Hurricanes) are resampled every
+STEP_KM into track points. Each point carries the storm's position, maximum
+sustained wind, radius of maximum winds (RMW), Holland B and forward motion.
+Around each point, the storm-relative wind follows the Holland (1980) profile
+
+    V(r) = Vm * ((Rm / r)^B * exp(1 - (Rm / r)^B)) ** 0.5
+
+The forward motion is then added where it runs with the rotation (the right
+of the track in the northern hemisphere). It is scaled by 2 Rm r / (Rm^2 + r^2),
+so it is full at the RMW and fades away from it, and the peak on that side
+equals the reported maximum. A location's wind for a storm is the peak over
+all of the storm's track points. Only (track point, location) pairs inside
+the track point's gale radius are evaluated. The gale radius is where the
+wind drops below GALE_KT, found by bisection on the profile, and a spatial
+index query picks the pairs.
+
+Attributes are read when the feed has them:
+- wind: INTENSITY or MAXWIND (knots); otherwise the observed segment's
+  Saffir-Simpson category (SS), then the storm's last observed wind, then
+  its STORMTYPE;
+- RMW: RMW (nautical miles), else the Willoughby et al. (2006) fit to wind
+  and latitude;
+- Holland B: MSLP (hPa), else HOLLAND_B;
+- forward speed: TCSPD (knots), else FORWARD_KT.
+
+The winds are 1-minute sustained, the measure the vulnerability curves use.
+"""
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import shape
+
+from lens.vulnerability import saffir_simpson_kt
+
+# Track point spacing along the track lines
+STEP_KM = 10.0
+
+# Locations below this peak wind are not counted as exposed
+GALE_KT = 34.0
+
+# No track point reaches further than this
+MAX_RADIUS_KM = 600.0
+
+# Track points evaluated together in peak_winds
+STEP_BLOCK = 64
+
+# Profile peakedness without a central pressure, and forward speed without TCSPD
+HOLLAND_B = 1.5
+FORWARD_KT = 10.0
+
+AMBIENT_HPA = 1010.0
+AIR_DENSITY = 1.15
+MS_PER_KT = 0.514444
+KM_PER_NM = 1.852
+KM_PER_DEGREE = 111.32
+
+# Storm type -> wind when a track carries no intensity
+STORMTYPE_KT = {"hurricane": 64.0, "tropical storm": 34.0}
+
+STEP_COLUMNS = ["storm", "lon", "lat", "wind_kt", "rmw_km", "holland_b", "speed_kt", "heading_deg", "radius_km"]
+
+
+# -----------------------
+# TRACK POINTS
+# -----------------------
+
+def _first(props, names):
+    for name in names:
+        value = props.get(name)
+        if value is not None and value == value:
+            return float(value)
+    return np.nan
+
+
+def _headings(lon, lat):
+    """Direction of travel at each vertex, degrees clockwise from north."""
+    if len(lon) < 2:
+        return np.zeros(len(lon))
+    dx = np.diff(lon) * np.cos(np.radians((lat[1:] + lat[:-1]) / 2))
+    heading = np.degrees(np.arctan2(dx, np.diff(lat))) % 360
+    return np.append(heading, heading[-1])
+
+
+def track_steps(feeds):
+    """Track points every STEP_KM along each storm's observed, then forecast, track lines."""
+    parts = []
+    for feed in ("hurricane_observed", "hurricane_forecast"):
+        for feature in feeds.get(feed, {}).get("features", []):
+            if not feature.get("geometry"):
+                continue
+            geom = shape(feature["geometry"])
+            if geom.geom_type not in ("LineString", "MultiLineString"):
+                continue
+            props = feature.get("properties", {})
+            wind = _first(props, ("INTENSITY", "MAXWIND"))
+            if np.isnan(wind) and props.get("SS") is not None:
+                wind = float(saffir_simpson_kt(props["SS"]))
+            lines = geom.geoms if geom.geom_type == "MultiLineString" else [geom]
+            for line in lines:
+                coords = shapely.get_coordinates(shapely.segmentize(line, STEP_KM / KM_PER_DEGREE))
+                if not len(coords):
+                    continue
+                parts.append(pd.DataFrame({
+                    "storm": props.get("STORMNAME", "Unknown"),
+                    "lon": coords[:, 0],
+                    "lat": coords[:, 1],
+                    "wind_kt": wind,
+                    "fallback_kt": STORMTYPE_KT.get(str(props.get("STORMTYPE", "")).strip().lower(), np.nan),
+                    "rmw_km": _first(props, ("RMW",)) * KM_PER_NM,
+                    "mslp_hpa": _first(props, ("MSLP",)),
+                    "speed_kt": _first(props, ("TCSPD",)),
+                    "heading_deg": _headings(coords[:, 0], coords[:, 1]),
+                }))
+    if not parts:
+        return pd.DataFrame(columns=STEP_COLUMNS)
+
+    steps = pd.concat(parts, ignore_index=True)
+    # Forecast tracks without an intensity persist the storm's last observed wind
+    steps["wind_kt"] = steps.groupby("storm", sort=False)["wind_kt"].ffill().fillna(steps["fallback_kt"])
+    steps = steps[steps["wind_kt"] >= GALE_KT].reset_index(drop=True)
+
+    wind_ms = steps["wind_kt"].to_numpy() * MS_PER_KT
+    willoughby = 46.4 * np.exp(-0.0155 * wind_ms + 0.0169 * np.abs(steps["lat"].to_numpy()))
+    steps["rmw_km"] = steps["rmw_km"].fillna(pd.Series(willoughby, index=steps.index))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        b = AIR_DENSITY * np.e * wind_ms ** 2 / ((AMBIENT_HPA - steps["mslp_hpa"].to_numpy()) * 100)
+    steps["holland_b"] = np.clip(np.where(np.isfinite(b) & (b > 0), b, HOLLAND_B), 1.0, 2.5)
+    steps["speed_kt"] = steps["speed_kt"].fillna(FORWARD_KT)
+    steps["radius_km"] = gale_radius(steps)
+    return steps[STEP_COLUMNS]
+
+
+def step_arrays(steps):
+    """Track point columns as arrays, with storm codes; the storm names are under "storms"."""
+    codes, names = pd.factorize(steps["storm"].astype(str))
+    arrays = {col: steps[col].to_numpy(dtype=np.float64) for col in STEP_COLUMNS if col != "storm"}
+    arrays["storm"] = codes.astype(np.int64)
+    arrays["storms"] = np.asarray(names, dtype=object)
+    return arrays
+
+
+def step_bounds(arrays):
+    """(minx, miny, maxx, maxy) box around each track point's gale radius, in degrees."""
+    dlat = arrays["radius_km"] / KM_PER_DEGREE
+    widest = np.radians(np.minimum(np.abs(arrays["lat"]) + dlat, 89.0))
+    dlon = dlat / np.cos(widest)
+    return np.column_stack([arrays["lon"] - dlon, arrays["lat"] - dlat, arrays["lon"] + dlon, arrays["lat"] + dlat])
+
+
+# -----------------------
+# PROFILE
+# -----------------------
+
+def holland_wind(r_km, vmax_kt, rmw_km, b):
+    x = (rmw_km / np.maximum(r_km, 1e-3)) ** b
+    return vmax_kt * np.sqrt(x * np.exp(1 - x))
+
+
+def _winds(r_km, cos_angle, wind_kt, rmw_km, b, speed_kt):
+    """Storm-relative Holland wind plus the forward motion along the rotation."""
+    symmetric = holland_wind(r_km, np.maximum(wind_kt - speed_kt, 0.0), rmw_km, b)
+    return np.maximum(symmetric + speed_kt * cos_angle * 2 * rmw_km * r_km / (rmw_km ** 2 + r_km ** 2), 0.0)
+
+
+def gale_radius(steps, iterations=40):
+    """Distance beyond the RMW at which even the motion-aided wind falls below GALE_KT (bisection)."""
+    wind, rmw = steps["wind_kt"].to_numpy(), steps["rmw_km"].to_numpy()
+    b, speed = steps["holland_b"].to_numpy(), steps["speed_kt"].to_numpy()
+    low, high = rmw.copy(), np.full(len(rmw), MAX_RADIUS_KM)
+    for _ in range(iterations):
+        mid = (low + high) / 2
+        above = _winds(mid, 1.0, wind, rmw, b, speed) >= GALE_KT
+        low, high = np.where(above, mid, low), np.where(above, high, mid)
+    return np.maximum(high, rmw)
+
+
+def _max_by_key(key, value):
+    """Unique keys (sorted) and the largest value of each."""
+    order = np.argsort(key)
+    key = key[order]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    return key[starts], np.maximum.reduceat(value[order], starts)
+
+
+def _block_winds(tree, lon, lat, arrays, block):
+    """(storm code x len(lon) + point index, peak wind) over the track points in ``block``."""
+    empty = (np.empty(0, dtype=np.int64), np.empty(0))
+    # Box query first, then the circle; distances are local (equirectangular) km, fine at these radii
+    step, point = tree.query(shapely.box(*step_bounds({k: arrays[k][block] for k in ("lon", "lat", "radius_km")}).T))
+    step = block[step]
+    dx = (lon[point] - arrays["lon"][step]) * np.cos(np.radians(arrays["lat"][step])) * KM_PER_DEGREE
+    dy = (lat[point] - arrays["lat"][step]) * KM_PER_DEGREE
+    r_km = np.hypot(dx, dy)
+    inside = r_km <= arrays["radius_km"][step]
+    step, point, dx, dy, r_km = step[inside], point[inside], dx[inside], dy[inside], r_km[inside]
+    if not len(step):
+        return empty
+
+    # Cyclonic flow runs a quarter turn from the bearing: counterclockwise north of the equator
+    north = np.where(arrays["lat"][step] >= 0, 1.0, -1.0)
+    heading = np.radians(arrays["heading_deg"][step])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cos_angle = np.nan_to_num(north * (dx * np.cos(heading) - dy * np.sin(heading)) / r_km)
+    wind = _winds(r_km, cos_angle, arrays["wind_kt"][step], arrays["rmw_km"][step],
+                  arrays["holland_b"][step], arrays["speed_kt"][step])
+    return _max_by_key(arrays["storm"][step] * len(lon) + point, wind)
+
+
+def peak_winds(lon, lat, arrays):
+    """(storm code, point index, peak wind) of the points reaching GALE_KT from any track point in ``arrays``.
+
+    Track points are evaluated STEP_BLOCK at a time, and each block is reduced
+    to its (storm, point) peaks, so memory follows the locations reached
+    rather than every (track point, location) pair or every storm x location.
+    """
+    lon, lat = np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))
+    n_steps = len(arrays["lon"])
+    if not len(lon) or not n_steps:
+        return empty
+    tree = shapely.STRtree(shapely.points(lon, lat))
+    blocks = [_block_winds(tree, lon, lat, arrays, np.arange(start, min(start + STEP_BLOCK, n_steps)))
+              for start in range(0, n_steps, STEP_BLOCK)]
+    key, peak = _max_by_key(np.concatenate([key for key, _ in blocks]), np.concatenate([peak for _, peak in blocks]))
+    keep = peak >= GALE_KT
+    storm, point = np.divmod(key[keep], len(lon))
+    return storm, point, peak[keep]
@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+from lens import joins
+
+SEVERITIES = ["Flash Flood Warning", "Flood Warning", "Flood Watch"]
+
+
+def test_flood_totals_count_each_location_once_per_severity_and_once_at_its_highest():
+    members = pd.DataFrame({
+        # Location 0 is in two overlapping watches and a warning; location 1 in one watch
+        "flood_id": ["w1", "w2", "fw", "w1"],
+        "severity": ["Flood Watch", "Flood Watch", "Flood Warning", "Flood Watch"],
+        "location": [0, 0, 0, 1],
+        "participant_name": ["a", "a", "a", "b"],
+        "trapped_exposure_usd": [10.0, 10.0, 10.0, 5.0],
+    })
+    totals = joins.flood_totals(members, SEVERITIES).set_index(["scope", "severity", "participant_name"])
+    exposure = totals["trapped_exposure_usd"]
+
+    assert exposure[(joins.FLOOD_ALL, "Flood Watch", "a")] == pytest.approx(10.0)
+    assert exposure[(joins.FLOOD_ALL, "Flood Warning", "a")] == pytest.approx(10.0)
+    assert exposure[(joins.FLOOD_HIGHEST, "Flood Warning", "a")] == pytest.approx(10.0)
+    assert exposure[(joins.FLOOD_HIGHEST, "Flood Watch", "b")] == pytest.approx(5.0)
+    assert exposure.xs(joins.FLOOD_HIGHEST).sum() == pytest.approx(15.0)
+
+
+def test_flood_totals_of_no_members():
+    assert joins.flood_totals(pd.DataFrame(columns=joins.FLOOD_MEMBER_COLUMNS), SEVERITIES).empty
@@ -0,0 +1,36 @@
+from lens.panel import panel_payload
+
+
+def _section(**extra):
+    return {
+        "title": "Hurricanes",
+        "kind": "hurricane",
+        "color": "#1E90FF",
+        "empty": "No active hurricanes.",
+        "rows": [("AL", "AL")],
+        "exposure": {"a": {"AL": 100.0}, "b": {"AL": 50.0}},
+        **extra,
+    }
+
+
+def test_sections_can_stay_out_of_the_banner():
+    payload = panel_payload([_section(banner=False), {**_section(), "rows": [("EP", "EP")], "exposure": {"a": {"EP": 1.0}}}])
+    assert [hazard.get("banner", True) for hazard in payload["hazards"]] == [False, True]
+
+
+def test_stats_per_participant_and_for_all_participants():
+    payload = panel_payload([_section(stats={
+        "σ": {"a": {"AL": 3.0}, None: {"AL": 4.0}},
+        "1-in-10": {None: {"AL": 40.0}},
+    })])
+    stats = payload["stats"]
+    assert stats["labels"] == ["σ", "1-in-10"]
+    assert list(zip(stats["p"], stats["h"], stats["v"])) == [(0, 0, [3.0, None]), (-1, 0, [4.0, 40.0])]
+
+
+def test_banner_values_replace_the_rows_in_the_totals():
+    payload = panel_payload([_section(banner={"a": {"AL": 60.0}})])
+    shown, counted = payload["hazards"]
+    assert shown["banner"] is False and "banner" not in counted
+    assert payload["rows"][1] == {"type": "hazard", "hazard": 0}
+    assert [(p, h, v) for p, h, v in zip(payload["p"], payload["h"], payload["v"]) if h == 1] == [(0, 1, 60.0)]
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lens import terms
+from lens.exposure import TERM_COLUMNS
+
+
+# -----------------------
+# LAYER
+# -----------------------
+
+def test_layer_takes_participant_share_of_the_layer_loss():
+    # 8M gross on a 2.5M xs 5M layer: 2.5M of layer loss, 30% of it to the participant
+    out = terms.layer(np.array([8e6]), np.array([5e6]), np.array([2.5e6]), np.array([0.3]))
+    assert out == pytest.approx([0.75e6])
+
+
+def test_layer_caps_before_the_share():
+    out = terms.layer(np.array([8e6, 12e6, 1e6]), np.array([5e6] * 3), np.array([10e6] * 3), np.array([0.25] * 3))
+    assert out == pytest.approx([0.75e6, 1.75e6, 0.0])
+
+
+def test_layer_missing_terms_neither_attach_cap_nor_share():
+    out = terms.layer(np.array([8e6]), np.array([np.nan]), np.array([np.nan]), np.array([np.nan]))
+    assert out == pytest.approx([8e6])
+    assert terms.layer(np.array([8e6]), np.array([5e6]), np.array([np.nan])) == pytest.approx([3e6])
+
+
+# -----------------------
+# APPLY TERMS
+# -----------------------
+
+def _chunk(**columns):
+    chunk = pd.DataFrame({col: [0.0] for col in TERM_COLUMNS})
+    for col, value in columns.items():
+        chunk[col] = [value]
+    return chunk
+
+
+def test_apply_terms_fraction_and_amount_deductibles():
+    chunk = _chunk(
+        wscv1val=1000.0, wscv1ded=0.1,    # 10% of the value
+        wscv2val=500.0, wscv2ded=200.0,   # an amount
+        wscv3val=50.0, wscv3ded=80.0,     # larger than the value: nothing left
+        eqcv1val=400.0,
+        value_to_usd=2.0,
+        total_insurable_value=1950.0,
+    )
+    out = terms.apply_terms(chunk)
+    assert out[terms.peril_column("ws")] == pytest.approx([(900.0 + 300.0) * 2.0])
+    assert out[terms.peril_column("eq")] == pytest.approx([800.0])
+    assert out[terms.peril_column("fl")] == pytest.approx([0.0])
+    assert out[terms.GROUND_UP] == pytest.approx([3900.0])
+
+
+def test_apply_terms_trapped_exposure_is_the_participant_share():
+    chunk = _chunk(
+        value_to_usd=1.0,
+        total_insurable_value=8e6,
+        attachment_point_usd=5e6,
+        policy_limit_usd=10e6,
+        participant_share=0.25,
+    )
+    out = terms.apply_terms(chunk)
+    assert out["participant_value_usd"] == pytest.approx([3e6])
+    assert out["trapped_exposure_usd"] == pytest.approx([0.75e6])
+
+
+# -----------------------
+# ACCOUNT EXPOSURE
+# -----------------------
+
+def _groups():
+    # Two accounts for participant "a" (code 0), one for "b" (code 1)
+    keys = terms.group_keys(np.array([0, 1, 1]), np.array([0, 0, 1]))
+    return {
+        "key": keys,
+        "participant": np.array([0, 0, 1]),
+        "participants": pd.Index(["a", "b"]),
+        "attachment": np.array([5e6, 0.0, np.nan]),
+        "limit": np.array([10e6, 1e6, np.nan]),
+        "share": np.array([0.25, 0.5, np.nan]),
+    }
+
+
+def test_account_exposure_applies_terms_per_group_and_sums_per_participant():
+    groups = _groups()
+    frame = pd.DataFrame({
+        "storm": ["X", "X", "X", "Y"],
+        "participant_name": [*groups["key"], groups["key"][0]],
+        "trapped_exposure_usd": [8e6, 3e6, 2e6, 4e6],
+        "gross_loss_usd": [6e6, 3e6, 1e6, 4e6],
+        "ground_up_loss_usd": [7e6, 3e6, 1e6, 5e6],
+    })
+    out = terms.account_exposure(frame, ["storm"], groups).set_index(["storm", "participant_name"])
+
+    # a on X: 25% of min(8M - 5M, 10M) + 50% of min(3M, 1M)
+    assert out.loc[("X", "a"), "trapped_exposure_usd"] == pytest.approx(0.75e6 + 0.5e6)
+    assert out.loc[("X", "a"), "gross_loss_usd"] == pytest.approx(0.25e6 + 0.5e6)
+    # b has no terms: the whole gross
+    assert out.loc[("X", "b"), "trapped_exposure_usd"] == pytest.approx(2e6)
+    # Below the attachment
+    assert out.loc[("Y", "a"), "trapped_exposure_usd"] == pytest.approx(0.0)
+    # Ground-up loss is summed as is
+    assert out.loc[("X", "a"), "ground_up_loss_usd"] == pytest.approx(10e6)
+
+
+def test_account_exposure_drops_unknown_groups():
+    groups = _groups()
+    frame = pd.DataFrame({
+        "storm": ["X"],
+        "participant_name": [groups["key"][-1] + 1],
+        "trapped_exposure_usd": [1e6],
+    })
+    assert terms.account_exposure(frame, ["storm"], groups).empty
+
+
+def test_account_exposure_applies_terms_once_per_event_across_its_bands():
+    groups = _groups()
+    # One account in two proximity bands of one fire, 6M + 6M gross against a 10M xs 5M layer
+    frame = pd.DataFrame({
+        "incident": ["F", "F"],
+        "band": ["inside", "0–1 km"],
+        "participant_name": [groups["key"][0]] * 2,
+        "trapped_exposure_usd": [6e6, 6e6],
+    })
+    out = terms.account_exposure(frame, ["incident", "band"], groups, event=["incident"])
+
+    # 25% of min(12M - 5M, 10M), split evenly over the bands
+    assert out["trapped_exposure_usd"].sum() == pytest.approx(0.25 * 7e6)
+    assert out["trapped_exposure_usd"].tolist() == pytest.approx([0.25 * 3.5e6] * 2)
+
+    # The limit binds on the fire, not on each band
+    frame["trapped_exposure_usd"] = [12e6, 12e6]
+    out = terms.account_exposure(frame, ["incident", "band"], groups, event=["incident"])
+    assert out["trapped_exposure_usd"].sum() == pytest.approx(0.25 * 10e6)
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from lens import vulnerability
+
+
+def test_representative_kt_is_the_midpoint_up_to_the_next_category():
+    out = vulnerability.representative_kt([34, 64, 137, np.nan])
+    assert out[:3] == pytest.approx([49.0, 73.5, 148.5])
+    assert np.isnan(out[3])
+
+
+def test_tropical_storm_winds_do_damage():
+    wind = vulnerability.category_kt([0])
+    assert vulnerability.damage_ratio("ws", wind) > 0
+    # A hurricane-force band's increment over the tropical-storm band adds up to its own ratio
+    ts, hf = vulnerability.representative_kt([34, 64])
+    total = vulnerability.damage_ratio("ws", [ts]) + vulnerability.damage_ratio("ws", [hf], floor=[ts])
+    assert total == pytest.approx(vulnerability.damage_ratio("ws", [hf]))